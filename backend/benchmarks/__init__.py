@@ -0,0 +1 @@
+"""Benchmarks de desempenho — executar a partir de backend/ com `python -m benchmarks.<nome>`."""
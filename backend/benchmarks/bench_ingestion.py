@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vazão e pico de memória da ingestão de CSV com dados sintéticos.
+
+Para cada tipo (visnir, nix, pxrf, generic) e tamanho de arquivo, mede
+CSVService.validate_and_parse_csv (mediana de --repeat execuções; pico de
+memória via tracemalloc numa execução separada) e, a menos que --skip-db,
+DatabaseService.save_dataframe contra o PostgreSQL de DATABASE_URL (os
+arquivos inseridos são apagados em seguida).
+
+Os resultados vão para JSON e são comparados com uma baseline salva:
+vazão abaixo de (1 - tolerância) ou memória acima de (1 + tolerância)
+da baseline conta como regressão e o processo sai com código 1.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_ingestion [--sizes 0.1,1] [--repeat 3] [--output out.json]
+    python -m benchmarks.bench_ingestion --save-baseline
+    python -m benchmarks.bench_ingestion --skip-db --tolerance 0.3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import List, Optional
+
+# Allow running from the backend/ directory without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text
+
+from benchmarks.generators import CSV_KINDS, generate
+from services.csv_service import CSVService
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "ingestion.json")
+MB = 1024 * 1024
+
+
+def _result(kind: str, size_mb: float, stage: str, rows: int, columns: int, nbytes: int, seconds: float) -> dict:
+    return {
+        "kind": kind,
+        "size_mb": size_mb,
+        "stage": stage,
+        "rows": rows,
+        "columns": columns,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "mb_per_sec": round(nbytes / MB / seconds, 2) if seconds > 0 else None,
+    }
+
+
+def bench_parse(kind: str, size_mb: float, data: bytes, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df, _ = CSVService.validate_and_parse_csv(data, f"{kind}.csv")
+        timings.append(time.perf_counter() - started)
+
+    # Traced separately: tracemalloc slows allocation-heavy code noticeably.
+    tracemalloc.start()
+    CSVService.validate_and_parse_csv(data, f"{kind}.csv")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = _result(kind, size_mb, "parse", len(df), len(df.columns), len(data), statistics.median(timings))
+    result["peak_mb"] = round(peak / MB, 2)
+    return result, df
+
+
+async def bench_save(kind: str, size_mb: float, df, nbytes: int) -> dict:
+    from db.connection import AsyncSessionLocal
+    from services.db_service import DatabaseService
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        rows, file_id = await DatabaseService(session).save_dataframe(df, f"bench_{kind}.csv", kind)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(text("DELETE FROM files WHERE id = :id"), {"id": file_id})
+        await session.commit()
+
+    result = _result(kind, size_mb, "save_dataframe", rows, len(df.columns), nbytes, seconds)
+    result["peak_mb"] = round(peak / MB, 2)
+    return result
+
+
+async def _prepare_db() -> bool:
+    from db.connection import init_db
+
+    try:
+        await init_db()
+    except Exception as e:
+        # e.g. no TimescaleDB locally: the tables may still exist
+        print(f"Aviso: init_db falhou ({e.__class__.__name__}); usando as tabelas existentes")
+    try:
+        from db.connection import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("SELECT 1 FROM files, records LIMIT 0"))
+        return True
+    except Exception as e:
+        print(f"PostgreSQL indisponível, pulando save_dataframe: {e}")
+        return False
+
+
+def _key(result: dict) -> tuple:
+    return result["kind"], result["size_mb"], result["stage"]
+
+
+def compare(results: List[dict], baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `results` against `baseline` beyond `tolerance`."""
+    reference = {_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = reference.get(_key(result))
+        if base is None:
+            continue
+        name = "{}/{}MB/{}".format(*_key(result))
+        if base.get("rows_per_sec") and result["rows_per_sec"] < base["rows_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: vazão {result['rows_per_sec']:.0f} linhas/s (baseline {base['rows_per_sec']:.0f})"
+            )
+        if base.get("peak_mb") and result["peak_mb"] > base["peak_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: pico de memória {result['peak_mb']} MB (baseline {base['peak_mb']} MB)")
+    return regressions
+
+
+async def run(sizes: List[float], kinds: List[str], repeat: int, with_db: bool) -> List[dict]:
+    if with_db:
+        with_db = await _prepare_db()
+
+    results = []
+    for kind in kinds:
+        for size_mb in sizes:
+            data = generate(kind, int(size_mb * MB))
+            parse_result, df = bench_parse(kind, size_mb, data, repeat)
+            results.append(parse_result)
+            _print(parse_result)
+            if with_db:
+                save_result = await bench_save(kind, size_mb, df, len(data))
+                results.append(save_result)
+                _print(save_result)
+    return results
+
+
+def _print(r: dict) -> None:
+    print(
+        f"{r['kind']:>8} {r['size_mb']:>6.2f} {r['stage']:>15} {r['rows']:>8} {r['columns']:>6} "
+        f"{r['seconds']:>9.3f} {r['rows_per_sec'] or 0:>12.0f} {r['mb_per_sec'] or 0:>7.2f} {r['peak_mb']:>9.1f}"
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="0.1,1", help="tamanhos dos arquivos em MB, separados por vírgula")
+    parser.add_argument("--kinds", default=",".join(CSV_KINDS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-db", action="store_true", help="não medir save_dataframe")
+    parser.add_argument("--output", help="arquivo JSON para os resultados")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="gravar os resultados como nova baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    # The parsers log every file (and every column) at INFO
+    logging.basicConfig(level=logging.WARNING)
+
+    sizes = [float(s) for s in args.sizes.split(",") if s.strip()]
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+
+    print(f"{'tipo':>8} {'MB':>6} {'etapa':>15} {'linhas':>8} {'cols':>6} {'segundos':>9} {'linhas/s':>12} {'MB/s':>7} {'pico MB':>9}")
+    results = asyncio.run(run(sizes, kinds, args.repeat, not args.skip_db))
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline salva em {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nSem baseline em {args.baseline} — rode com --save-baseline para criar uma.")
+        return
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"\nRegressões (tolerância {args.tolerance:.0%}):")
+        for line in regressions:
+            print(f"  - {line}")
+        sys.exit(1)
+    print(f"\nSem regressões em relação à baseline (tolerância {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
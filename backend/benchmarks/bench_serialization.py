@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serialização JSON (stdlib json x orjson) e compressão das respostas.
+
+Mede, com CSVs sintéticos já parseados:
+  - rows : JSON de cada registro para o JSONB (iterrows + json.dumps com
+           default=str, como antes, x frame_to_json)
+  - sse  : formatação dos eventos de token do SSE (json.dumps x sse_event)
+  - gzip/br : bytes e tempo de CPU para comprimir um corpo JSON grande
+           (lista de registros, como numa resposta de dados)
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_serialization [--size-mb 1] [--repeat 3] [--output out.json]
+"""
+import argparse
+import gzip
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+# Allow running from the backend/ directory without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.generators import generate
+from config import settings
+from middleware.compression import brotli
+from services.csv_service import CSVService
+from services.serialization import dumps, frame_to_json, sse_event
+
+MB = 1024 * 1024
+
+
+def _median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 2)
+
+
+def _stdlib_rows(df) -> List[str]:
+    """The former save_dataframe encoding."""
+    return [
+        json.dumps(
+            {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in row.to_dict().items()},
+            default=str,
+        )
+        for _, row in df.iterrows()
+    ]
+
+
+def bench_rows(kind: str, size_mb: float, repeat: int) -> dict:
+    df, _ = CSVService.validate_and_parse_csv(generate(kind, int(size_mb * MB)), f"{kind}.csv")
+    before = _median_ms(lambda: _stdlib_rows(df), repeat)
+    after = _median_ms(lambda: frame_to_json(df), repeat)
+    return {
+        "case": f"rows/{kind}",
+        "items": len(df),
+        "stdlib_ms": before,
+        "orjson_ms": after,
+        "speedup": round(before / after, 1) if after else None,
+    }
+
+
+def bench_sse(tokens: int, repeat: int) -> dict:
+    words = [f" palavra{i % 97}" for i in range(tokens)]
+
+    def stdlib():
+        return [f"id: {i}\ndata: {json.dumps({'token': w}, ensure_ascii=False)}\n\n" for i, w in enumerate(words)]
+
+    def fast():
+        return [sse_event({"token": w}, event_id=i) for i, w in enumerate(words)]
+
+    before, after = _median_ms(stdlib, repeat), _median_ms(fast, repeat)
+    return {
+        "case": "sse/tokens",
+        "items": tokens,
+        "stdlib_ms": before,
+        "orjson_ms": after,
+        "speedup": round(before / after, 1) if after else None,
+    }
+
+
+def bench_compression(kind: str, size_mb: float, repeat: int) -> List[dict]:
+    df, _ = CSVService.validate_and_parse_csv(generate(kind, int(size_mb * MB)), f"{kind}.csv")
+    body = dumps({"records": df.to_dict("records")})
+    codings = {"gzip": lambda: gzip.compress(body, compresslevel=settings.compression_gzip_level, mtime=0)}
+    if brotli is not None:
+        codings["br"] = lambda: brotli.compress(body, quality=settings.compression_brotli_quality)
+
+    results = []
+    for coding, fn in codings.items():
+        compressed = fn()
+        results.append({
+            "case": f"{coding}/{kind}",
+            "raw_bytes": len(body),
+            "compressed_bytes": len(compressed),
+            "ratio": round(len(body) / len(compressed), 1),
+            "compress_ms": _median_ms(fn, repeat),
+        })
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=1.0)
+    parser.add_argument("--kinds", default="visnir,pxrf,generic")
+    parser.add_argument("--tokens", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="arquivo JSON para os resultados")
+    args = parser.parse_args(argv)
+
+    # The parsers log every file (and every column) at INFO
+    logging.basicConfig(level=logging.WARNING)
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+
+    serialization = [bench_rows(kind, args.size_mb, args.repeat) for kind in kinds]
+    serialization.append(bench_sse(args.tokens, args.repeat))
+    compression = [r for kind in kinds for r in bench_compression(kind, args.size_mb, args.repeat)]
+
+    print(f"{'caso':>16} {'itens':>8} {'json ms':>10} {'orjson ms':>10} {'ganho':>7}")
+    for r in serialization:
+        print(f"{r['case']:>16} {r['items']:>8} {r['stdlib_ms']:>10.1f} {r['orjson_ms']:>10.1f} {r['speedup']:>6}x")
+    print(f"\n{'caso':>16} {'bytes':>10} {'comprimido':>11} {'razão':>7} {'ms':>8}")
+    for r in compression:
+        print(f"{r['case']:>16} {r['raw_bytes']:>10} {r['compressed_bytes']:>11} {r['ratio']:>6}x {r['compress_ms']:>8.1f}")
+    if brotli is None:
+        print("\n(brotli não instalado: só gzip)")
+
+    if args.output:
+        report = {
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "serialization": serialization,
+            "compression": compression,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
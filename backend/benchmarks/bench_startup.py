@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tempo de partida da API.
+
+Cada medição roda num processo Python novo (imports frios de verdade) e
+registra:
+  - import_ms : `import main`
+  - ready_ms  : import + lifespan até a aplicação aceitar requisições
+                (migrações do esquema incluídas; pulado com --skip-db)
+  - warm_ms   : até o pré-carregamento em segundo plano das dependências de
+                IA e do índice vetorial terminar
+
+Também lista os módulos com maior tempo de import acumulado (python -X
+importtime), para achar o que entrou no caminho de partida.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_startup [--repeat 5] [--skip-db] [--output out.json]
+    python -m benchmarks.bench_startup --max-ready-ms 1500   # sai com 1 se passar disso
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import List, Optional
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Runs in the child process; prints one JSON line with the timings.
+_PROBE = """
+import asyncio, json, logging, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+result = {"import_ms": (imported - started) * 1000}
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        result["ready_ms"] = (time.perf_counter() - started) * 1000
+        while not main._warmup_state["ready"]:
+            await asyncio.sleep(0.01)
+        result["warm_ms"] = (time.perf_counter() - started) * 1000
+
+if WITH_DB:
+    logging.disable(logging.CRITICAL)
+    asyncio.run(boot())
+print(json.dumps(result))
+"""
+
+
+def _probe(with_db: bool) -> dict:
+    code = _PROBE.replace("WITH_DB", str(with_db))
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int) -> List[dict]:
+    """Modules with the largest cumulative import time under `import main`."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only direct imports of main: nested ones are counted in their parent
+        if name.startswith("   ") and not name.startswith("     "):
+            modules.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return modules[:top]
+
+
+def run(repeat: int, with_db: bool) -> dict:
+    samples = [_probe(with_db) for _ in range(repeat)]
+    summary = {}
+    for key in ("import_ms", "ready_ms", "warm_ms"):
+        values = [s[key] for s in samples if key in s]
+        if values:
+            summary[key] = {
+                "median": round(statistics.median(values), 1),
+                "min": round(min(values), 1),
+                "max": round(max(values), 1),
+            }
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-db", action="store_true", help="medir só o import (sem lifespan/migrações)")
+    parser.add_argument("--top", type=int, default=10, help="quantos módulos listar")
+    parser.add_argument("--max-ready-ms", type=float, help="falhar se a mediana até ficar pronta passar disso")
+    parser.add_argument("--output", help="arquivo JSON para os resultados")
+    args = parser.parse_args(argv)
+
+    summary = run(args.repeat, not args.skip_db)
+    imports = slowest_imports(args.top)
+
+    print(f"{'medida':>10} {'mediana':>10} {'mín':>10} {'máx':>10}")
+    for key, s in summary.items():
+        print(f"{key:>10} {s['median']:>10.1f} {s['min']:>10.1f} {s['max']:>10.1f}")
+    print("\nImports mais lentos em `import main`:")
+    for m in imports:
+        print(f"  {m['cumulative_ms']:>8.1f} ms  {m['module']}")
+
+    if args.output:
+        report = {
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "startup": summary,
+            "slowest_imports": imports,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    budget_key = "ready_ms" if "ready_ms" in summary else "import_ms"
+    if args.max_ready_ms is not None and summary[budget_key]["median"] > args.max_ready_ms:
+        print(f"\n{budget_key} mediano {summary[budget_key]['median']:.0f} ms acima do limite de {args.max_ready_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memória do índice vetorial x recall@k para cada combinação de
+dimensão, redução (truncate/pca) e quantização dos vetores de re-ranking.
+
+Usa os vetores completos salvos pelo FullVectorStore quando existem
+(corpus real); caso contrário gera um corpus sintético com espectro de
+variância decrescente, parecido com o de embeddings Matryoshka.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_vector_storage [--vectors 5000] [--queries 200] [--output out.json]
+    python -m benchmarks.bench_vector_storage --fit-pca 256
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Allow running from the backend/ directory without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import settings
+from services.vector_storage import dequantize, fit_pca, quantize
+
+FULL_DIM = 3072
+DIMENSIONS = (1536, 768, 512, 256, 128)
+RERANK_DTYPES = ("none", "float32", "float16", "int8")
+DTYPE_BYTES = {"float32": 4, "float16": 2, "int8": 1}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def load_corpus_vectors(limit: int) -> tuple[np.ndarray, str]:
+    """Full-dimension vectors from the re-ranking sidecar, if any were stored."""
+    directory = os.path.join(settings.chroma_persist_dir, "full_vectors")
+    chunks = []
+    paths = glob.glob(os.path.join(directory, "file_*.npz")) + glob.glob(os.path.join(directory, "file_*", "*.npz"))
+    for path in sorted(paths):
+        with np.load(path) as data:
+            chunks.append(dequantize(data["codes"], data["scales"] if "scales" in data.files else None))
+        if sum(len(c) for c in chunks) >= limit:
+            break
+    if not chunks:
+        return np.empty((0, FULL_DIM), dtype=np.float32), "none"
+    return np.concatenate(chunks)[:limit], directory
+
+
+def synthetic_corpus(n: int, dim: int, seed: int = 42) -> np.ndarray:
+    """Clustered vectors whose variance decays along the dimensions."""
+    rng = np.random.default_rng(seed)
+    scale = 1.0 / np.sqrt(np.arange(1, dim + 1, dtype=np.float32))
+    centers = rng.standard_normal((max(n // 20, 1), dim), dtype=np.float32) * scale
+    assignment = rng.integers(0, len(centers), n)
+    vectors = centers[assignment] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32) * scale
+    return _normalize(vectors)
+
+
+def _top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+class _Projections:
+    """Per-corpus state shared by every configuration (PCA axes, quantized copies)."""
+
+    def __init__(self, corpus: np.ndarray, max_dim: int):
+        self.corpus = corpus
+        self.mean = corpus.mean(axis=0)
+        # Principal axes from the eigenvectors of the (n x n) Gram matrix —
+        # much cheaper than a full SVD when n < dims.
+        centred = corpus - self.mean
+        eigvals, eigvecs = np.linalg.eigh(centred @ centred.T)
+        order = np.argsort(eigvals)[::-1][:max_dim]
+        axes = (centred.T @ eigvecs[:, order]).T
+        self.axes = _normalize(axes)
+        self._stored = {}
+
+    def project(self, vectors: np.ndarray, dim: int, reduction: str) -> np.ndarray:
+        if reduction == "pca":
+            return _normalize((vectors - self.mean) @ self.axes[:dim].T)
+        return _normalize(vectors[:, :dim])
+
+    def stored(self, dtype: str) -> np.ndarray:
+        """Corpus as it reads back from the re-ranking sidecar in `dtype`."""
+        if dtype not in self._stored:
+            self._stored[dtype] = dequantize(*quantize(self.corpus, dtype))
+        return self._stored[dtype]
+
+
+def evaluate(projections, queries, truth, dim, reduction, rerank_dtype, k, candidates) -> dict:
+    corpus = projections.corpus
+    full_dim = corpus.shape[1]
+    index = projections.project(corpus, dim, reduction)
+
+    started = time.perf_counter()
+    shortlist = _top_k(index, projections.project(queries, dim, reduction), candidates if rerank_dtype != "none" else k)
+
+    if rerank_dtype != "none":
+        stored = projections.stored(rerank_dtype)
+        found = []
+        for query, ids in zip(queries, shortlist):
+            scores = stored[ids] @ query
+            found.append(ids[np.argsort(-scores)[:k]])
+        found = np.asarray(found)
+    else:
+        found = shortlist
+    elapsed = time.perf_counter() - started
+
+    index_bytes = dim * 4
+    rerank_bytes = 0 if rerank_dtype == "none" else full_dim * DTYPE_BYTES[rerank_dtype]
+    if rerank_dtype == "int8":
+        rerank_bytes += 4  # per-vector scale
+    return {
+        "dimensions": dim,
+        "reduction": reduction,
+        "rerank_dtype": rerank_dtype,
+        f"recall@{k}": round(_recall(found, truth), 4),
+        "index_bytes_per_vector": index_bytes,
+        "rerank_bytes_per_vector": rerank_bytes,
+        "index_mb_per_million": round(index_bytes * 1e6 / 2**20, 1),
+        "rerank_mb_per_million": round(rerank_bytes * 1e6 / 2**20, 1),
+        "query_ms": round(elapsed * 1000 / len(queries), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=settings.vector_rerank_candidates)
+    parser.add_argument("--fit-pca", type=int, metavar="DIM", help="ajusta e salva o PCA no corpus real e sai")
+    parser.add_argument("--output", help="arquivo JSON para os resultados")
+    args = parser.parse_args()
+
+    corpus, source = load_corpus_vectors(args.vectors)
+
+    if args.fit_pca:
+        if len(corpus) < args.fit_pca:
+            sys.exit(f"Corpus real insuficiente ({len(corpus)} vetores) para PCA com {args.fit_pca} dimensões")
+        fit_pca(corpus, args.fit_pca)
+        print(f"PCA salvo em {settings.chroma_persist_dir}/pca_{args.fit_pca}.npz")
+        return
+
+    if len(corpus) < args.queries * 2:
+        corpus, source = synthetic_corpus(args.vectors, FULL_DIM), "synthetic"
+    corpus = _normalize(corpus.astype(np.float32))
+
+    rng = np.random.default_rng(7)
+    picks = rng.choice(len(corpus), args.queries, replace=False)
+    queries = _normalize(corpus[picks] + 0.05 * rng.standard_normal((args.queries, corpus.shape[1]), dtype=np.float32))
+
+    projections = _Projections(corpus, max(DIMENSIONS))
+    truth = _top_k(corpus, queries, args.k)
+    run = lambda dim, reduction, dtype: evaluate(  # noqa: E731
+        projections, queries, truth, dim, reduction, dtype, args.k, args.candidates
+    )
+
+    results = [run(corpus.shape[1], "truncate", "none")]
+    for dim in DIMENSIONS:
+        for reduction in ("truncate", "pca"):
+            if reduction == "pca" and dim >= len(corpus):
+                continue
+            for rerank_dtype in RERANK_DTYPES:
+                results.append(run(dim, reduction, rerank_dtype))
+
+    recall_key = f"recall@{args.k}"
+    print(f"Corpus: {source} ({len(corpus)} vetores x {corpus.shape[1]} dims), {args.queries} consultas\n")
+    print(f"{'dims':>5} {'redução':>9} {'re-rank':>8} {recall_key:>10} {'índice MB/M':>12} {'re-rank MB/M':>13} {'ms/consulta':>12}")
+    for r in results:
+        print(
+            f"{r['dimensions']:>5} {r['reduction']:>9} {r['rerank_dtype']:>8} {r[recall_key]:>10.4f} "
+            f"{r['index_mb_per_million']:>12.1f} {r['rerank_mb_per_million']:>13.1f} {r['query_ms']:>12.3f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"source": source, "vectors": len(corpus), "queries": args.queries, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Geradores de CSV sintéticos no formato de cada instrumento.
+
+Cada gerador produz bytes que passam por CSVService.validate_and_parse_csv
+com o tipo correto, reproduzindo o que deixa cada parser caro: Visnir largo
+com vírgula decimal, Nix com preâmbulo `sep=` e notação científica, pXRF com
+blocos `File #` repetidos e `< LOD`, e um CSV genérico estreito.
+"""
+import random
+from typing import Callable, Dict, List
+
+CSV_KINDS = ("visnir", "nix", "pxrf", "generic")
+
+_PXRF_ELEMENTS = [
+    "Mg", "Al", "Si", "P", "S", "Cl", "K", "Ca", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni",
+    "Cu", "Zn", "As", "Se", "Rb", "Sr", "Y", "Zr", "Nb", "Mo", "Ag", "Cd", "Sn", "Sb", "Ba", "Pb", "Th",
+]
+
+
+def _comma(value: float, digits: int = 4) -> str:
+    return f"{value:.{digits}f}".replace(".", ",")
+
+
+def _fill(header: str, make_row: Callable[[int], str], target_bytes: int, preamble: str = "") -> bytes:
+    """Append rows until the file reaches `target_bytes` (at least one row)."""
+    lines = [preamble + header] if preamble else [header]
+    size = sum(len(line) + 1 for line in lines)
+    i = 0
+    while size < target_bytes or i == 0:
+        line = make_row(i)
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def visnir(target_bytes: int, seed: int = 1, step_nm: int = 1) -> bytes:
+    """One row per sample, one column per wavelength (350–2500 nm), `;` and decimal commas."""
+    rng = random.Random(seed)
+    wavelengths = list(range(350, 2501, step_nm))
+    header = "Wavelength;" + ";".join(str(wl) for wl in wavelengths)
+
+    def row(i: int) -> str:
+        base = rng.uniform(0.05, 0.4)
+        slope = rng.uniform(-0.00005, 0.0002)
+        values = (base + slope * (wl - 350) + rng.gauss(0, 0.002) for wl in wavelengths)
+        return f"S{i:05d};" + ";".join(_comma(v, 5) for v in values)
+
+    return _fill(header, row, target_bytes)
+
+
+def nix(target_bytes: int, seed: int = 2) -> bytes:
+    """`sep=;` line, two metadata lines, then colour readings with decimal commas and exponents."""
+    rng = random.Random(seed)
+    preamble = "sep=;\nNix Pro Color Sensor;Export\nDevice;NIX-0001\n"
+    header = "User Color Name;Date;L*;a*;b*;X;Y;Z;R;G;B;Hex;C;M;Y2;K"
+
+    def row(i: int) -> str:
+        l, a, b = rng.uniform(20, 70), rng.uniform(-5, 25), rng.uniform(0, 40)
+        xyz = [f"{rng.uniform(0.01, 0.6):.4E}".replace(".", ",") for _ in range(3)]
+        rgb = [rng.randint(0, 255) for _ in range(3)]
+        cmyk = [_comma(rng.uniform(0, 1), 3) for _ in range(4)]
+        return ";".join(
+            [f"Ponto {i}", "2024-03-01 10:00:00", _comma(l, 2), _comma(a, 2), _comma(b, 2), *xyz,
+             *map(str, rgb), "#{:02X}{:02X}{:02X}".format(*rgb), *cmyk]
+        )
+
+    return _fill(header, row, target_bytes, preamble)
+
+
+def pxrf(target_bytes: int, seed: int = 3, block_rows: int = 50) -> bytes:
+    """Blocks of readings, each under its own `File #` header with a different element subset."""
+    rng = random.Random(seed)
+    lines: List[str] = []
+    size = 0
+    i = 0
+    while size < target_bytes or i == 0:
+        elements = sorted(rng.sample(_PXRF_ELEMENTS, rng.randint(18, len(_PXRF_ELEMENTS))), key=_PXRF_ELEMENTS.index)
+        columns = ["File #", "DateTime", "Name", "Duration"]
+        for element in elements:
+            columns += [element, f"{element} Err"]
+        header = ";".join(columns)
+        lines.append(header)
+        size += len(header) + 1
+        for _ in range(block_rows):
+            values = [str(i), "2024-03-01 10:00", f"P-{i:05d}", "60"]
+            for _element in elements:
+                if rng.random() < 0.2:
+                    values += ["< LOD", "< LOD"]
+                else:
+                    values += [_comma(rng.uniform(1, 50000), 2), _comma(rng.uniform(1, 200), 2)]
+            line = ";".join(values)
+            lines.append(line)
+            size += len(line) + 1
+            i += 1
+            if size >= target_bytes:
+                break
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def generic(target_bytes: int, seed: int = 4) -> bytes:
+    """Narrow comma-separated soil table with dates and coordinates."""
+    rng = random.Random(seed)
+    header = "amostra,profundidade_cm,pH,argila,areia,silte,carbono_organico,latitude,longitude,data_coleta"
+
+    def row(i: int) -> str:
+        clay = rng.uniform(5, 70)
+        sand = rng.uniform(5, 95 - clay)
+        return (
+            f"G{i:06d},{rng.choice([10, 20, 40, 60])},{rng.uniform(3.8, 7.5):.2f},{clay:.1f},{sand:.1f},"
+            f"{100 - clay - sand:.1f},{rng.uniform(0.2, 4):.2f},{rng.uniform(-33, -5):.6f},"
+            f"{rng.uniform(-70, -35):.6f},2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        )
+
+    return _fill(header, row, target_bytes)
+
+
+GENERATORS: Dict[str, Callable[[int], bytes]] = {
+    "visnir": visnir,
+    "nix": nix,
+    "pxrf": pxrf,
+    "generic": generic,
+}
+
+
+def generate(kind: str, target_bytes: int, seed: int = 0) -> bytes:
+    """Synthetic CSV of `kind` with roughly `target_bytes` bytes (deterministic per seed)."""
+    return GENERATORS[kind](target_bytes, seed=seed + CSV_KINDS.index(kind) + 1)
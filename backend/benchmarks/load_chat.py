@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Teste de carga offline do chat (e de uploads) com LLM e embeddings falsos.
+
+Sobe a aplicação num servidor uvicorn em processo (socket Unix temporário,
+sem lifespan), com LLM_PROVIDER/EMBEDDING_PROVIDER forçados para "fake" e
+um diretório ChromaDB temporário, e dispara --sessions sessões simultâneas
+de --turns perguntas cada, uma fração delas por /api/chat/stream (SSE) e o
+resto por /api/chat. Opcionalmente envia --uploads CSVs sintéticos em
+paralelo (exige o PostgreSQL de DATABASE_URL).
+
+Relata p50/p95/p99 do tempo até o primeiro token (TTFT) e da latência
+total, o TTFT descontado da latência fixa do LLM falso (o custo da
+orquestração RAG em si), vazão em turnos/s e tokens/s, respostas 429, o
+crescimento de memória do processo e o tamanho de `_sessions` no fim.
+
+Uso (a partir de backend/):
+    python -m benchmarks.load_chat [--sessions 50] [--turns 4] [--stream-ratio 0.5]
+    python -m benchmarks.load_chat --uploads 4 --first-token-ms 0 --trace-memory --output load.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import List, Optional
+
+# Allow running from the backend/ directory without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+
+from config import settings
+
+MB = 1024 * 1024
+
+_QUESTIONS = [
+    "Quais amostras têm o maior teor de argila?",
+    "Qual o pH médio das amostras?",
+    "Quantas amostras existem no total?",
+    "Mostre a reflectância da amostra S00003 em 1450 nm.",
+    "Quais elementos passaram do limite de detecção no pXRF?",
+    "Compare a cor L* das leituras do Nix.",
+    "Liste as amostras coletadas a 20 cm de profundidade.",
+    "Qual a relação entre carbono orgânico e argila?",
+]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _summary(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": _ms(percentile(values, 50)),
+        "p95_ms": _ms(percentile(values, 95)),
+        "p99_ms": _ms(percentile(values, 99)),
+        "max_ms": _ms(max(values) if values else None),
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def _rss_mb() -> float:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MB
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _sessions_size() -> dict:
+    """Number of in-memory chat sessions and the bytes of text they hold."""
+    from services.chat_service import _sessions
+
+    text_bytes = 0
+    for history in _sessions.values():
+        text_bytes += sys.getsizeof(history.summary)
+        for question, answer in history.turns:
+            text_bytes += sys.getsizeof(question) + sys.getsizeof(answer)
+    return {"sessions": len(_sessions), "text_mb": round(text_bytes / MB, 3)}
+
+
+class _Stats:
+    def __init__(self):
+        self.ttft: List[float] = []
+        self.latency: List[float] = []
+        self.tokens = 0
+        self.turns = 0
+        self.rejected = 0
+        self.errors: List[str] = []
+        self.uploads: List[float] = []
+        self.upload_errors: List[str] = []
+
+
+async def _stream_turn(client: httpx.AsyncClient, payload: dict, stats: _Stats) -> None:
+    started = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    event = None
+    async with client.stream("POST", "/api/chat/stream", json=payload) as response:
+        if response.status_code == 429:
+            stats.rejected += 1
+            return
+        if response.status_code != 200:
+            stats.errors.append(f"stream HTTP {response.status_code}")
+            return
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:") and event is None:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                tokens += 1
+            elif line.startswith("data:") and event == "error":
+                stats.errors.append(f"stream: {line[5:].strip()}")
+                return
+            elif not line:
+                event = None
+
+    stats.latency.append(time.perf_counter() - started)
+    if first_token_at is not None:
+        stats.ttft.append(first_token_at - started)
+    stats.tokens += tokens
+    stats.turns += 1
+
+
+async def _plain_turn(client: httpx.AsyncClient, payload: dict, stats: _Stats) -> None:
+    started = time.perf_counter()
+    response = await client.post("/api/chat", json=payload)
+    if response.status_code == 429:
+        stats.rejected += 1
+        return
+    if response.status_code != 200:
+        stats.errors.append(f"chat HTTP {response.status_code}")
+        return
+    stats.latency.append(time.perf_counter() - started)
+    stats.tokens += settings.fake_llm_answer_tokens
+    stats.turns += 1
+
+
+async def _session(client: httpx.AsyncClient, index: int, turns: int, streaming: bool, stats: _Stats) -> None:
+    rng = random.Random(index)
+    session_id = f"load-{index}"
+    for _ in range(turns):
+        payload = {"message": rng.choice(_QUESTIONS), "session_id": session_id}
+        try:
+            if streaming:
+                await _stream_turn(client, payload, stats)
+            else:
+                await _plain_turn(client, payload, stats)
+        except httpx.HTTPError as e:
+            stats.errors.append(f"{e.__class__.__name__}: {e}")
+
+
+async def _upload(client: httpx.AsyncClient, index: int, size_mb: float, stats: _Stats) -> None:
+    from benchmarks.generators import CSV_KINDS, generate
+
+    kind = CSV_KINDS[index % len(CSV_KINDS)]
+    data = generate(kind, int(size_mb * MB), seed=index)
+    started = time.perf_counter()
+    try:
+        response = await client.post("/api/upload", files={"csvFile": (f"load_{kind}_{index}.csv", data, "text/csv")})
+    except httpx.HTTPError as e:
+        stats.upload_errors.append(f"{e.__class__.__name__}: {e}")
+        return
+    if response.status_code == 200:
+        stats.uploads.append(time.perf_counter() - started)
+    else:
+        stats.upload_errors.append(f"upload HTTP {response.status_code}: {response.text[:200]}")
+
+
+async def _serve(socket_path: str):
+    import uvicorn
+
+    from main import app
+
+    # No lifespan: init_db needs TimescaleDB, and the temporary index is empty.
+    config = uvicorn.Config(app, uds=socket_path, lifespan="off", log_level="warning")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+async def run(args) -> dict:
+    uploads = args.uploads
+    if uploads:
+        from benchmarks.bench_ingestion import _prepare_db
+
+        if not await _prepare_db():
+            uploads = 0
+
+    tmp = tempfile.mkdtemp(prefix="portaltcc-load-")
+    socket_path = os.path.join(tmp, "api.sock")
+    server, server_task = await _serve(socket_path)
+
+    stats = _Stats()
+    rss_before = _rss_mb()
+    if args.trace_memory:
+        tracemalloc.start()
+    traced_before = tracemalloc.get_traced_memory()[0] if args.trace_memory else 0
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    transport = httpx.AsyncHTTPTransport(uds=socket_path, limits=limits)
+    timeout = httpx.Timeout(args.timeout)
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+            streaming = int(round(args.sessions * args.stream_ratio))
+            jobs = [_session(client, i, args.turns, i < streaming, stats) for i in range(args.sessions)]
+            jobs += [_upload(client, i, args.upload_mb, stats) for i in range(uploads)]
+            await asyncio.gather(*jobs)
+    finally:
+        elapsed = time.perf_counter() - started
+        server.should_exit = True
+        await server_task
+
+    traced_after = tracemalloc.get_traced_memory()[0] if args.trace_memory else 0
+    if args.trace_memory:
+        tracemalloc.stop()
+
+    first_token = settings.fake_llm_first_token_ms / 1000
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "sessions": args.sessions,
+            "turns": args.turns,
+            "stream_ratio": args.stream_ratio,
+            "uploads": uploads,
+            "first_token_ms": settings.fake_llm_first_token_ms,
+            "tokens_per_sec": settings.fake_llm_tokens_per_sec,
+            "answer_tokens": settings.fake_llm_answer_tokens,
+            "embedding_latency_ms": settings.fake_embedding_latency_ms,
+            "chat_max_concurrent": settings.chat_max_concurrent,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "turns": stats.turns,
+        "turns_per_sec": round(stats.turns / elapsed, 2) if elapsed else None,
+        "tokens_per_sec": round(stats.tokens / elapsed, 1) if elapsed else None,
+        "rejected_429": stats.rejected,
+        "errors": stats.errors[:20],
+        "error_count": len(stats.errors),
+        "ttft": _summary(stats.ttft),
+        "ttft_overhead": _summary([max(t - first_token, 0.0) for t in stats.ttft]),
+        "latency": _summary(stats.latency),
+        "uploads": {**_summary(stats.uploads), "errors": stats.upload_errors[:20]},
+        "memory": {
+            "rss_before_mb": round(rss_before, 1),
+            "rss_after_mb": round(_rss_mb(), 1),
+            "traced_growth_mb": round((traced_after - traced_before) / MB, 2) if args.trace_memory else None,
+            **_sessions_size(),
+        },
+    }
+
+
+def _print(report: dict) -> None:
+    print(f"Duração: {report['elapsed_s']} s, {report['turns']} turnos "
+          f"({report['turns_per_sec']} turnos/s, {report['tokens_per_sec']} tokens/s)")
+    print(f"Rejeitados (429): {report['rejected_429']}, erros: {report['error_count']}")
+    for name, label in (("ttft", "TTFT"), ("ttft_overhead", "TTFT - LLM"), ("latency", "Latência"), ("uploads", "Upload")):
+        s = report[name]
+        if s["count"]:
+            print(f"{label:>11}: n={s['count']:<5} p50={s['p50_ms']} ms  p95={s['p95_ms']} ms  "
+                  f"p99={s['p99_ms']} ms  max={s['max_ms']} ms")
+    m = report["memory"]
+    print(f"Memória: RSS {m['rss_before_mb']} → {m['rss_after_mb']} MB"
+          + (f", tracemalloc +{m['traced_growth_mb']} MB" if m["traced_growth_mb"] is not None else "")
+          + f"; {m['sessions']} sessão(ões) com {m['text_mb']} MB de texto")
+    for error in report["errors"][:5] + report["uploads"]["errors"][:5]:
+        print(f"  - {error}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="sessões de chat simultâneas")
+    parser.add_argument("--turns", type=int, default=4, help="perguntas por sessão")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="fração das sessões que usa SSE")
+    parser.add_argument("--uploads", type=int, default=0, help="uploads simultâneos (exige PostgreSQL)")
+    parser.add_argument("--upload-mb", type=float, default=0.1)
+    parser.add_argument("--first-token-ms", type=float, default=settings.fake_llm_first_token_ms)
+    parser.add_argument("--tokens-per-sec", type=float, default=settings.fake_llm_tokens_per_sec)
+    parser.add_argument("--answer-tokens", type=int, default=settings.fake_llm_answer_tokens)
+    parser.add_argument("--embedding-latency-ms", type=float, default=settings.fake_embedding_latency_ms)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--trace-memory", action="store_true", help="medir crescimento com tracemalloc (mais lento)")
+    parser.add_argument("--output", help="arquivo JSON para o relatório")
+    args = parser.parse_args(argv)
+
+    settings.llm_provider = "fake"
+    settings.embedding_provider = "fake"
+    settings.fake_llm_first_token_ms = args.first_token_ms
+    settings.fake_llm_tokens_per_sec = args.tokens_per_sec
+    settings.fake_llm_answer_tokens = args.answer_tokens
+    settings.fake_embedding_latency_ms = args.embedding_latency_ms
+    settings.vector_service_url = ""
+    settings.chroma_persist_dir = tempfile.mkdtemp(prefix="portaltcc-load-chroma-")
+
+    logging.basicConfig(level=logging.WARNING)
+    # main.py configures INFO logging on import; keep the run quiet.
+    from main import app  # noqa: F401
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = asyncio.run(run(args))
+    _print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,22 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy import text
 from config import settings
+from db import query_log
+from db.migrations import migrate
 
 logger = logging.getLogger(__name__)
 
-engine = create_async_engine(settings.database_url, echo=False, pool_pre_ping=True)
+engine = create_async_engine(
+    settings.database_url,
+    echo=False,
+    pool_pre_ping=True,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+)
+
+query_log.install(engine)
 
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
@@ -23,80 +33,41 @@ async def get_db():
         yield session
 
 
-async def init_db() -> None:
+def pool_status() -> dict:
+    """Checked-out / idle connection counts of the engine pool."""
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.db_max_overflow,
+    }
+
+
+async def init_db() -> int:
     """
-    Initialize PostgreSQL extensions, tables, and indexes.
+    Bring the PostgreSQL schema up to date (see db/migrations.py).
 
     Extensions required:
       - timescaledb  (time-series partitioning for the records table)
 
-    Tables created:
+    Tables:
       - files   : metadata for each uploaded CSV file
       - records : individual CSV rows stored as JSONB; converted to a
                   TimescaleDB hypertable partitioned by uploaded_at
+      - query_plans : EXPLAIN plans captured for slow queries
+      - schema_version : applied migrations
+
+    Only a version check runs when the schema is current; DDL runs (under
+    an advisory lock) only when a migration is pending.
 
     Note: vector embeddings are stored externally in ChromaDB
     (see services/embedding_service.py), not in PostgreSQL.
-    """
-    async with engine.begin() as conn:
-        # ------------------------------------------------------------------
-        # Extensions
-        # ------------------------------------------------------------------
-        await conn.execute(
-            text("CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE")
-        )
 
-        # ------------------------------------------------------------------
-        # files table — one row per uploaded CSV file
-        # ------------------------------------------------------------------
-        await conn.execute(
-            text("""
-                CREATE TABLE IF NOT EXISTS files (
-                    id           SERIAL PRIMARY KEY,
-                    file_name    VARCHAR(255)  NOT NULL,
-                    rows_count   INTEGER       NOT NULL,
-                    columns_list TEXT[]        NOT NULL,
-                    uploaded_at  TIMESTAMPTZ   NOT NULL DEFAULT NOW()
-                )
-            """)
-        )
-
-        # ------------------------------------------------------------------
-        # records table — individual CSV rows as JSONB
-        # PRIMARY KEY must include the time column for TimescaleDB
-        # ------------------------------------------------------------------
-        await conn.execute(
-            text("""
-                CREATE TABLE IF NOT EXISTS records (
-                    id          BIGSERIAL,
-                    file_id     INTEGER     REFERENCES files(id) ON DELETE CASCADE,
-                    data        JSONB       NOT NULL,
-                    uploaded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    PRIMARY KEY (id, uploaded_at)
-                )
-            """)
-        )
-
-        # Convert records to a TimescaleDB hypertable (idempotent)
-        await conn.execute(
-            text(
-                "SELECT create_hypertable("
-                "  'records', 'uploaded_at', if_not_exists => TRUE"
-                ")"
-            )
-        )
-
-        await conn.execute(
-            text(
-                "CREATE INDEX IF NOT EXISTS idx_records_data "
-                "ON records USING GIN (data)"
-            )
-        )
-        await conn.execute(
-            text(
-                "CREATE INDEX IF NOT EXISTS idx_records_file_id "
-                "ON records(file_id)"
-            )
-        )
-
-    logger.info("Database initialized successfully")
\ No newline at end of file
+    Returns:
+        Número de migrações aplicadas.
+    """
+    applied = await migrate(engine)
+    logger.info("Database initialized successfully")
+    return applied
@@ -0,0 +1,175 @@
+"""
+Versioned schema migrations.
+
+The schema version lives in the schema_version table. On startup a single
+SELECT compares it with the latest migration; only when something is
+pending is the DDL run — under an advisory lock, so that instances booting
+together during a rolling restart apply it once and the others just wait
+and re-check. Each pending migration runs in its own transaction.
+
+Indexes on records are declared apart (Migration.indexes) and built after
+their migration's transaction commits, with
+timescaledb.transaction_per_chunk: one short transaction per chunk, so
+the SHARE lock that blocks inserts is held on one chunk at a time instead
+of on the whole hypertable until startup finishes. A build that fails
+leaves an invalid index, which is dropped and rebuilt on the next boot;
+the migration is only recorded once its indexes are in place.
+
+Migrations 1–4 reproduce the DDL that init_db used to run on every boot.
+They are all idempotent (IF NOT EXISTS), so databases created before this
+table existed are adopted without changes.
+
+To change the schema, append a Migration with the next version; never edit
+one that has shipped.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_xact_lock, shared by every API instance
+_LOCK_KEY = 7_420_117
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: List[str]
+    # (name, "ON records ...") — built per chunk, outside the transaction
+    indexes: List[Tuple[str, str]] = field(default_factory=list)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "tabelas files e records (hypertable) e índices", [
+        "CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE",
+        """
+        CREATE TABLE IF NOT EXISTS files (
+            id           SERIAL PRIMARY KEY,
+            file_name    VARCHAR(255)  NOT NULL,
+            rows_count   INTEGER       NOT NULL,
+            columns_list TEXT[]        NOT NULL,
+            uploaded_at  TIMESTAMPTZ   NOT NULL DEFAULT NOW()
+        )
+        """,
+        # PRIMARY KEY must include the time column for TimescaleDB
+        """
+        CREATE TABLE IF NOT EXISTS records (
+            id          BIGSERIAL,
+            file_id     INTEGER     REFERENCES files(id) ON DELETE CASCADE,
+            data        JSONB       NOT NULL,
+            uploaded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (id, uploaded_at)
+        )
+        """,
+        "SELECT create_hypertable('records', 'uploaded_at', if_not_exists => TRUE)",
+    ], indexes=[
+        ("idx_records_data", "ON records USING GIN (data)"),
+        ("idx_records_file_id", "ON records(file_id)"),
+    ]),
+    # Detected CSV type and row position, needed to rebuild a file's
+    # embedding documents when reindexing (Chroma id file_{id}_record_{index})
+    Migration(2, "files.csv_type e records.record_index", [
+        "ALTER TABLE files ADD COLUMN IF NOT EXISTS csv_type VARCHAR(20)",
+        "ALTER TABLE records ADD COLUMN IF NOT EXISTS record_index INTEGER",
+    ], indexes=[
+        ("idx_records_file_record", "ON records(file_id, record_index)"),
+    ]),
+    # Exact sample lookups (hybrid retrieval) — data->>'amostra' = ANY(...)
+    Migration(3, "índice para busca exata por amostra", [], indexes=[
+        ("idx_records_amostra", "ON records ((data->>'amostra'))"),
+    ]),
+    # EXPLAIN plans of repeatedly slow queries (db/query_log.py)
+    Migration(4, "tabela query_plans", [
+        """
+        CREATE TABLE IF NOT EXISTS query_plans (
+            id          SERIAL PRIMARY KEY,
+            captured_at TIMESTAMPTZ      NOT NULL DEFAULT NOW(),
+            fingerprint VARCHAR(16)      NOT NULL,
+            statement   TEXT             NOT NULL,
+            duration_ms DOUBLE PRECISION NOT NULL,
+            plan        JSONB            NOT NULL
+        )
+        """,
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+async def current_version(conn) -> int:
+    """Applied schema version (0 for a database without schema_version)."""
+    exists = await conn.scalar(text("SELECT to_regclass('schema_version') IS NOT NULL"))
+    if not exists:
+        return 0
+    return await conn.scalar(text("SELECT COALESCE(MAX(version), 0) FROM schema_version"))
+
+
+async def _build_index(conn, name: str, definition: str) -> None:
+    """Build one records index per chunk on an autocommit connection."""
+    valid = await conn.scalar(
+        text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"),
+        {"name": name},
+    )
+    if valid:
+        return
+    if valid is not None:
+        logger.warning(f"Índice {name} inválido (build interrompido); recriando")
+        await conn.execute(text(f"DROP INDEX {name}"))
+    logger.info(f"Criando índice {name} (uma transação por chunk)")
+    await conn.execute(
+        text(f"CREATE INDEX IF NOT EXISTS {name} {definition} WITH (timescaledb.transaction_per_chunk)")
+    )
+
+
+async def migrate(engine) -> int:
+    """
+    Bring the schema up to SCHEMA_VERSION.
+
+    Returns:
+        Número de migrações aplicadas (0 quando o esquema já está atualizado).
+    """
+    async with engine.connect() as conn:
+        version = await current_version(conn)
+    if version >= SCHEMA_VERSION:
+        logger.info(f"Esquema do banco atualizado (versão {version})")
+        return 0
+
+    # Session-level lock on an autocommit connection: the per-chunk index
+    # builds cannot run inside a transaction block
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _LOCK_KEY})
+        try:
+            await lock_conn.execute(
+                text("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version     INTEGER     PRIMARY KEY,
+                        description TEXT        NOT NULL,
+                        applied_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                    )
+                """)
+            )
+            # Another instance may have migrated while this one waited for the lock
+            version = await current_version(lock_conn)
+            pending = [m for m in MIGRATIONS if m.version > version]
+            for migration in pending:
+                logger.info(f"Aplicando migração {migration.version}: {migration.description}")
+                async with engine.begin() as conn:
+                    for statement in migration.statements:
+                        await conn.execute(text(statement))
+                for name, definition in migration.indexes:
+                    await _build_index(lock_conn, name, definition)
+                await lock_conn.execute(
+                    text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                    {"version": migration.version, "description": migration.description},
+                )
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+
+    if pending:
+        logger.info(f"Esquema do banco migrado para a versão {SCHEMA_VERSION}")
+    return len(pending)
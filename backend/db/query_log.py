@@ -0,0 +1,237 @@
+"""
+Slow-query log with sampled EXPLAIN capture.
+
+Every statement run through the SQLAlchemy engine (and through raw asyncpg
+connections that register `asyncpg_query_logger`) is timed into
+portaltcc_db_query_seconds. Statements slower than `slow_query_ms` are
+logged with the shape of their parameters — never the values — and
+counted per fingerprint. Once a read-only statement has been slow
+`slow_query_explain_after` times, a sampled fraction of its later slow runs
+is re-executed as EXPLAIN (ANALYZE, BUFFERS) on a separate connection, in a
+read-only transaction, and the plan is stored in the query_plans table
+(at most once per `slow_query_explain_interval_seconds` per fingerprint).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, text
+
+from config import settings
+from services.metrics import DB_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Execution option that keeps a statement out of the log (the capture's own queries)
+SKIP_OPTION = "skip_query_log"
+
+_MAX_FINGERPRINTS = 500
+_STATEMENT_LOG_CHARS = 300
+_EXPLAIN_TIMEOUT_MS = 30_000
+
+_slow: "OrderedDict[str, dict]" = OrderedDict()
+_capturing: set = set()
+_background: set = set()
+
+_WHITESPACE = re.compile(r"\s+")
+_PARAM_LIST = re.compile(r"\$\d+(\s*,\s*\$\d+)*")
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+def fingerprint(statement: str) -> str:
+    """Stable id for a statement: whitespace collapsed, expanded IN-lists folded."""
+    normalized = _PARAM_LIST.sub("$n", _WHITESPACE.sub(" ", statement).strip())
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def _kind(statement: str) -> str:
+    match = re.match(r"\s*(\w+)", statement)
+    return match.group(1).upper() if match else "?"
+
+
+def params_shape(parameters: Any, executemany: bool = False) -> str:
+    """Describe bound parameters by count and type only (values may be user data)."""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = params_shape(parameters[0]) if parameters else "()"
+        return f"{len(parameters)}x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {_type_name(v)}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_type_name(v) for v in parameters) + ")"
+    return "()" if parameters is None else _type_name(parameters)
+
+
+def _type_name(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    if isinstance(value, (str, bytes)) and len(value) > 64:
+        return f"{type(value).__name__}({len(value)})"
+    return type(value).__name__
+
+
+def record(statement: str, parameters: Any, elapsed: float, executemany: bool = False) -> None:
+    """Time one statement; log it and maybe capture its plan when it is slow."""
+    kind = _kind(statement)
+    DB_QUERY_SECONDS.labels(kind).observe(elapsed)
+    if settings.slow_query_ms <= 0 or elapsed * 1000 < settings.slow_query_ms:
+        return
+
+    fp = fingerprint(statement)
+    entry = _slow.pop(fp, None) or {
+        "fingerprint": fp,
+        "statement": _WHITESPACE.sub(" ", statement).strip()[:2000],
+        "count": 0,
+        "total_ms": 0.0,
+        "max_ms": 0.0,
+        "last_explained": 0.0,
+    }
+    entry["count"] += 1
+    entry["total_ms"] += elapsed * 1000
+    entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+    entry["last_seen"] = time.time()
+    _slow[fp] = entry
+    while len(_slow) > _MAX_FINGERPRINTS:
+        _slow.popitem(last=False)
+
+    shape = params_shape(parameters, executemany)
+    logger.warning(
+        f"Query lenta ({elapsed * 1000:.0f} ms, {entry['count']}x) [{fp}] "
+        f"{entry['statement'][:_STATEMENT_LOG_CHARS]} | parâmetros: {shape}"
+    )
+
+    if _should_explain(entry, statement, executemany):
+        entry["last_explained"] = time.time()
+        _schedule_explain(entry, statement, parameters)
+
+
+def _should_explain(entry: dict, statement: str, executemany: bool) -> bool:
+    # EXPLAIN ANALYZE runs the statement: never for anything that writes.
+    if executemany or not _READ_ONLY.match(statement) or _WRITES.search(statement):
+        return False
+    if entry["count"] < settings.slow_query_explain_after or entry["fingerprint"] in _capturing:
+        return False
+    if time.time() - entry["last_explained"] < settings.slow_query_explain_interval_seconds:
+        return False
+    return random.random() < settings.slow_query_explain_sample_rate
+
+
+def _schedule_explain(entry: dict, statement: str, parameters: Any) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _capturing.add(entry["fingerprint"])
+    task = loop.create_task(capture_plan(entry["fingerprint"], statement, parameters, entry["max_ms"]))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def capture_plan(fp: str, statement: str, parameters: Any, duration_ms: float) -> None:
+    """Run EXPLAIN (ANALYZE, BUFFERS) for a statement and store the plan."""
+    from db.connection import engine
+
+    try:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(**{SKIP_OPTION: True})
+            explain = await conn.begin()
+            try:
+                await conn.execute(text("SET TRANSACTION READ ONLY"))
+                await conn.execute(text(f"SET LOCAL statement_timeout = {_EXPLAIN_TIMEOUT_MS}"))
+                result = await conn.exec_driver_sql(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", tuple(parameters or ())
+                )
+                plan = result.scalar()
+            finally:
+                await explain.rollback()
+
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            async with conn.begin():
+                await conn.execute(
+                    text(
+                        "INSERT INTO query_plans (fingerprint, statement, duration_ms, plan) "
+                        "VALUES (:fp, :statement, :duration_ms, CAST(:plan AS JSONB))"
+                    ),
+                    {"fp": fp, "statement": statement, "duration_ms": duration_ms, "plan": json.dumps(plan)},
+                )
+                await conn.execute(
+                    text(
+                        "DELETE FROM query_plans WHERE id <= "
+                        "(SELECT id FROM query_plans ORDER BY id DESC OFFSET :keep LIMIT 1)"
+                    ),
+                    {"keep": settings.slow_query_plans_max},
+                )
+        logger.info(f"Plano capturado para a query [{fp}]")
+    except Exception as e:
+        logger.warning(f"Falha ao capturar EXPLAIN da query [{fp}]: {e}")
+    finally:
+        _capturing.discard(fp)
+
+
+def slow_queries() -> List[Dict[str, Any]]:
+    """Slow statements seen by this process, slowest (by max) first."""
+    return sorted(
+        ({**e, "avg_ms": round(e["total_ms"] / e["count"], 1)} for e in _slow.values()),
+        key=lambda e: e["max_ms"],
+        reverse=True,
+    )
+
+
+async def recent_plans(limit: int = 20, fp: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Most recently captured plans, optionally for one fingerprint."""
+    from db.connection import engine
+
+    query = "SELECT id, captured_at, fingerprint, statement, duration_ms, plan FROM query_plans"
+    params: Dict[str, Any] = {"limit": limit}
+    if fp:
+        query += " WHERE fingerprint = :fp"
+        params["fp"] = fp
+    query += " ORDER BY id DESC LIMIT :limit"
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(**{SKIP_OPTION: True})
+        rows = (await conn.execute(text(query), params)).mappings().all()
+    return [
+        {**row, "captured_at": row["captured_at"].isoformat(),
+         "plan": json.loads(row["plan"]) if isinstance(row["plan"], str) else row["plan"]}
+        for row in rows
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Hooks
+# ---------------------------------------------------------------------------
+
+def install(engine) -> None:
+    """Time every statement run through a SQLAlchemy (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        if context is not None and context.execution_options.get(SKIP_OPTION):
+            return
+        record(statement, parameters, time.perf_counter() - started, executemany)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        stack = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if stack:
+            stack.pop()
+
+
+def asyncpg_query_logger(logged_query) -> None:
+    """Callback for asyncpg's Connection.add_query_logger (raw connections, e.g. CLI scripts)."""
+    if logged_query.exception is None:
+        record(logged_query.query, logged_query.args, logged_query.elapsed)
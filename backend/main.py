@@ -1,28 +1,102 @@
 """Aplicação principal FastAPI."""
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+import asyncio
+import importlib
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 from db.connection import init_db
-from routes import upload, chat
+from middleware.compression import CompressionMiddleware
+from middleware.correlation import CorrelationIdMiddleware
+from middleware.profiling import ProfilingMiddleware
+from routes import upload, chat, admin, stats
+from services import analytics_service
+from services.admission_service import AdmissionRejected
+from services.batch_upload_service import shutdown_parse_pool
+from services.metrics import CorrelationIdFilter, render_metrics
+from services.model_clients import model_clients
+from services.serialization import OrjsonResponse
 from config import settings
 import logging
 
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
 )
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(CorrelationIdFilter())
 
 logger = logging.getLogger(__name__)
 
 
+# Heavy AI dependencies, kept off the import path of main and imported in
+# the background once the app is serving (or on first use, if sooner).
+_AI_MODULES = (
+    "langchain_core.messages",
+    "langchain_core.documents",
+    "langchain_google_genai",
+    "chromadb",
+)
+
+_warmup_state = {"ready": False, "seconds": None}
+
+
+def _warm_up_in_thread() -> None:
+    try:
+        for module in _AI_MODULES:
+            if module == "chromadb" and settings.vector_service_url:
+                continue
+            importlib.import_module(module)
+        logger.info("Dependências de IA carregadas")
+    except Exception as e:
+        # Not fatal here: the first request that needs the module will raise.
+        logger.warning(f"Falha ao pré-carregar dependências de IA: {e}")
+
+    # With a vector worker, the worker owns (and warms up) the index.
+    if settings.chroma_warmup and not settings.vector_service_url:
+        from services.embedding_service import warm_up_vector_stores
+
+        try:
+            warmed = warm_up_vector_stores()
+            logger.info(f"Índices vetoriais carregados: {warmed} coleção(ões)")
+        except Exception as e:
+            logger.warning(f"Falha no aquecimento do índice vetorial: {e}")
+
+
+async def _warm_up() -> None:
+    started = time.perf_counter()
+    await asyncio.to_thread(_warm_up_in_thread)
+    # In the loop: the clients' async transports bind to the running loop.
+    try:
+        await model_clients.warm_up()
+    except Exception as e:
+        logger.warning(f"Falha ao criar os clientes de modelo: {e}")
+    _warmup_state.update(ready=True, seconds=round(time.perf_counter() - started, 2))
+    logger.info(f"Aquecimento concluído em {_warmup_state['seconds']}s")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize the database on startup."""
+    """
+    Apply pending schema migrations, then start serving right away while
+    the AI dependencies, the vector index and the model clients load in
+    the background. On shutdown, close the model clients, the batch
+    parse pool and the analytics connection.
+    """
     logger.info("Initializing database...")
     await init_db()
     logger.info("Database ready")
+    app.state.model_clients = model_clients
+    warmup = asyncio.create_task(_warm_up())
     yield
+    if not warmup.done():
+        warmup.cancel()
+    await model_clients.close()
+    shutdown_parse_pool()
+    analytics_service.close()
 
 
 # Criar aplicação FastAPI
@@ -31,6 +105,7 @@ app = FastAPI(
     description="API para upload de dados CSV para PostgreSQL",
     version="2.0.0",
     lifespan=lifespan,
+    default_response_class=OrjsonResponse,
 )
 
 # Configurar CORS
@@ -40,11 +115,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Complete bodies only; SSE streams pass through uncompressed
+app.add_middleware(CompressionMiddleware)
+# Inside the correlation middleware, so profiles carry the request id
+app.add_middleware(ProfilingMiddleware)
+# Outermost: every request (CORS preflights included) gets an id and metrics
+app.add_middleware(CorrelationIdMiddleware)
 
 # Registrar rotas
 app.include_router(upload.router)
 app.include_router(chat.router)
+app.include_router(admin.router)
+app.include_router(stats.router)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Fila cheia: responde 429 imediatamente com Retry-After."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 @app.get("/")
@@ -57,10 +151,16 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas no formato de exposição do Prometheus."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
 async def health():
-    """Health check."""
-    return {"status": "healthy"}
+    """Health check; `warm` indica se dependências de IA e índice já foram carregados."""
+    return {"status": "healthy", "warm": _warmup_state["ready"]}
 
 
 if __name__ == "__main__":
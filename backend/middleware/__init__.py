@@ -0,0 +1 @@
+"""Middlewares ASGI da aplicação."""
@@ -0,0 +1,147 @@
+"""Compressão negociada (brotli/gzip) e ETag para respostas completas."""
+import gzip
+import hashlib
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+_COMPRESSIBLE = (b"application/json", b"text/", b"application/javascript", b"image/svg+xml")
+
+
+def _accepted(header: str) -> dict:
+    """Accept-Encoding → {coding: q}."""
+    codings = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            codings[coding.strip().lower()] = q
+    return codings
+
+
+def choose_encoding(header: str) -> str | None:
+    """Best supported coding the client accepts: br, then gzip."""
+    codings = _accepted(header)
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if codings.get(coding, codings.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=settings.compression_brotli_quality)
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level, mtime=0)
+
+
+def etag_for(body: bytes) -> str:
+    # Weak: the same representation is served raw, gzip'd or brotli'd.
+    return 'W/"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies of at least `compression_min_bytes` with the
+    best coding the client accepts, and tag large JSON GET responses with
+    an ETag, answering 304 when If-None-Match matches.
+
+    Only responses sent in a single body message are touched (JSON and
+    other complete bodies); streaming responses such as SSE pass through
+    unchanged, so tokens are never held back.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        coding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+        cacheable = scope["method"] in ("GET", "HEAD") and settings.etag_min_bytes > 0
+        if coding is None and not cacheable:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Streaming body: forward everything untouched.
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            await self._send_complete(send, start_message, message.get("body", b""), coding, cacheable, if_none_match)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    async def _send_complete(send, start_message, body, coding, cacheable, if_none_match):
+        response_headers = [(k, v) for k, v in start_message.get("headers", [])]
+        names = {k.lower() for k, _ in response_headers}
+        content_type = next((v for k, v in response_headers if k.lower() == b"content-type"), b"")
+        status = start_message["status"]
+
+        if (
+            cacheable
+            and status == 200
+            and content_type.startswith(b"application/json")
+            and len(body) >= settings.etag_min_bytes
+            and b"etag" not in names
+        ):
+            etag = etag_for(body)
+            response_headers.append((b"etag", etag.encode()))
+            if b"cache-control" not in names:
+                # Let browsers keep the body but revalidate every time.
+                response_headers.append((b"cache-control", b"no-cache"))
+            if etag in [tag.strip() for tag in if_none_match.split(",")]:
+                response_headers = [(k, v) for k, v in response_headers if k.lower() != b"content-length"]
+                await send({"type": "http.response.start", "status": 304, "headers": response_headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        if (
+            coding is not None
+            and status not in (204, 304)
+            and len(body) >= settings.compression_min_bytes
+            and content_type.startswith(_COMPRESSIBLE)
+            and b"content-encoding" not in names
+        ):
+            body = compress(body, coding)
+            response_headers = [(k, v) for k, v in response_headers if k.lower() != b"content-length"]
+            response_headers += [
+                (b"content-encoding", coding.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+
+        await send({**start_message, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
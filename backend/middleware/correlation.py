@@ -0,0 +1,49 @@
+"""Correlation id por requisição e métricas HTTP."""
+import time
+import uuid
+
+from services.metrics import HTTP_REQUESTS, HTTP_SECONDS, begin_request, end_request
+
+HEADER = b"x-request-id"
+
+
+class CorrelationIdMiddleware:
+    """
+    Assign each request a correlation id, taken from X-Request-ID when the
+    client sends one, echoed back in the response and attached to every log
+    line written while the request is handled.
+
+    Plain ASGI rather than BaseHTTPMiddleware so SSE responses stream
+    through untouched; the request is timed until its last body chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(HEADER, b"").decode("latin-1")[:64]
+        request_id = incoming or uuid.uuid4().hex[:16]
+        tokens = begin_request(request_id)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(HEADER, request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            # Route template, not the raw path, to keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.labels(scope["method"], route, str(status_code)).inc()
+            HTTP_SECONDS.labels(scope["method"], route).observe(elapsed)
+            end_request(tokens, f"{scope['method']} {scope['path']} {status_code} {elapsed * 1000:.1f}ms")
@@ -0,0 +1,66 @@
+"""Profiling opcional de requisições (ver services/profiling.py)."""
+import asyncio
+import logging
+import time
+
+from services import profiling
+from services.metrics import correlation_id
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests selected by services.profiling.should_profile and
+    store the result with the route, status, duration and body size.
+
+    When profiling is not configured the only per-request cost is one
+    settings check.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiling.enabled():
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if not profiling.should_profile(headers):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = profiling.RequestProfiler()
+        if not profiler.start():
+            logger.info(f"Profiling ignorado em {scope['path']}: outro perfil cProfile em andamento")
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profiler.stop()
+            meta = {
+                "method": scope["method"],
+                "route": getattr(scope.get("route"), "path", scope["path"]),
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "request_bytes": int(headers.get(b"content-length", b"0") or 0),
+                "request_id": correlation_id.get(),
+            }
+            try:
+                name = await asyncio.to_thread(profiler.save, meta)
+                logger.info(f"Perfil salvo: {name} ({meta['duration_ms']} ms)")
+            except OSError as e:
+                logger.warning(f"Falha ao salvar perfil da requisição: {e}")
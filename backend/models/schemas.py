@@ -1,6 +1,6 @@
 """Schemas Pydantic para validação de dados."""
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 
 class UploadResponse(BaseModel):
@@ -17,3 +17,44 @@ class ErrorResponse(BaseModel):
     success: bool = False
     error: str
     detail: Optional[str] = None
+
+
+class UploadSessionCreate(BaseModel):
+    """Início de um upload em partes."""
+    file_name: str
+    size: int
+    # "gzip"/"zstd" se o arquivo enviado estiver comprimido (ou pelo sufixo .gz/.zst)
+    content_encoding: Optional[str] = None
+
+
+class UploadSessionStatus(BaseModel):
+    """Estado de um upload em partes (para retomar)."""
+    upload_id: str
+    file_name: str
+    size: int
+    chunk_size: int
+    total_chunks: int
+    received: List[int]
+    csv_type: Optional[str] = None
+    content_encoding: Optional[str] = None
+
+
+class BatchFileResult(BaseModel):
+    """Resultado de um arquivo de um upload em lote."""
+    file_name: str
+    success: bool
+    rows_processed: Optional[int] = None
+    csv_type: Optional[str] = None
+    file_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BatchUploadResponse(BaseModel):
+    """Resposta do upload em lote, com o resumo por arquivo."""
+    success: bool
+    message: str
+    files_received: int
+    files_saved: int
+    rows_processed: int
+    documents_embedded: int
+    results: List[BatchFileResult]
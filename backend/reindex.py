@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Verifica a consistência entre PostgreSQL e ChromaDB e reindexa os
+documentos ausentes ou desatualizados.
+
+Uso (a partir de backend/):
+    python reindex.py --check          # só mostra as divergências
+    python reindex.py                  # embeda o que falta (retoma checkpoint)
+    python reindex.py --full           # reconstrói o índice inteiro
+    python reindex.py --restart        # ignora o checkpoint e refaz o diff
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import os
+
+# Allow running from the backend/ directory without installing the package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import settings
+from services.reindex_service import check_consistency, reindex
+
+
+async def _report_progress(status: dict, interval: float = 5.0):
+    while True:
+        await asyncio.sleep(interval)
+        if status.get("total"):
+            done = status["embedded"] + status["failed"]
+            print(f"  {done}/{status['total']} documentos ({status['failed']} falhas)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="apenas verificar, sem embedar")
+    parser.add_argument("--full", action="store_true", help="reembedar todos os documentos")
+    parser.add_argument("--restart", action="store_true", help="ignorar checkpoint existente")
+    parser.add_argument("--prune", action="store_true", help="remover documentos de arquivos apagados")
+    parser.add_argument("--concurrency", type=int, default=settings.reindex_concurrency)
+    parser.add_argument("--batch-size", type=int, default=settings.reindex_batch_size)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.check:
+        report = await check_consistency()
+        print(f"\nArquivos divergentes: {report['files_out_of_sync']}")
+        print(f"Documentos ausentes:  {report['missing']}")
+        print(f"Desatualizados:       {report['stale']} (versão atual: {report['document_version']})")
+        print(f"Arquivos órfãos:      {report['orphaned_files'] or 'nenhum'}")
+        for f in report["files"]:
+            print(f"  [{f['file_id']}] {f['file_name']}: {f['missing']} ausentes, {f['stale']} desatualizados")
+        return
+
+    status: dict = {}
+    progress = asyncio.create_task(_report_progress(status))
+    try:
+        report = await reindex(
+            full=args.full,
+            resume=not args.restart,
+            prune=args.prune,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            status=status,
+        )
+    finally:
+        progress.cancel()
+
+    print(
+        f"\n{report['embedded']}/{report['total']} documentos embeddados em "
+        f"{report['elapsed_seconds']}s ({report['failed']} falhas)"
+    )
+    if report["failed"]:
+        print("Checkpoint mantido — rode novamente para tentar os lotes que falharam.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
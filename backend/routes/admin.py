@@ -0,0 +1,96 @@
+"""Rotas administrativas — estado interno da API."""
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse
+
+from config import settings
+from db.connection import pool_status
+from db.query_log import recent_plans, slow_queries
+from services.admission_service import get_controllers
+from services.analytics_service import AnalyticsUnavailable, sync_from_database
+from services.profiling import list_profiles, profile_path
+from services.reindex_service import check_consistency, reindex_status, start_reindex
+
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Every admin route requires the X-Admin-Token header to match `admin_token`."""
+    if not settings.admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="API administrativa desativada (defina ADMIN_TOKEN)",
+        )
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token administrativo inválido")
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/admission")
+async def admission_status():
+    """Profundidade das filas, slots em uso e tempos de espera por endpoint."""
+    return {
+        "endpoints": {name: c.snapshot() for name, c in get_controllers().items()},
+        "db_pool": pool_status(),
+    }
+
+
+@router.get("/index/consistency")
+async def index_consistency():
+    """Documentos ausentes ou desatualizados no ChromaDB em relação ao PostgreSQL."""
+    return await check_consistency()
+
+
+@router.post("/index/reindex", status_code=status.HTTP_202_ACCEPTED)
+async def index_reindex(full: bool = False, prune: bool = False):
+    """Inicia a reindexação em segundo plano (retoma do checkpoint, se houver)."""
+    if not start_reindex(full=full, prune=prune):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Já existe uma reindexação em andamento",
+        )
+    return reindex_status()
+
+
+@router.get("/index/reindex")
+async def index_reindex_status():
+    """Progresso da reindexação em andamento (ou relatório da última)."""
+    return reindex_status()
+
+
+@router.post("/analytics/sync")
+async def analytics_sync():
+    """Exporta para o sidecar analítico os arquivos que faltam nele e remove os que sobram."""
+    try:
+        return await sync_from_database()
+    except AnalyticsUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+
+@router.get("/slow-queries")
+async def slow_query_log():
+    """Queries acima de SLOW_QUERY_MS vistas por este processo, com contagem e tempos."""
+    return {"threshold_ms": settings.slow_query_ms, "queries": slow_queries()}
+
+
+@router.get("/slow-queries/plans")
+async def slow_query_plans(limit: int = Query(20, ge=1, le=200), fingerprint: Optional[str] = None):
+    """Planos EXPLAIN (ANALYZE, BUFFERS) capturados, do mais recente ao mais antigo."""
+    return {"plans": await recent_plans(limit, fingerprint)}
+
+
+@router.get("/profiles")
+async def profiles():
+    """Perfis de requisição guardados, do mais recente ao mais antigo."""
+    return {"profiles": list_profiles()}
+
+
+@router.get("/profiles/{file_name}")
+async def profile_file(file_name: str):
+    """Baixa um perfil (.prof para pstats/snakeviz, .html do pyinstrument)."""
+    path = profile_path(file_name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil não encontrado")
+    return FileResponse(path, filename=file_name)
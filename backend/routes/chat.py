@@ -1,13 +1,17 @@
 """Rotas do chatbot RAG."""
-import json
+import time
 import uuid
 import logging
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
-from services.chat_service import chat, chat_stream, clear_session
+from config import settings
+from services.admission_service import chat_admission, client_key
+from services.chat_service import chat, chat_batch, chat_stream, clear_session, question_key
+from services.serialization import sse_event
+from services.stream_service import StreamGone, TokenStream, get_stream, start_stream
 
 logger = logging.getLogger(__name__)
 
@@ -26,38 +30,113 @@ class ChatResponse(BaseModel):
     session_id: str
 
 
+class ChatBatchRequest(BaseModel):
+    """Corpo da requisição de chat em lote."""
+    questions: List[str]
+
+
+class BatchAnswer(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ChatBatchResponse(BaseModel):
+    """Respostas na ordem das perguntas; perguntas repetidas são respondidas uma vez."""
+    answers: List[BatchAnswer]
+    unique_questions: int
+
+
 @router.post("", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     """Envia uma mensagem e recebe resposta completa."""
-    try:
-        session_id = request.session_id or str(uuid.uuid4())
-        answer = await chat(request.message, session_id)
-        return ChatResponse(answer=answer, session_id=session_id)
-    except Exception as e:
-        logger.error(f"Erro no chat: {e}")
+    session_id = request.session_id or str(uuid.uuid4())
+    # Without a session, requests of the same client share one fairness key
+    async with chat_admission.slot(request.session_id or client_key(http_request)):
+        try:
+            answer = await chat(request.message, session_id)
+            return ChatResponse(answer=answer, session_id=session_id)
+        except Exception as e:
+            logger.error(f"Erro no chat: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Erro ao processar mensagem: {str(e)}",
+            )
+
+
+@router.post("/batch", response_model=ChatBatchResponse)
+async def chat_batch_endpoint(request: ChatBatchRequest, http_request: Request):
+    """
+    Responde várias perguntas sobre os mesmos dados numa só requisição.
+
+    A recuperação é compartilhada (visão geral do dataset buscada uma vez,
+    embeddings de todas as perguntas numa chamada) e as perguntas rodam em
+    paralelo até chat_batch_concurrency, cada uma ocupando uma vaga da fila
+    de chat do cliente, como uma pergunta avulsa. Sem histórico de sessão:
+    cada pergunta é respondida de forma independente, e uma pergunta que
+    falha (inclusive por fila cheia) traz `error` em vez de derrubar o lote.
+    """
+    questions = [q for q in request.questions if q.strip()]
+    if not questions:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nenhuma pergunta enviada")
+    if len(questions) > settings.chat_batch_max_questions:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erro ao processar mensagem: {str(e)}",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {settings.chat_batch_max_questions} perguntas por lote",
         )
 
+    # Each question takes its own slot under the client's key, so a batch
+    # neither exceeds chat_max_concurrent nor jumps the other clients
+    key = client_key(http_request)
+    answers = await chat_batch(questions, slot=lambda: chat_admission.slot(key))
+    unique = len({question_key(q) for q in questions})
+    return ChatBatchResponse(answers=answers, unique_questions=unique)
 
-@router.post("/stream")
-async def chat_stream_endpoint(request: ChatRequest):
-    """Envia uma mensagem e recebe resposta via SSE streaming."""
-    session_id = request.session_id or str(uuid.uuid4())
 
-    async def event_generator():
-        try:
-            async for token in chat_stream(request.message, session_id):
-                data = json.dumps({"token": token}, ensure_ascii=False)
-                yield f"data: {data}\n\n"
-            yield f"event: done\ndata: {json.dumps({'session_id': session_id})}\n\n"
-        except Exception as e:
-            logger.error(f"Erro no stream: {e}")
-            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+async def _sse_events(stream: TokenStream, offset: int, http_request: Request):
+    """
+    Relay a buffered stream as SSE, starting at `offset`.
+
+    Every token event carries `id: <offset>` — the number of tokens the
+    client has after receiving it — so a reconnect can resume right there.
+    A heartbeat comment is sent when nothing arrives within
+    `sse_heartbeat_seconds`; a disconnect only detaches this subscriber.
+    """
+    stream.attach()
+    try:
+        start_data = {"stream_id": stream.stream_id, "session_id": stream.session_id, "offset": offset}
+        yield sse_event(start_data, event="start")
 
+        while True:
+            tokens, done = await stream.read(offset, settings.sse_heartbeat_seconds)
+
+            if not tokens and not done:
+                if await http_request.is_disconnected():
+                    logger.info(f"Cliente desconectou do stream {stream.stream_id} no offset {offset}")
+                    return
+                yield ": heartbeat\n\n"
+                continue
+
+            for token in tokens:
+                offset += 1
+                yield sse_event({"token": token}, event_id=offset)
+
+            if done:
+                if stream.error:
+                    yield sse_event({"error": stream.error}, event="error")
+                else:
+                    done_data = {"session_id": stream.session_id, **stream.stats}
+                    yield sse_event(done_data, event="done")
+                return
+    except StreamGone as e:
+        yield sse_event({"error": str(e)}, event="error")
+    finally:
+        stream.detach()
+
+
+def _sse_response(events) -> StreamingResponse:
     return StreamingResponse(
-        event_generator(),
+        events,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -66,6 +145,46 @@ async def chat_stream_endpoint(request: ChatRequest):
     )
 
 
+@router.post("/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """
+    Envia uma mensagem e recebe resposta via SSE streaming.
+
+    O primeiro evento (`start`) traz o `stream_id`. Se a conexão cair, o
+    cliente retoma com GET /api/chat/stream/{stream_id}?offset=N sem gerar
+    a resposta de novo. Com a fila de chat cheia, responde 429.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+
+    # The slot is held by the generation itself, not by the connection:
+    # it is released when the stream finishes, is cancelled or fails.
+    await chat_admission.acquire(request.session_id or client_key(http_request))
+    admitted_at = time.monotonic()
+    stream = start_stream(
+        session_id,
+        chat_stream(request.message, session_id),
+        on_finish=lambda: chat_admission.release(time.monotonic() - admitted_at),
+    )
+    return _sse_response(_sse_events(stream, 0, http_request))
+
+
+@router.get("/stream/{stream_id}")
+async def resume_stream_endpoint(stream_id: str, http_request: Request, offset: int = 0):
+    """Retoma um stream: reenvia os tokens a partir de `offset` e segue a geração ao vivo."""
+    stream = get_stream(stream_id)
+    if stream is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stream não encontrado ou expirado",
+        )
+    if offset < stream.first_offset or offset > stream.offset:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=f"Offset {offset} fora do intervalo disponível ({stream.first_offset}-{stream.offset})",
+        )
+    return _sse_response(_sse_events(stream, offset, http_request))
+
+
 @router.delete("/session/{session_id}")
 async def clear_session_endpoint(session_id: str):
     """Limpa o histórico de conversa de uma sessão."""
@@ -0,0 +1,58 @@
+"""Rotas de estatísticas — agregações no sidecar analítico (Parquet + DuckDB)."""
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, status
+
+from services import analytics_service
+from services.analytics_service import AnalyticsUnavailable, UnknownColumn
+
+router = APIRouter(prefix="/api/stats", tags=["stats"])
+
+
+def _unavailable(exc: AnalyticsUnavailable) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc))
+
+
+@router.get("")
+async def stats_summary():
+    """Arquivos, registros e colunas por tipo de CSV no sidecar analítico."""
+    try:
+        types = await asyncio.to_thread(analytics_service.summary)
+    except AnalyticsUnavailable as e:
+        raise _unavailable(e)
+    return {"types": types}
+
+
+@router.get("/columns/{column}")
+async def column_stats(
+    column: str,
+    csv_type: Optional[str] = Query(None, pattern="^(visnir|nix|pxrf|generic)$"),
+    file_id: Optional[List[int]] = Query(None),
+    group_by: Optional[str] = Query(None, pattern="^(file|amostra)$"),
+    limit: Optional[int] = Query(None, ge=1, le=100_000),
+):
+    """
+    count, média, mínimo, máximo e desvio padrão de uma coluna numérica —
+    no total, por arquivo (group_by=file) ou por amostra (group_by=amostra).
+    Ex.: /api/stats/columns/Fe?group_by=amostra
+    """
+    try:
+        rows = await asyncio.to_thread(
+            analytics_service.column_stats, column, csv_type, file_id, group_by, limit
+        )
+    except AnalyticsUnavailable as e:
+        raise _unavailable(e)
+    except UnknownColumn:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Coluna não encontrada: {column}")
+    return {"column": column, "group_by": group_by, "rows": rows}
+
+
+@router.get("/spectra")
+async def mean_spectra(file_id: Optional[List[int]] = Query(None)):
+    """Espectro Visnir médio de cada arquivo (um valor por comprimento de onda)."""
+    try:
+        spectra = await asyncio.to_thread(analytics_service.mean_spectra, file_id)
+    except AnalyticsUnavailable as e:
+        raise _unavailable(e)
+    return {"spectra": spectra}
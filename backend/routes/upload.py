@@ -1,10 +1,36 @@
 """Rotas de upload de arquivos."""
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+import asyncio
+import time
+from io import BytesIO
+from typing import List
+
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from db.connection import get_db
-from models.schemas import UploadResponse
+from models.schemas import (
+    BatchFileResult,
+    BatchUploadResponse,
+    UploadResponse,
+    UploadSessionCreate,
+    UploadSessionStatus,
+)
+from services.analytics_service import store_saved
 from services.csv_service import CSVService
+from services.batch_upload_service import expand_uploads, parse_all
 from services.db_service import DatabaseService
+from services.decompression import csv_name, detect_encoding, opener
+from services.admission_service import admit, upload_admission
+from services.retrieval_service import invalidate_lookup_catalog
+from services.metrics import UPLOAD_BYTES, UPLOAD_ROWS, UPLOAD_ROWS_PER_SECOND, stage
+from services.profiling import annotate
+from services.upload_session_service import (
+    UploadAlreadyComplete,
+    UploadIncomplete,
+    UploadNotFound,
+    UploadTooLarge,
+    parse_content_range,
+    upload_sessions,
+)
 from config import settings
 import logging
 
@@ -13,7 +39,58 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["upload"])
 
 
-@router.post("/upload", response_model=UploadResponse)
+async def _save_and_index(df, csv_type: str, file_name: str, db: AsyncSession, started: float) -> UploadResponse:
+    """Salva o DataFrame no PostgreSQL e gera os embeddings (comum aos dois fluxos de upload)."""
+    # Salvar no PostgreSQL
+    db_service = DatabaseService(db)
+    with stage("upload", "save_dataframe"):
+        rows_saved, file_id = await db_service.save_dataframe(df, file_name, csv_type)
+    UPLOAD_ROWS.labels(csv_type).inc(rows_saved)
+
+    logger.info(f"Upload concluído: {rows_saved} linhas salvas")
+    invalidate_lookup_catalog()
+
+    # Cópia colunar para as estatísticas (falha não bloqueia o upload)
+    with stage("upload", "analytics_parquet"):
+        await store_saved([(df, file_id, csv_type)])
+
+    # Gerar embeddings para o ChromaDB (falha não bloqueia o upload)
+    try:
+        from services.embedding_service import embed_records
+
+        records_for_embedding = df.to_dict(orient="records")
+        with stage("upload", "embed_records"):
+            embedded_count = await embed_records(
+                records=records_for_embedding,
+                file_id=file_id,
+                file_name=file_name,
+                csv_type=csv_type,
+            )
+        logger.info(f"Embeddings gerados: {embedded_count} documentos")
+    except Exception as e:
+        logger.warning(
+            f"Falha ao gerar embeddings (upload continuou; rode reindex.py "
+            f"para completar o índice): {e}"
+        )
+
+    elapsed = time.perf_counter() - started
+    if elapsed > 0:
+        UPLOAD_ROWS_PER_SECOND.observe(rows_saved / elapsed)
+
+    return UploadResponse(
+        success=True,
+        message="Arquivo processado e salvo com sucesso",
+        rows_processed=rows_saved,
+        file_name=file_name,
+        csv_type=csv_type,
+    )
+
+
+@router.post(
+    "/upload",
+    response_model=UploadResponse,
+    dependencies=[Depends(admit(upload_admission))],
+)
 async def upload_csv(
     csvFile: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
@@ -21,6 +98,10 @@ async def upload_csv(
     """
     Endpoint para upload de arquivo CSV.
 
+    Aceita também CSV comprimido: `.csv.gz`/`.csv.zst`, ou Content-Encoding
+    (gzip/zstd) nos headers da parte do multipart. O limite de tamanho vale
+    para os bytes enviados; o CSV é descomprimido em stream pelo parser.
+
     Args:
         csvFile: Arquivo CSV enviado
         db: Sessão assíncrona do PostgreSQL (injetada)
@@ -30,14 +111,20 @@ async def upload_csv(
     """
     try:
         # Validar extensão do arquivo
-        if not csvFile.filename.lower().endswith(".csv"):
+        file_name = csv_name(csvFile.filename)
+        if not file_name.lower().endswith(".csv"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Apenas arquivos CSV são permitidos",
             )
+        encoding = detect_encoding(csvFile.filename, csvFile.headers.get("content-encoding"))
+
+        started = time.perf_counter()
 
         # Ler conteúdo do arquivo
-        file_content = await csvFile.read()
+        with stage("upload", "read_body"):
+            file_content = await csvFile.read()
+        UPLOAD_BYTES.inc(len(file_content))
 
         # Validar tamanho
         if len(file_content) > settings.max_file_size_bytes:
@@ -48,36 +135,17 @@ async def upload_csv(
 
         # Processar CSV
         logger.info(f"Processando arquivo: {csvFile.filename}")
-        df, csv_type = CSVService.validate_and_parse_csv(file_content, csvFile.filename)
+        if encoding is None:
+            df, csv_type = CSVService.validate_and_parse_csv(file_content, file_name)
+        else:
+            open_csv = opener(lambda: BytesIO(file_content), encoding)
+            df, csv_type = CSVService.validate_and_parse_stream(open_csv, file_name)
+        annotate(csv_type=csv_type, file_bytes=len(file_content), rows=len(df), encoding=encoding)
 
-        # Salvar no PostgreSQL
-        db_service = DatabaseService(db)
-        rows_saved, file_id = await db_service.save_dataframe(df, csvFile.filename)
-
-        logger.info(f"Upload concluído: {rows_saved} linhas salvas")
-
-        # Gerar embeddings para o ChromaDB (falha não bloqueia o upload)
-        try:
-            from services.embedding_service import embed_records
-
-            records_for_embedding = df.to_dict(orient="records")
-            embedded_count = await embed_records(
-                records=records_for_embedding,
-                file_id=file_id,
-                file_name=csvFile.filename,
-            )
-            logger.info(f"Embeddings gerados: {embedded_count} documentos")
-        except Exception as e:
-            logger.warning(f"Falha ao gerar embeddings (upload continuou): {e}")
-
-        return UploadResponse(
-            success=True,
-            message="Arquivo processado e salvo com sucesso",
-            rows_processed=rows_saved,
-            file_name=csvFile.filename,
-            csv_type=csv_type,
-        )
+        return await _save_and_index(df, csv_type, file_name, db, started)
 
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.warning(f"Erro de validação: {str(e)}")
         raise HTTPException(
@@ -92,6 +160,116 @@ async def upload_csv(
         )
 
 
+@router.post(
+    "/upload/batch",
+    response_model=BatchUploadResponse,
+    dependencies=[Depends(admit(upload_admission))],
+)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Upload em lote: vários CSVs (também .csv.gz/.csv.zst) e/ou arquivos .zip
+    com CSVs dentro.
+
+    Os arquivos são parseados em paralelo; os válidos são gravados numa
+    única transação e embeddados em lotes compartilhados. Um arquivo
+    inválido não derruba o lote: o resultado traz o resumo por arquivo.
+    """
+    started = time.perf_counter()
+    try:
+        parts = []
+        total_bytes = 0
+        with stage("upload", "read_body"):
+            for upload in files:
+                content = await upload.read()
+                total_bytes += len(content)
+                if total_bytes > settings.batch_max_size_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Lote excede o tamanho máximo de {settings.batch_max_size_mb}MB",
+                    )
+                parts.append((upload.filename, content))
+        UPLOAD_BYTES.inc(total_bytes)
+
+        batch = await asyncio.to_thread(expand_uploads, parts)
+        del parts
+        with stage("upload", "parse_batch"):
+            await parse_all(batch)
+        valid = [f for f in batch if f.error is None]
+        logger.info(f"Lote: {len(valid)}/{len(batch)} arquivo(s) válido(s)")
+
+        rows_saved = 0
+        if valid:
+            db_service = DatabaseService(db)
+            with stage("upload", "save_dataframe"):
+                saved = await db_service.save_dataframes([(f.df, f.stored_name, f.csv_type) for f in valid])
+            for f, (rows, file_id) in zip(valid, saved):
+                f.file_id = file_id
+                rows_saved += rows
+                UPLOAD_ROWS.labels(f.csv_type).inc(rows)
+            invalidate_lookup_catalog()
+            with stage("upload", "analytics_parquet"):
+                await store_saved([(f.df, f.file_id, f.csv_type) for f in valid])
+        annotate(files=len(batch), file_bytes=total_bytes, rows=rows_saved)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.warning(f"Erro de validação: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erro ao processar upload em lote: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao processar lote: {str(e)}",
+        )
+
+    # Gerar embeddings em lotes compartilhados (falha não bloqueia o upload)
+    embedded_count = 0
+    if valid:
+        try:
+            from services.embedding_service import EmbeddingJob, embed_jobs
+
+            jobs = [
+                EmbeddingJob(f.df.to_dict(orient="records"), f.file_id, f.stored_name, f.csv_type)
+                for f in valid
+            ]
+            with stage("upload", "embed_records"):
+                embedded_count = await embed_jobs(jobs)
+        except Exception as e:
+            logger.warning(
+                f"Falha ao gerar embeddings do lote (upload continuou; rode reindex.py "
+                f"para completar o índice): {e}"
+            )
+
+    elapsed = time.perf_counter() - started
+    if elapsed > 0 and rows_saved:
+        UPLOAD_ROWS_PER_SECOND.observe(rows_saved / elapsed)
+
+    results = [
+        BatchFileResult(
+            file_name=f.file_name,
+            success=f.error is None,
+            rows_processed=len(f.df) if f.df is not None else None,
+            csv_type=f.csv_type,
+            file_id=f.file_id,
+            error=f.error,
+        )
+        for f in batch
+    ]
+    return BatchUploadResponse(
+        success=len(valid) == len(batch) and bool(batch),
+        message=f"{len(valid)} de {len(batch)} arquivo(s) processado(s) e salvo(s)",
+        files_received=len(batch),
+        files_saved=len(valid),
+        rows_processed=rows_saved,
+        documents_embedded=embedded_count,
+        results=results,
+    )
+
+
 @router.get("/table-info")
 async def get_table_info(db: AsyncSession = Depends(get_db)):
     """Retorna estatísticas do banco de dados PostgreSQL."""
@@ -104,3 +282,130 @@ async def get_table_info(db: AsyncSession = Depends(get_db)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e),
         )
+
+
+# ---------------------------------------------------------------------------
+# Upload em partes, retomável: POST /uploads → PUT /uploads/{id} (faixas de
+# bytes, em paralelo) → POST /uploads/{id}/finalize
+# ---------------------------------------------------------------------------
+
+
+def _session_status(session) -> UploadSessionStatus:
+    return UploadSessionStatus(
+        upload_id=session.upload_id,
+        file_name=session.file_name,
+        size=session.size,
+        chunk_size=session.chunk_size,
+        total_chunks=session.total_chunks,
+        received=session.received,
+        csv_type=session.csv_type,
+        content_encoding=session.encoding,
+    )
+
+
+def _not_found(upload_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Upload {upload_id} não encontrado ou expirado",
+    )
+
+
+@router.post("/uploads", response_model=UploadSessionStatus, status_code=status.HTTP_201_CREATED)
+async def create_upload(body: UploadSessionCreate):
+    """Cria uma sessão de upload em partes; a resposta traz o tamanho de cada parte."""
+    try:
+        session = await upload_sessions.create(body.file_name, body.size, body.content_encoding)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return _session_status(session)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionStatus)
+async def get_upload(upload_id: str):
+    """Partes já recebidas — o cliente reenvia só as que faltam."""
+    try:
+        return _session_status(upload_sessions.get(upload_id))
+    except UploadNotFound:
+        raise _not_found(upload_id)
+
+
+async def _read_chunk_body(request: Request, length: int) -> bytes:
+    """Read a chunk body, giving up as soon as it passes the Content-Range length."""
+    body = bytearray()
+    async for piece in request.stream():
+        body += piece
+        if len(body) > length:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Corpo maior que o Content-Range",
+            )
+    if len(body) != length:
+        raise ValueError("Corpo não corresponde ao Content-Range")
+    return bytes(body)
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionStatus)
+async def put_upload_chunk(upload_id: str, request: Request):
+    """
+    Recebe uma parte como corpo bruto, com `Content-Range: bytes início-fim/total`.
+    A primeira parte é validada na hora (tipo de CSV na resposta).
+    """
+    try:
+        start, end, total = parse_content_range(request.headers.get("content-range"))
+        session = upload_sessions.get(upload_id)
+        if end - start + 1 > session.chunk_size:
+            raise ValueError(f"Parte maior que {session.chunk_size} bytes")
+        data = await _read_chunk_body(request, end - start + 1)
+        UPLOAD_BYTES.inc(len(data))
+        session = await upload_sessions.write_chunk(upload_id, start, total, data)
+    except UploadNotFound:
+        raise _not_found(upload_id)
+    except UploadAlreadyComplete as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return _session_status(session)
+
+
+@router.post(
+    "/uploads/{upload_id}/finalize",
+    response_model=UploadResponse,
+    dependencies=[Depends(admit(upload_admission))],
+)
+async def finalize_upload(upload_id: str, db: AsyncSession = Depends(get_db)):
+    """Espera o parse (iniciado quando o último byte chegou), salva e indexa."""
+    started = time.perf_counter()
+    try:
+        session, df, csv_type = await upload_sessions.parsed(upload_id)
+        annotate(csv_type=csv_type, file_bytes=session.size, rows=len(df))
+        response = await _save_and_index(df, csv_type, session.file_name, db, started)
+    except UploadNotFound:
+        raise _not_found(upload_id)
+    except UploadIncomplete as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(e), "missing": e.missing},
+        )
+    except ValueError as e:
+        logger.warning(f"Erro de validação: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erro ao processar upload {upload_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao processar arquivo: {str(e)}",
+        )
+
+    await upload_sessions.discard(upload_id)
+    return response
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload(upload_id: str):
+    """Cancela um upload em partes e apaga o que já foi recebido."""
+    try:
+        await upload_sessions.discard(upload_id)
+    except UploadNotFound:
+        raise _not_found(upload_id)
@@ -0,0 +1,241 @@
+"""Controle de admissão — limita concorrência por endpoint com fila justa por cliente."""
+import asyncio
+import ipaddress
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List
+
+from fastapi import Request
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Number of recent wait/service times kept for the percentile metrics.
+_SAMPLE_WINDOW = 1000
+
+
+class AdmissionRejected(Exception):
+    """The wait queue is full (or the wait timed out); retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[max(index, 0)]
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded, per-client fair wait queue.
+
+    Up to `max_concurrent` holders run at once. Further requests wait in a
+    queue of at most `max_queue` entries; waiting requests are grouped by
+    client key and served round-robin across keys, so one client sending
+    a burst cannot starve the others. A full queue is rejected right away
+    instead of piling up latency.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queue = max(max_queue, 0)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queue_depth = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._wait_times: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+        self._service_times: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a queued request would be served."""
+        if self._service_times:
+            mean_service = sum(self._service_times) / len(self._service_times)
+        else:
+            mean_service = 1.0
+        pending = self.queue_depth + 1
+        return max(1, math.ceil(mean_service * pending / self.max_concurrent))
+
+    async def acquire(self, key: str) -> None:
+        """
+        Wait for a slot.
+
+        Raises:
+            AdmissionRejected: if the queue is full or the wait exceeds queue_timeout
+        """
+        if self.active < self.max_concurrent and self.queue_depth == 0:
+            self.active += 1
+            self.admitted += 1
+            self._wait_times.append(0.0)
+            return
+
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(
+                f"Fila de '{self.name}' cheia ({self.queue_depth} aguardando)",
+                self.retry_after(),
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(future)
+        self.queue_depth += 1
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(key, future)
+            self.timed_out += 1
+            raise AdmissionRejected(
+                f"Tempo de espera esgotado na fila de '{self.name}'",
+                self.retry_after(),
+            )
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled.
+                self.release()
+            else:
+                self._discard(key, future)
+            raise
+
+        self.admitted += 1
+        self._wait_times.append(time.monotonic() - queued_at)
+
+    def _discard(self, key: str, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(key)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queue_depth -= 1
+            if not waiters:
+                del self._waiters[key]
+
+    def release(self, service_time: float | None = None) -> None:
+        """Free a slot, handing it to the next client in round-robin order."""
+        if service_time is not None:
+            self._service_times.append(service_time)
+
+        while self._waiters:
+            key, waiters = next(iter(self._waiters.items()))
+            future = waiters.popleft()
+            self.queue_depth -= 1
+            if waiters:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        """Hold a slot for the duration of the block."""
+        await self.acquire(key)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        """Current queue state and wait-time statistics."""
+        waits = list(self._wait_times)
+        return {
+            "name": self.name,
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "queued_clients": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_seconds": {
+                "p50": round(_percentile(waits, 0.50), 4),
+                "p95": round(_percentile(waits, 0.95), 4),
+                "p99": round(_percentile(waits, 0.99), 4),
+                "max": round(max(waits), 4) if waits else 0.0,
+            },
+        }
+
+
+chat_admission = AdmissionController(
+    "chat",
+    max_concurrent=settings.chat_max_concurrent,
+    max_queue=settings.chat_max_queue,
+    queue_timeout=settings.admission_queue_timeout_seconds,
+)
+
+upload_admission = AdmissionController(
+    "upload",
+    max_concurrent=settings.upload_max_concurrent,
+    max_queue=settings.upload_max_queue,
+    queue_timeout=settings.admission_queue_timeout_seconds,
+)
+
+
+def get_controllers() -> Dict[str, AdmissionController]:
+    return {c.name: c for c in (chat_admission, upload_admission)}
+
+
+def _trusted_networks() -> List:
+    networks = []
+    for entry in settings.trusted_proxies.split(","):
+        entry = entry.strip()
+        if entry:
+            try:
+                networks.append(ipaddress.ip_network(entry, strict=False))
+            except ValueError:
+                logger.warning(f"trusted_proxies: endereço inválido ignorado: {entry}")
+    return networks
+
+
+def _is_trusted(host: str, networks) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def client_key(request: Request) -> str:
+    """
+    Fairness key for requests that carry no session id: the peer address.
+
+    X-Forwarded-For is only honoured when the peer is one of
+    `trusted_proxies`; the hops are then read right to left, skipping
+    trusted proxies, so a client cannot pick its own key by sending the
+    header itself.
+    """
+    peer = request.client.host if request.client else "unknown"
+    networks = _trusted_networks()
+    forwarded = request.headers.get("x-forwarded-for")
+    if not forwarded or not _is_trusted(peer, networks):
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, networks):
+            return hop
+    return hops[0] if hops else peer
+
+
+def admit(controller: AdmissionController):
+    """FastAPI dependency holding a slot of `controller` for the whole request."""
+
+    async def dependency(request: Request):
+        async with controller.slot(client_key(request)):
+            yield
+
+    return dependency
@@ -0,0 +1,664 @@
+"""
+Sidecar analítico: cópia colunar (Parquet) de cada arquivo enviado,
+consultada com DuckDB dentro do processo.
+
+Agregações sobre o JSONB do PostgreSQL (média de Fe por amostra, espectro
+médio por arquivo) extraem e convertem cada valor de cada linha e disputam
+o banco com a ingestão. Aqui cada upload vira
+analytics_dir/<csv_type>/file_<id>.parquet, com as colunas já tipadas pelo
+CSVService, e uma consulta lê só as colunas que pede.
+
+Abrir um Parquet custa o mesmo para 10 ou 10 mil linhas, e os uploads
+costumam ser pequenos; por isso, passados analytics_compact_files arquivos
+soltos de um tipo, eles são fundidos (com as partes ainda pequenas) numa
+parte part_<id>.parquet. As partes vivas de cada tipo ficam listadas em
+parts.json, trocado com os.replace: uma parte nova e as que ela substitui
+nunca valem ao mesmo tempo, e um arquivo solto some da leitura assim que
+uma parte viva o contém, de modo que leitores nunca contam uma linha duas
+vezes — nem depois de uma compactação interrompida no meio.
+
+O PostgreSQL continua sendo a fonte da verdade: uma falha ao gravar o
+Parquet não derruba o upload, e sync_from_database() exporta o que faltar
+(arquivos anteriores ao sidecar, gravações que falharam) e remove o que
+sobrar. Sem o pacote duckdb, ou com analytics_dir vazio, o sidecar fica
+desligado e quem chama usa o caminho SQL.
+"""
+import asyncio
+import fcntl
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from config import settings
+
+try:
+    import duckdb
+except ImportError:  # optional dependency
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+CSV_TYPES = ("visnir", "nix", "pxrf", "generic")
+GROUP_BY = ("file", "amostra")
+
+# Added to every Parquet file; the underscore keeps them clear of CSV columns
+FILE_ID = "_file_id"
+RECORD_INDEX = "_record_index"
+
+_FILE_RE = re.compile(r"^file_(\d+)\.parquet$")
+_PART_RE = re.compile(r"^part_[0-9a-f]{32}\.parquet$")
+# Names of the live parts of a csv_type directory
+_MANIFEST = "parts.json"
+_WAVELENGTH_RE = re.compile(r"^\d+(\.\d+)?$")
+
+_connection = None
+_connection_lock = threading.Lock()
+
+# Files are immutable (a rewrite gets a new name), so the file ids inside
+# each part and the columns of each set of files are read once per process
+_part_ids: Dict[str, FrozenSet[int]] = {}
+_schemas: Dict[Tuple[str, ...], List[str]] = {}
+_SCHEMA_CACHE_SIZE = 256
+
+
+class AnalyticsUnavailable(RuntimeError):
+    """duckdb not installed or analytics_dir empty."""
+
+
+class UnknownColumn(LookupError):
+    """Column absent from every file in scope."""
+
+
+def available() -> bool:
+    return duckdb is not None and bool(settings.analytics_dir)
+
+
+def _cursor():
+    """Cursor on the shared in-process database; one per call, so threads never share one."""
+    global _connection
+    if not available():
+        raise AnalyticsUnavailable(
+            "Estatísticas analíticas indisponíveis (pacote duckdb não instalado ou ANALYTICS_DIR vazio)"
+        )
+    with _connection_lock:
+        if _connection is None:
+            _connection = duckdb.connect(config={
+                "threads": settings.analytics_threads,
+                "memory_limit": settings.analytics_memory_limit,
+            })
+    return _connection.cursor()
+
+
+def close() -> None:
+    global _connection
+    with _connection_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+        _part_ids.clear()
+        _schemas.clear()
+
+
+# ---------------------------------------------------------------------------
+# Layout: loose per-upload files and compacted parts
+# ---------------------------------------------------------------------------
+
+def _dir(csv_type: str) -> str:
+    return os.path.join(settings.analytics_dir, csv_type)
+
+
+def _path(csv_type: str, file_id: int) -> str:
+    return os.path.join(_dir(csv_type), f"file_{file_id}.parquet")
+
+
+def _ids_in_part(cursor, path: str) -> FrozenSet[int]:
+    ids = _part_ids.get(path)
+    if ids is None:
+        rows = cursor.execute(f"SELECT DISTINCT {FILE_ID} FROM read_parquet(?)", [path]).fetchall()
+        ids = _part_ids[path] = frozenset(r[0] for r in rows)
+    return ids
+
+
+def _live_parts(csv_type: str, on_disk: List[str]) -> List[str]:
+    """
+    Part names listed in the manifest. Parts on disk but not listed were
+    left behind by an interrupted compaction or removal and are ignored;
+    a directory from before manifests existed has every part live.
+    """
+    try:
+        with open(os.path.join(_dir(csv_type), _MANIFEST)) as f:
+            listed = json.load(f)["parts"]
+    except FileNotFoundError:
+        return sorted(on_disk)
+    present = set(on_disk)
+    return [name for name in listed if name in present]
+
+
+def _publish(csv_type: str, part_names: List[str]) -> None:
+    """Atomically replace the set of live parts (callers hold the compaction lock)."""
+    path = os.path.join(_dir(csv_type), _MANIFEST)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"parts": sorted(part_names)}, f)
+    os.replace(tmp, path)
+
+
+def _layout(cursor, csv_type: str) -> Tuple[Dict[int, str], Dict[str, FrozenSet[int]]]:
+    """
+    ({file_id: path} of loose files, {path: file_ids} of live parts). A
+    loose file already inside a live part (a compaction that has not
+    deleted it yet) is left out.
+    """
+    directory = _dir(csv_type)
+    if not os.path.isdir(directory):
+        return {}, {}
+    loose: Dict[int, str] = {}
+    part_names: List[str] = []
+    for name in os.listdir(directory):
+        match = _FILE_RE.match(name)
+        if match:
+            loose[int(match.group(1))] = os.path.join(directory, name)
+        elif _PART_RE.match(name):
+            part_names.append(name)
+    parts: Dict[str, FrozenSet[int]] = {}
+    for name in _live_parts(csv_type, part_names):
+        path = os.path.join(directory, name)
+        parts[path] = _ids_in_part(cursor, path)
+    for ids in parts.values():
+        for file_id in ids:
+            loose.pop(file_id, None)
+    return loose, parts
+
+
+def _remove_stale(csv_type: str, live: Dict[str, FrozenSet[int]]) -> None:
+    """
+    Delete what an interrupted compaction or removal left behind: parts no
+    longer live and loose files a live part already holds (callers hold
+    the compaction lock, so no part is being written).
+    """
+    directory = _dir(csv_type)
+    merged = frozenset().union(*live.values())
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        match = _FILE_RE.match(name)
+        if (_PART_RE.match(name) and path not in live) or (match and int(match.group(1)) in merged):
+            os.remove(path)
+            _part_ids.pop(path, None)
+
+
+def _scope(cursor, csv_type: str, file_ids: Optional[List[int]] = None) -> Optional[Tuple[str, list]]:
+    """
+    FROM clause (and its parameters) over the files of one csv_type,
+    restricted to `file_ids` when given; None when nothing is in scope.
+    """
+    loose, parts = _layout(cursor, csv_type)
+    if file_ids is None:
+        paths = sorted(loose.values()) + sorted(parts)
+    else:
+        wanted = set(file_ids)
+        paths = sorted(p for i, p in loose.items() if i in wanted)
+        paths += sorted(p for p, ids in parts.items() if ids & wanted)
+    if not paths:
+        return None
+    if file_ids is None:
+        return "read_parquet(?, union_by_name = true)", [paths]
+    return (
+        f"(SELECT * FROM read_parquet(?, union_by_name = true) WHERE list_contains(?, {FILE_ID}))",
+        [paths, list(file_ids)],
+    )
+
+
+def _retrying(fn):
+    """Run a query once more if a compaction removed a file it was about to open."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if duckdb is None or not isinstance(e, duckdb.IOException):
+                raise
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def stored_files() -> Dict[int, str]:
+    """{file_id: csv_type} of every file in the sidecar."""
+    if not available():
+        return {}
+    stored: Dict[int, str] = {}
+    cursor = _cursor()
+    try:
+        for csv_type in CSV_TYPES:
+            loose, parts = _layout(cursor, csv_type)
+            stored.update((file_id, csv_type) for file_id in loose)
+            for ids in parts.values():
+                stored.update((file_id, csv_type) for file_id in ids)
+    finally:
+        cursor.close()
+    return stored
+
+
+@contextmanager
+def _compaction_lock(csv_type: str, blocking: bool = True):
+    """
+    Exclusive lock per csv_type directory, across processes (every API
+    worker writes to the same directory). Yields False when not blocking
+    and another process holds it.
+    """
+    os.makedirs(_dir(csv_type), exist_ok=True)
+    with open(os.path.join(_dir(csv_type), ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _copy_to(cursor, query: str, params: list, path: str) -> None:
+    """COPY a query to `path` through a temporary name, so readers never see half a file."""
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    escaped = tmp.replace("'", "''")
+    try:
+        cursor.execute(f"COPY ({query}) TO '{escaped}' (FORMAT parquet, COMPRESSION zstd)", params)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _new_part(csv_type: str) -> str:
+    return os.path.join(_dir(csv_type), f"part_{uuid.uuid4().hex}.parquet")
+
+
+# ---------------------------------------------------------------------------
+# Writes
+# ---------------------------------------------------------------------------
+
+def write_file(df: pd.DataFrame, file_id: int, csv_type: str) -> str:
+    """
+    Write one parsed file as Parquet, columns typed as parsed plus
+    _file_id and _record_index.
+    """
+    if csv_type not in CSV_TYPES:
+        csv_type = "generic"
+    frame = df.copy(deep=False)
+    frame.insert(0, RECORD_INDEX, np.arange(len(frame), dtype=np.int32))
+    frame.insert(0, FILE_ID, np.full(len(frame), file_id, dtype=np.int32))
+
+    path = _path(csv_type, file_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cursor = _cursor()
+    try:
+        cursor.register("frame", frame)
+        _copy_to(cursor, "SELECT * FROM frame", [], path)
+    finally:
+        cursor.close()
+    return path
+
+
+def compact(csv_type: str, force: bool = False) -> int:
+    """
+    Merge the loose files of a csv_type, together with parts still under
+    analytics_compact_part_mb, into one new part. Runs only past
+    analytics_compact_files loose files (unless `force`) and only if no
+    other process is compacting the same type. Returns how many files
+    were merged.
+    """
+    with _compaction_lock(csv_type, blocking=False) as acquired:
+        if not acquired:
+            return 0
+        cursor = _cursor()
+        try:
+            loose, parts = _layout(cursor, csv_type)
+            _remove_stale(csv_type, parts)
+            if not loose or (len(loose) < settings.analytics_compact_files and not force):
+                return 0
+            small_limit = settings.analytics_compact_part_mb * 1024 * 1024
+            small_parts = [p for p in parts if os.path.getsize(p) < small_limit]
+            sources = sorted(loose.values()) + sorted(small_parts)
+            if len(sources) < 2:
+                return 0
+
+            target = _new_part(csv_type)
+            _copy_to(
+                cursor,
+                f"SELECT * FROM read_parquet(?, union_by_name = true) ORDER BY {FILE_ID}, {RECORD_INDEX}",
+                [sources],
+                target,
+            )
+            # Publishing the new part retires the source parts and shadows
+            # the loose files (see _layout) in one step; then drop them
+            live = [os.path.basename(p) for p in parts if p not in small_parts]
+            _publish(csv_type, live + [os.path.basename(target)])
+            for path in sources:
+                os.remove(path)
+                _part_ids.pop(path, None)
+        finally:
+            cursor.close()
+    logger.info(f"Sidecar analítico ({csv_type}): {len(sources)} arquivo(s) compactado(s) em {os.path.basename(target)}")
+    return len(sources)
+
+
+async def store_saved(frames: List[Tuple[pd.DataFrame, int, str]]) -> int:
+    """
+    Write the Parquet copy of files just saved to PostgreSQL, as
+    (df, file_id, csv_type), compacting when loose files pile up.
+    Failures are logged, not raised: the upload already succeeded, and
+    sync_from_database() fills the gap later.
+    """
+    if not available():
+        return 0
+    written = 0
+    for df, file_id, csv_type in frames:
+        try:
+            await asyncio.to_thread(write_file, df, file_id, csv_type)
+            written += 1
+        except Exception as e:
+            logger.warning(
+                f"Falha ao gravar o arquivo {file_id} no sidecar analítico (upload continuou; "
+                f"rode /api/admin/analytics/sync para completar): {e}"
+            )
+    for csv_type in {f[2] if f[2] in CSV_TYPES else "generic" for f in frames}:
+        try:
+            await asyncio.to_thread(compact, csv_type)
+        except Exception as e:
+            logger.warning(f"Falha ao compactar o sidecar analítico ({csv_type}): {e}")
+    return written
+
+
+def remove_files(file_ids: List[int]) -> int:
+    """Drop files from the sidecar; parts holding any of them are rewritten without them."""
+    doomed = set(file_ids)
+    removed = 0
+    for csv_type in CSV_TYPES:
+        if not os.path.isdir(_dir(csv_type)):
+            continue
+        with _compaction_lock(csv_type):
+            cursor = _cursor()
+            try:
+                loose, parts = _layout(cursor, csv_type)
+                _remove_stale(csv_type, parts)
+                for file_id in doomed & loose.keys():
+                    os.remove(loose[file_id])
+                    removed += 1
+                live = {os.path.basename(p) for p in parts}
+                replaced = []
+                for path, ids in parts.items():
+                    hit = ids & doomed
+                    if not hit:
+                        continue
+                    live.discard(os.path.basename(path))
+                    if hit != ids:
+                        rewritten = _new_part(csv_type)
+                        _copy_to(
+                            cursor,
+                            f"SELECT * FROM read_parquet(?) WHERE NOT list_contains(?, {FILE_ID})",
+                            [path, sorted(hit)],
+                            rewritten,
+                        )
+                        live.add(os.path.basename(rewritten))
+                    replaced.append(path)
+                    removed += len(hit)
+                if replaced:
+                    _publish(csv_type, sorted(live))
+                    for path in replaced:
+                        os.remove(path)
+                        _part_ids.pop(path, None)
+            finally:
+                cursor.close()
+    return removed
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+def _columns(cursor, source: str, params: list) -> List[str]:
+    # params[0] is always the list of paths being read
+    key = tuple(params[0])
+    columns = _schemas.get(key)
+    if columns is None:
+        rows = cursor.execute(f"DESCRIBE SELECT * FROM {source}", params).fetchall()
+        columns = [r[0] for r in rows]
+        if len(_schemas) >= _SCHEMA_CACHE_SIZE:
+            _schemas.clear()
+        _schemas[key] = columns
+    return columns
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _data_columns(columns: List[str]) -> List[str]:
+    return [c for c in columns if c not in (FILE_ID, RECORD_INDEX)]
+
+
+@_retrying
+def summary() -> List[dict]:
+    """Files, rows and columns per csv_type."""
+    cursor = _cursor()
+    try:
+        result = []
+        for csv_type in CSV_TYPES:
+            scope = _scope(cursor, csv_type)
+            if scope is None:
+                continue
+            source, params = scope
+            files, rows = cursor.execute(
+                f"SELECT count(DISTINCT {FILE_ID}), count(*) FROM {source}", params
+            ).fetchone()
+            result.append({
+                "csv_type": csv_type,
+                "files": files,
+                "rows": rows,
+                "columns": len(_data_columns(_columns(cursor, source, params))),
+            })
+        return result
+    finally:
+        cursor.close()
+
+
+@_retrying
+def column_stats(
+    column: str,
+    csv_type: Optional[str] = None,
+    file_ids: Optional[List[int]] = None,
+    group_by: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """
+    count/mean/min/max/stddev of a column, over every file that has it, or
+    per file (group_by="file") or per sample (group_by="amostra"), at most
+    `limit` groups per csv_type. Non-numeric values count as missing.
+
+    Raises:
+        UnknownColumn: nenhum arquivo no escopo tem a coluna.
+        ValueError: group_by inválido.
+    """
+    if group_by is not None and group_by not in GROUP_BY:
+        raise ValueError(f"group_by deve ser um de: {', '.join(GROUP_BY)}")
+    limit = limit or settings.analytics_max_groups
+    group = {None: "NULL", "file": FILE_ID, "amostra": 'CAST("amostra" AS VARCHAR)'}[group_by]
+    cursor = _cursor()
+    try:
+        result = []
+        in_scope = found = False
+        for kind in ([csv_type] if csv_type else CSV_TYPES):
+            scope = _scope(cursor, kind, file_ids)
+            if scope is None:
+                continue
+            in_scope = True
+            source, params = scope
+            columns = _columns(cursor, source, params)
+            if column not in columns:
+                continue
+            found = True
+            if group_by == "amostra" and "amostra" not in columns:
+                continue
+            rows = cursor.execute(
+                f"""
+                SELECT __grupo, count(__valor), avg(__valor), min(__valor), max(__valor), stddev_samp(__valor)
+                FROM (
+                    SELECT {group} AS __grupo, TRY_CAST({_quote(column)} AS DOUBLE) AS __valor
+                    FROM {source}
+                )
+                GROUP BY __grupo
+                ORDER BY __grupo
+                LIMIT ?
+                """,
+                params + [limit],
+            ).fetchall()
+            for grupo, count, mean, minimum, maximum, stddev in rows:
+                entry = {"csv_type": kind}
+                if group_by is not None:
+                    entry["file_id" if group_by == "file" else group_by] = grupo
+                entry.update(count=count, mean=mean, min=minimum, max=maximum, stddev=stddev)
+                result.append(entry)
+        if in_scope and not found:
+            raise UnknownColumn(column)
+        return result
+    finally:
+        cursor.close()
+
+
+@_retrying
+def mean_spectra(file_ids: Optional[List[int]] = None) -> List[dict]:
+    """Mean Visnir spectrum of each file: one value per wavelength column."""
+    cursor = _cursor()
+    try:
+        scope = _scope(cursor, "visnir", file_ids)
+        if scope is None:
+            return []
+        source, params = scope
+        wavelengths = sorted(
+            (c for c in _columns(cursor, source, params) if _WAVELENGTH_RE.match(c)),
+            key=float,
+        )
+        if not wavelengths:
+            return []
+        averages = ", ".join(f"avg(TRY_CAST({_quote(w)} AS DOUBLE))" for w in wavelengths)
+        rows = cursor.execute(
+            f"""
+            SELECT {FILE_ID}, count(*), {averages}
+            FROM {source}
+            GROUP BY {FILE_ID}
+            ORDER BY {FILE_ID}
+            """,
+            params,
+        ).fetchall()
+        return [
+            {
+                "file_id": row[0],
+                "samples": row[1],
+                "wavelengths": [float(w) for w in wavelengths],
+                "mean": list(row[2:]),
+            }
+            for row in rows
+        ]
+    finally:
+        cursor.close()
+
+
+@_retrying
+def samples_and_columns(file_ids: List[int]) -> Optional[dict]:
+    """
+    Distinct samples and column names across `file_ids` — what
+    get_dataset_overview otherwise extracts from JSONB. None unless the
+    sidecar holds every one of those files (a partial answer would
+    silently miss samples).
+    """
+    if not available():
+        return None
+    stored = stored_files()
+    if any(file_id not in stored for file_id in file_ids):
+        return None
+    cursor = _cursor()
+    try:
+        samples = set()
+        columns = set()
+        for csv_type in CSV_TYPES:
+            scope = _scope(cursor, csv_type, [i for i in file_ids if stored[i] == csv_type])
+            if scope is None:
+                continue
+            source, params = scope
+            names = _data_columns(_columns(cursor, source, params))
+            columns.update(names)
+            if "amostra" in names:
+                rows = cursor.execute(
+                    f"""
+                    SELECT DISTINCT CAST("amostra" AS VARCHAR)
+                    FROM {source}
+                    WHERE "amostra" IS NOT NULL
+                    """,
+                    params,
+                ).fetchall()
+                samples.update(r[0] for r in rows)
+        return {"samples": sorted(samples), "columns": sorted(columns)}
+    finally:
+        cursor.close()
+
+
+async def sync_from_database() -> dict:
+    """
+    Bring the sidecar in line with PostgreSQL: export every file it lacks
+    (rebuilt from the JSONB records, so numbers keep their JSON types),
+    drop files that no longer exist and compact what was exported.
+    """
+    from db.connection import AsyncSessionLocal
+
+    if not available():
+        raise AnalyticsUnavailable(
+            "Estatísticas analíticas indisponíveis (pacote duckdb não instalado ou ANALYTICS_DIR vazio)"
+        )
+
+    async with AsyncSessionLocal() as session:
+        files = (
+            await session.execute(text("SELECT id, csv_type, columns_list FROM files ORDER BY id"))
+        ).fetchall()
+        stored = await asyncio.to_thread(stored_files)
+        known = {f[0] for f in files}
+
+        exported = 0
+        for file_id, csv_type, columns in files:
+            if file_id in stored:
+                continue
+            rows = (
+                await session.execute(
+                    text("""
+                        SELECT data
+                        FROM records
+                        WHERE file_id = :file_id
+                        ORDER BY record_index, id
+                    """),
+                    {"file_id": file_id},
+                )
+            ).fetchall()
+            if not rows:
+                continue
+            df = pd.DataFrame([r[0] for r in rows], columns=columns)
+            await asyncio.to_thread(write_file, df, file_id, csv_type or "generic")
+            exported += 1
+
+    orphaned = [file_id for file_id in stored if file_id not in known]
+    removed = await asyncio.to_thread(remove_files, orphaned) if orphaned else 0
+    for csv_type in CSV_TYPES:
+        await asyncio.to_thread(compact, csv_type, True)
+
+    logger.info(f"Sidecar analítico sincronizado: {exported} arquivo(s) exportado(s), {removed} removido(s)")
+    return {"exported": exported, "removed": removed, "files": len(known)}
@@ -0,0 +1,208 @@
+"""
+Upload em lote: vários CSVs (ou um .zip com eles) de uma campanha de medição.
+
+Os arquivos são parseados em paralelo num pool de processos (o parse é
+CPU e segura o GIL), gravados numa única transação e embeddados em lotes
+compartilhados (ver DatabaseService.save_dataframes e
+embedding_service.embed_jobs), de modo que o custo fixo por arquivo —
+commit, chamada de embedding — é dividido pelo lote.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import posixpath
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from config import settings
+from services.csv_service import CSVService
+from services.decompression import csv_name, detect_encoding, opener
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[Executor] = None
+
+
+@dataclass
+class BatchFile:
+    """One CSV of a batch and what became of it."""
+
+    file_name: str
+    content: bytes = b""
+    # Zip members are not extracted up front: the worker streams `member`
+    # out of the archive saved at `archive`
+    archive: Optional[str] = None
+    member: Optional[str] = None
+    df: Optional[pd.DataFrame] = None
+    csv_type: Optional[str] = None
+    error: Optional[str] = None
+    file_id: Optional[int] = None
+
+    @property
+    def stored_name(self) -> str:
+        """Name saved in `files`: no archive path, no compression suffix."""
+        return csv_name(posixpath.basename(self.file_name))
+
+
+def _init_worker() -> None:
+    # The parsers log every file and column at INFO; workers stay quiet
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def _workers() -> int:
+    if settings.batch_parse_workers:
+        return settings.batch_parse_workers
+    # CPUs this process may run on (a container quota can be below cpu_count)
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def get_parse_pool() -> Executor:
+    """
+    Process pool shared by batch uploads, created on first use. forkserver
+    keeps workers from being forked out of the API process and its threads.
+    """
+    global _pool
+    if _pool is None:
+        workers = _workers()
+        if workers == 1:
+            _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-parse")
+        else:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=_init_worker,
+            )
+        logger.info(f"Pool de parse em lote criado: {workers} worker(s)")
+    return _pool
+
+
+def shutdown_parse_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _is_supported(name: str) -> bool:
+    return csv_name(name).lower().endswith(".csv")
+
+
+def _save_archive(content: bytes) -> str:
+    """Zip kept on disk while the batch is parsed, so process workers can open it."""
+    fd, path = tempfile.mkstemp(prefix="batch-", suffix=".zip")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return path
+
+
+def remove_archives(files: List[BatchFile]) -> None:
+    for path in {f.archive for f in files if f.archive}:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def expand_uploads(parts: List[Tuple[str, bytes]]) -> List[BatchFile]:
+    """
+    Turn the uploaded parts into one BatchFile per CSV: .zip archives are
+    unpacked (directories, hidden and macOS metadata entries skipped),
+    anything else that is not a (compressed) CSV is reported as an error.
+
+    Zip members are only listed here; their declared sizes must fit in
+    batch_max_decompressed_mb altogether, and parse_all reads them.
+
+    Raises:
+        ValueError: lote grande demais ou .zip inválido.
+    """
+    files: List[BatchFile] = []
+    decompressed = 0
+    try:
+        for name, content in parts:
+            if not name.lower().endswith(".zip"):
+                files.append(BatchFile(name, content) if _is_supported(name) else BatchFile(name, error="Apenas arquivos CSV são permitidos"))
+                continue
+            try:
+                archive = zipfile.ZipFile(io.BytesIO(content))
+            except zipfile.BadZipFile:
+                raise ValueError(f"{name}: arquivo .zip inválido")
+            path = None
+            with archive:
+                for info in archive.infolist():
+                    base = posixpath.basename(info.filename)
+                    if info.is_dir() or not base or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+                        continue
+                    member = f"{name}/{info.filename}"
+                    if not _is_supported(base):
+                        files.append(BatchFile(member, error="Apenas arquivos CSV são permitidos"))
+                    elif info.file_size > settings.max_decompressed_size_bytes:
+                        files.append(BatchFile(member, error=f"Arquivo excede o tamanho máximo de {settings.max_decompressed_size_mb}MB"))
+                    else:
+                        decompressed += info.file_size
+                        if decompressed > settings.batch_max_decompressed_bytes:
+                            raise ValueError(
+                                f"Lote excede o máximo de {settings.batch_max_decompressed_mb}MB descomprimidos"
+                            )
+                        path = path or _save_archive(content)
+                        files.append(BatchFile(member, archive=path, member=info.filename))
+                    if len(files) > settings.batch_max_files:
+                        break
+            if len(files) > settings.batch_max_files:
+                break
+
+        if len(files) > settings.batch_max_files:
+            raise ValueError(f"Lote excede o máximo de {settings.batch_max_files} arquivos")
+    except BaseException:
+        remove_archives(files)
+        raise
+    return files
+
+
+def _parse(
+    file_name: str, content: bytes, archive: Optional[str] = None, member: Optional[str] = None
+) -> Tuple[Optional[pd.DataFrame], Optional[str], Optional[str]]:
+    """Worker side: (df, csv_type, None) or (None, None, error). Runs in the pool."""
+    stored_name = BatchFile(file_name).stored_name
+    try:
+        encoding = detect_encoding(file_name)
+        if archive is None:
+            df, csv_type = CSVService.validate_and_parse_stream(opener(lambda: io.BytesIO(content), encoding), stored_name)
+        else:
+            with zipfile.ZipFile(archive) as zf:
+                df, csv_type = CSVService.validate_and_parse_stream(opener(lambda: zf.open(member), encoding), stored_name)
+        return df, csv_type, None
+    except ValueError as e:
+        return None, None, str(e)
+    except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+        return None, None, f"Arquivo corrompido no .zip: {e}"
+
+
+async def parse_all(files: List[BatchFile]) -> None:
+    """
+    Parse every pending file of the batch in parallel, filling
+    df/csv_type/error in place; the saved archives are removed afterwards.
+    """
+    pending = [f for f in files if f.error is None]
+    try:
+        if not pending:
+            return
+        loop = asyncio.get_running_loop()
+        pool = get_parse_pool()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(pool, _parse, f.file_name, f.content, f.archive, f.member) for f in pending)
+        )
+        for f, (df, csv_type, error) in zip(pending, results):
+            f.df, f.csv_type, f.error = df, csv_type, error
+            f.content = b""
+    finally:
+        remove_archives(files)
@@ -1,19 +1,22 @@
 """Serviço de chat RAG — LangChain + Gemini + ChromaDB."""
+import asyncio
 import re
 import logging
-from typing import AsyncGenerator, Dict, List
-
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from contextlib import nullcontext
+from typing import AsyncContextManager, AsyncGenerator, Callable, Dict, List, Optional
 
 from config import settings
-from services.embedding_service import get_vector_store
 from services.db_service import get_dataset_overview
+from services.embedding_service import embed_queries
+from services.retrieval_service import aggregate_statistics, lookup_exact_records, vector_search
+from services.history_service import ConversationHistory, Turn, estimate_tokens, truncate_to_tokens
+from services.metrics import LLM_TOKENS, stage
+from services.model_clients import model_clients
 
 logger = logging.getLogger(__name__)
 
-# Memória de sessão em memória: session_id -> [(pergunta, resposta)]
-_sessions: Dict[str, List[tuple]] = {}
+# Memória de sessão em memória: session_id -> histórico da conversa
+_sessions: Dict[str, ConversationHistory] = {}
 
 SYSTEM_PROMPT = """Você é um assistente especializado em analisar dados do Portal TCC.
 Você tem acesso a dados de arquivos CSV que foram carregados no sistema.
@@ -39,6 +42,24 @@ não use "etc.", não diga "entre outros". Liste cada item individualmente.
 Contexto dos dados:
 {context}"""
 
+SUMMARY_PROMPT = """Resuma a conversa abaixo entre um usuário e o assistente do Portal TCC.
+Mantenha as perguntas feitas, as amostras, arquivos e colunas mencionados e os valores
+numéricos importantes das respostas. Não liste itens de enumerações longas — apenas
+indique do que se tratavam. Responda em português brasileiro, em no máximo um parágrafo.
+
+Resumo anterior:
+{summary}
+
+Novas trocas:
+{turns}"""
+
+# Appended to answers whose generation was aborted before the end.
+INTERRUPTED_MARKER = " [resposta interrompida]"
+
+# Each answer is cut to this many tokens before being summarized, so folding
+# a long enumeration does not cost as much as the enumeration itself.
+_SUMMARY_ANSWER_MAX_TOKENS = 500
+
 # Patterns that indicate the user wants aggregate or full-dataset information.
 _AGGREGATION_PATTERNS = re.compile(
     r"""
@@ -103,77 +124,131 @@ def _format_overview_as_context(overview: dict) -> str:
     return "\n".join(lines)
 
 
-def _get_llm() -> ChatGoogleGenerativeAI:
-    return ChatGoogleGenerativeAI(
-        model=settings.llm_model,
-        google_api_key=settings.google_api_key,
-        temperature=settings.llm_temperature,
-        convert_system_message_to_human=True,
-    )
-
-
-def _get_chat_history(session_id: str) -> List[tuple]:
+def _get_chat_history(session_id: str) -> ConversationHistory:
     if session_id not in _sessions:
-        _sessions[session_id] = []
+        _sessions[session_id] = ConversationHistory(
+            recent_turns=settings.history_recent_turns,
+            max_tokens=settings.history_max_tokens,
+            summary_max_tokens=settings.history_summary_max_tokens,
+        )
     return _sessions[session_id]
 
 
-def _build_messages(context: str, history: List[tuple], question: str, aggregation: bool = False) -> list:
-    """Monta a lista de mensagens LangChain com contexto, histórico e pergunta."""
+async def _summarize_turns(summary: str, turns: List[Turn]) -> str:
+    """Fold older question/answer pairs into the running session summary."""
+    lines = []
+    for question, answer in turns:
+        lines.append(f"Usuário: {question}")
+        lines.append(f"Assistente: {truncate_to_tokens(answer, _SUMMARY_ANSWER_MAX_TOKENS)}")
+    prompt = SUMMARY_PROMPT.format(summary=summary or "(nenhum)", turns="\n".join(lines))
+
+    from langchain_core.messages import HumanMessage
+
+    async with model_clients.llm_call() as llm:
+        response = await llm.ainvoke([HumanMessage(content=prompt)])
+    return response.content
+
+
+def _build_messages(
+    context: str,
+    history: Optional[ConversationHistory],
+    question: str,
+    aggregation: bool = False,
+) -> list:
+    """Monta a lista de mensagens LangChain com contexto, histórico (se houver) e pergunta."""
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
     prompt_template = AGGREGATION_SYSTEM_PROMPT if aggregation else SYSTEM_PROMPT
-    messages = [SystemMessage(content=prompt_template.format(context=context))]
-    for human_msg, ai_msg in history[-10:]:
+    system_prompt = prompt_template.format(context=context)
+
+    summary, turns = history.window() if history is not None else ("", [])
+    if summary:
+        system_prompt += f"\n\nResumo da conversa anterior:\n{summary}"
+
+    messages = [SystemMessage(content=system_prompt)]
+    for human_msg, ai_msg in turns:
         messages.append(HumanMessage(content=human_msg))
         messages.append(AIMessage(content=ai_msg))
     messages.append(HumanMessage(content=question))
     return messages
 
 
-async def _retrieve_context(question: str) -> tuple[str, bool]:
+async def _overview_context() -> str:
+    """Full dataset summary from PostgreSQL, formatted as context ("" if it fails)."""
+    try:
+        with stage("chat", "overview_sql"):
+            overview = await get_dataset_overview()
+        return _format_overview_as_context(overview)
+    except Exception as exc:
+        logger.warning(f"Falha ao obter visão geral do dataset: {exc}")
+        return ""
+
+
+class SharedRetrieval:
+    """
+    Retrieval work shared by the questions of one batch: the dataset
+    overview is fetched (and formatted) once, on first need, and the
+    question embeddings come precomputed from a single batched call.
+    """
+
+    def __init__(self, query_vectors: Optional[Dict[str, List[float]]] = None):
+        self.query_vectors = query_vectors or {}
+        self._overview: Optional[asyncio.Future] = None
+
+    def overview_context(self) -> "asyncio.Future[str]":
+        if self._overview is None:
+            self._overview = asyncio.ensure_future(_overview_context())
+        return self._overview
+
+
+async def _retrieve_context(question: str, shared: Optional[SharedRetrieval] = None) -> tuple[str, bool]:
     """
     Retrieve the most appropriate context for a question.
 
     For aggregation/enumeration queries, fetches a full dataset summary from
-    PostgreSQL so that every sample, count, or column is accounted for.
+    PostgreSQL so that every sample, count, or column is accounted for, plus
+    statistics of the mentioned columns from the analytics sidecar.
+
+    For record-level queries, first looks up the samples named in the
+    question directly in PostgreSQL; ChromaDB similarity search (k=10) is
+    only the fallback.
 
-    For record-level queries, uses ChromaDB similarity search (k=10).
+    `shared` lets the questions of a batch reuse one overview and their
+    precomputed embeddings.
 
     Returns (context_text, is_aggregation).
     """
     is_agg = _is_aggregation_query(question)
+    query_vector = shared.query_vectors.get(question) if shared is not None else None
 
     if is_agg:
-        try:
-            overview = await get_dataset_overview()
-            db_context = _format_overview_as_context(overview)
-        except Exception as exc:
-            logger.warning(f"Falha ao obter visão geral do dataset: {exc}")
-            db_context = ""
+        if shared is not None:
+            db_context = await shared.overview_context()
+        else:
+            db_context = await _overview_context()
+
+        with stage("chat", "analytics"):
+            stats_context = await aggregate_statistics(question)
 
         # Also fetch a few vector-search results for additional record-level detail.
-        store = get_vector_store()
-        retriever = store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 10},
-        )
-        docs = await retriever.ainvoke(question)
-        vector_context = "\n\n".join(doc.page_content for doc in docs)
+        with stage("chat", "vector_search"):
+            vector_context = await vector_search(question, k=10, query_vector=query_vector)
 
         parts = []
         if db_context:
             parts.append("=== Resumo completo do dataset ===\n" + db_context)
+        if stats_context:
+            parts.append("=== Estatísticas calculadas sobre todos os registros ===\n" + stats_context)
         if vector_context:
             parts.append("=== Registros representativos ===\n" + vector_context)
 
         context = "\n\n".join(parts) if parts else "Nenhum dado encontrado no banco de dados."
     else:
-        store = get_vector_store()
-        retriever = store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 10},
-        )
-        docs = await retriever.ainvoke(question)
-        context = "\n\n".join(doc.page_content for doc in docs)
+        with stage("chat", "exact_lookup"):
+            context = await lookup_exact_records(question)
+        if context is None:
+            with stage("chat", "vector_search"):
+                context = await vector_search(question, k=10, query_vector=query_vector)
 
         if not context.strip():
             context = "Nenhum dado encontrado no banco de dados."
@@ -181,25 +256,33 @@ async def _retrieve_context(question: str) -> tuple[str, bool]:
     return context, is_agg
 
 
+def _count_tokens(messages: list, answer: str) -> None:
+    LLM_TOKENS.labels("input").inc(sum(estimate_tokens(str(m.content)) for m in messages))
+    LLM_TOKENS.labels("output").inc(estimate_tokens(answer))
+
+
 async def chat(question: str, session_id: str = "default") -> str:
     """
     Processa uma pergunta pelo pipeline RAG.
 
     1. Detecta se é consulta agregada ou de registro único
     2. Recupera documentos relevantes (ChromaDB) e/ou resumo completo (PostgreSQL)
-    3. Constrói prompt com contexto + histórico
+    3. Constrói prompt com contexto + histórico (resumo + trocas recentes)
     4. Envia para Gemini
-    5. Armazena troca na memória da sessão
+    5. Armazena troca na memória da sessão e agenda o resumo das antigas
     """
     context, is_agg = await _retrieve_context(question)
     history = _get_chat_history(session_id)
     messages = _build_messages(context, history, question, aggregation=is_agg)
 
-    llm = _get_llm()
-    response = await llm.ainvoke(messages)
+    with stage("chat", "llm"):
+        async with model_clients.llm_call() as llm:
+            response = await llm.ainvoke(messages)
     answer = response.content
+    _count_tokens(messages, answer)
 
-    history.append((question, answer))
+    history.append(question, answer)
+    history.schedule_compaction(_summarize_turns)
     return answer
 
 
@@ -207,22 +290,100 @@ async def chat_stream(
     question: str,
     session_id: str = "default",
 ) -> AsyncGenerator[str, None]:
-    """Mesmo que chat() mas retorna tokens via streaming."""
+    """
+    Mesmo que chat() mas retorna tokens via streaming.
+
+    Fechar o gerador (ou cancelar a task que o consome) aborta a chamada
+    llm.astream; a resposta parcial é registrada no histórico.
+    """
     context, is_agg = await _retrieve_context(question)
     history = _get_chat_history(session_id)
     messages = _build_messages(context, history, question, aggregation=is_agg)
 
-    llm = _get_llm()
     full_response = ""
-    async for chunk in llm.astream(messages):
-        token = chunk.content
-        if token:
-            full_response += token
-            yield token
-
-    history.append((question, full_response))
+    completed = False
+    try:
+        with stage("chat", "llm_stream"):
+            async with model_clients.llm_call() as llm:
+                async for chunk in llm.astream(messages):
+                    token = chunk.content
+                    if token:
+                        full_response += token
+                        yield token
+        completed = True
+    finally:
+        _count_tokens(messages, full_response)
+        # Runs on cancellation too (client disconnected): keep the part the
+        # user already saw, flagged so the model won't take it as complete.
+        if completed or full_response:
+            if not completed:
+                full_response += INTERRUPTED_MARKER
+            history.append(question, full_response)
+            history.schedule_compaction(_summarize_turns)
+
+
+def question_key(question: str) -> str:
+    """Questions differing only in case or spacing are answered once."""
+    return " ".join(question.split()).casefold()
+
+
+async def chat_batch(
+    questions: List[str],
+    slot: Optional[Callable[[], AsyncContextManager]] = None,
+) -> List[dict]:
+    """
+    Answer many questions about the same data in one go.
+
+    Repeated questions are answered once. Retrieval is shared: every
+    distinct question is embedded in a single batched call and the
+    dataset overview is fetched at most once. The questions are then
+    answered concurrently, at most chat_batch_concurrency at a time, each
+    inside `slot()` when given (the route passes a chat admission slot, so
+    a batch counts against chat_max_concurrent like single questions).
+    Questions are independent of each other and of any session history.
+
+    Returns one {question, answer, error} per question, in input order; a
+    failed question carries its error instead of failing the batch.
+    """
+    unique: Dict[str, str] = {}
+    for question in questions:
+        unique.setdefault(question_key(question), question.strip())
+    texts = list(unique.values())
+
+    try:
+        with stage("chat", "batch_embed"):
+            vectors = await embed_queries(texts)
+        shared = SharedRetrieval(dict(zip(texts, vectors)))
+    except Exception as exc:
+        # Each question falls back to embedding itself (and reports its own error)
+        logger.warning(f"Falha no embedding em lote das perguntas: {exc}")
+        shared = SharedRetrieval()
+
+    limit = asyncio.Semaphore(max(settings.chat_batch_concurrency, 1))
+
+    async def answer(question: str) -> dict:
+        async with limit:
+            try:
+                async with slot() if slot is not None else nullcontext():
+                    context, is_agg = await _retrieve_context(question, shared)
+                    messages = _build_messages(context, None, question, aggregation=is_agg)
+                    with stage("chat", "llm"):
+                        async with model_clients.llm_call() as llm:
+                            response = await llm.ainvoke(messages)
+                _count_tokens(messages, response.content)
+                return {"answer": response.content, "error": None}
+            except Exception as exc:
+                logger.error(f"Erro no chat em lote ({question[:60]!r}): {exc}")
+                return {"answer": None, "error": str(exc)}
+
+    answers = await asyncio.gather(*(answer(text) for text in texts))
+    by_key = dict(zip(unique, answers))
+    logger.info(f"Chat em lote: {len(questions)} pergunta(s), {len(texts)} distinta(s)")
+    return [{"question": question, **by_key[question_key(question)]} for question in questions]
 
 
 def clear_session(session_id: str) -> None:
     """Limpa o histórico de conversa de uma sessão."""
-    _sessions.pop(session_id, None)
+    history = _sessions.pop(session_id, None)
+    if history is not None:
+        history.close()
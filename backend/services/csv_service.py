@@ -1,13 +1,22 @@
 """Serviço para processar arquivos CSV."""
 import pandas as pd
 import numpy as np
-from io import BytesIO, StringIO
+from io import BytesIO, TextIOWrapper
+from typing import BinaryIO, Callable, TextIO
 import re
 import logging
 
+from services.metrics import stage
+
 logger = logging.getLogger(__name__)
 
+# Tried in order; latin-1 accepts any byte sequence
+_ENCODINGS = ("utf-8-sig", "latin-1")
+# Enough for the header line of the widest Visnir exports
+_DETECT_BYTES = 64 * 1024
+
 
+@stage("upload", "decode")
 def _decode(file_content: bytes) -> str:
     """Decodifica bytes para string tentando utf-8-sig e latin-1."""
     try:
@@ -16,6 +25,11 @@ def _decode(file_content: bytes) -> str:
         return file_content.decode("latin-1")
 
 
+def _open_text(open_binary: Callable[[], BinaryIO], encoding: str) -> TextIO:
+    """Text view of a fresh binary stream, decoded as it is read."""
+    return TextIOWrapper(open_binary(), encoding=encoding, newline="")
+
+
 def _split_csv_line(line: str, sep: str = ",") -> list[str]:
     """Split a CSV line respecting quoted fields."""
     result = []
@@ -42,6 +56,7 @@ def _detect_sep(line: str) -> str:
     return ","
 
 
+@stage("upload", "convert_decimals")
 def _convert_comma_decimals(df: pd.DataFrame) -> pd.DataFrame:
     """
     Para cada coluna não-numérica do DataFrame, tenta converter
@@ -80,6 +95,7 @@ class CSVService:
     """Serviço para processar arquivos CSV."""
 
     @staticmethod
+    @stage("upload", "detect_type")
     def detect_csv_type(file_content: bytes, filename: str) -> str:
         """
         Detecta o tipo de CSV baseado na estrutura das primeiras linhas.
@@ -116,14 +132,13 @@ class CSVService:
         return "generic"
 
     @staticmethod
-    def _parse_visnir(file_content: bytes) -> pd.DataFrame:
+    def _parse_visnir(text: TextIO) -> pd.DataFrame:
         """
         Parse CSV do tipo Visnir.
         Estrutura: formato largo onde a primeira coluna identifica a amostra
         e as demais são wavelengths. Decimais podem usar vírgula.
         """
-        text = _decode(file_content)
-        df = pd.read_csv(StringIO(text), header=0, sep=None, engine="python")
+        df = pd.read_csv(text, header=0, sep=None, engine="python")
 
         # Primeira coluna é sempre o identificador da amostra
         df.rename(columns={df.columns[0]: "amostra"}, inplace=True)
@@ -135,7 +150,7 @@ class CSVService:
         return df
 
     @staticmethod
-    def _parse_nix(file_content: bytes) -> pd.DataFrame:
+    def _parse_nix(text: TextIO) -> pd.DataFrame:
         """
         Parse CSV do tipo Nix.
         Estrutura: 3 linhas de metadados antes do header real.
@@ -143,15 +158,15 @@ class CSVService:
         Decimais com vírgula + notação científica.
         Coluna 'User Color Name' é o identificador da amostra.
         """
-        text = _decode(file_content)
-        lines = text.strip().split("\n")
+        first_line = text.readline().strip()
         # First line is "sep=X" — extract the declared separator
         sep = ","
-        if lines and lines[0].lower().startswith("sep="):
-            declared = lines[0].strip()[4:].strip()
+        if first_line.lower().startswith("sep="):
+            declared = first_line[4:].strip()
             if declared in (";", "\t", "|"):
                 sep = declared
-        df = pd.read_csv(StringIO(text), skiprows=3, header=0, sep=sep)
+        # The sep= line is already consumed: two metadata lines left
+        df = pd.read_csv(text, skiprows=2, header=0, sep=sep)
 
         # Renomear coluna de amostra
         if "User Color Name" in df.columns:
@@ -164,7 +179,7 @@ class CSVService:
         return df
 
     @staticmethod
-    def _parse_pxrf(file_content: bytes) -> pd.DataFrame:
+    def _parse_pxrf(text: TextIO) -> pd.DataFrame:
         """
         Parse CSV do tipo pXRF.
         Estrutura: headers repetidos no meio do arquivo (linhas começando com 'File #'),
@@ -172,49 +187,41 @@ class CSVService:
         '< LOD' substituído por 0. Decimais podem usar vírgula.
         Coluna 'Name' é o identificador da amostra.
         """
-        text = _decode(file_content)
-        lines = text.strip().split("\n")
-
-        # Detect field separator from the first header line
-        first_header = next((l.strip() for l in lines if l.strip().startswith("File #")), "")
-        sep = _detect_sep(first_header)
-        logger.info(f"pXRF: separador detectado = {repr(sep)}")
-
-        # Identificar linhas de header (começam com 'File #') e coletar super-set de colunas
-        header_lines = []
+        # Uma passada só: cada linha de dados fica com o header imediatamente
+        # anterior, e o super-set de colunas é coletado no caminho.
+        # O separador vem do primeiro header (linha começando com 'File #').
+        sep = None
         all_columns = []
         seen = set()
-        for line in lines:
-            stripped = line.strip()
-            if stripped.startswith("File #"):
-                header_lines.append(stripped)
-                cols = [c.strip() for c in _split_csv_line(stripped, sep)]
-                for c in cols:
-                    if c and c not in seen:
-                        all_columns.append(c)
-                        seen.add(c)
-
-        if not header_lines:
-            raise ValueError("pXRF: nenhum header encontrado")
-
-        # Associar cada linha de dados ao seu header (o header imediatamente anterior)
-        rows = []
+        blocks = []
         current_header_cols = None
-        for line in lines:
+        for line in text:
             stripped = line.strip()
             if not stripped:
                 continue
             if stripped.startswith("File #"):
+                if sep is None:
+                    sep = _detect_sep(stripped)
+                    logger.info(f"pXRF: separador detectado = {repr(sep)}")
                 current_header_cols = [c.strip() for c in _split_csv_line(stripped, sep)]
+                for c in current_header_cols:
+                    if c and c not in seen:
+                        all_columns.append(c)
+                        seen.add(c)
                 continue
             if current_header_cols is None:
                 continue
+            blocks.append((current_header_cols, _split_csv_line(stripped, sep)))
+
+        if sep is None:
+            raise ValueError("pXRF: nenhum header encontrado")
 
-            values = _split_csv_line(stripped, sep)
+        rows = []
+        for header_cols, values in blocks:
             row = {col: None for col in all_columns}
             for i, val in enumerate(values):
-                if i < len(current_header_cols):
-                    col_name = current_header_cols[i]
+                if i < len(header_cols):
+                    col_name = header_cols[i]
                     if col_name in seen:
                         row[col_name] = val
             rows.append(row)
@@ -245,20 +252,37 @@ class CSVService:
         Raises:
             ValueError: Se o CSV for inválido
         """
+        return CSVService.validate_and_parse_stream(lambda: BytesIO(file_content), filename)
+
+    @staticmethod
+    def validate_and_parse_stream(open_binary: Callable[[], BinaryIO], filename: str) -> tuple[pd.DataFrame, str]:
+        """
+        Como validate_and_parse_csv, lendo de um stream binário em vez de
+        bytes já em memória (por exemplo um upload comprimido sendo
+        descomprimido). O texto é decodificado à medida que o parser lê;
+        `open_binary` deve abrir o stream do início a cada chamada, porque
+        a detecção do tipo e uma eventual nova tentativa em latin-1 releem.
+        """
         try:
             logger.info(f"Processando arquivo CSV: {filename}")
 
-            csv_type = CSVService.detect_csv_type(file_content, filename)
-
-            if csv_type == "visnir":
-                df = CSVService._parse_visnir(file_content)
-            elif csv_type == "nix":
-                df = CSVService._parse_nix(file_content)
-            elif csv_type == "pxrf":
-                df = CSVService._parse_pxrf(file_content)
-            else:
-                df = pd.read_csv(BytesIO(file_content), sep=None, engine="python")
-                df = _convert_comma_decimals(df)
+            with open_binary() as head:
+                csv_type = CSVService.detect_csv_type(head.read(_DETECT_BYTES), filename)
+
+            parsers = {
+                "visnir": CSVService._parse_visnir,
+                "nix": CSVService._parse_nix,
+                "pxrf": CSVService._parse_pxrf,
+            }
+            parser = parsers.get(csv_type, CSVService._parse_generic)
+            with stage("upload", f"parse_{csv_type}"):
+                for encoding in _ENCODINGS:
+                    try:
+                        with _open_text(open_binary, encoding) as text:
+                            df = parser(text)
+                        break
+                    except UnicodeDecodeError:
+                        logger.info(f"{filename}: não é {encoding}, tentando novamente")
 
             if df.empty:
                 raise ValueError("O arquivo CSV está vazio")
@@ -284,6 +308,13 @@ class CSVService:
             raise ValueError(f"Erro ao processar arquivo: {str(e)}")
 
     @staticmethod
+    def _parse_generic(text: TextIO) -> pd.DataFrame:
+        """CSV sem estrutura conhecida: separador detectado pelo pandas."""
+        df = pd.read_csv(text, sep=None, engine="python")
+        return _convert_comma_decimals(df)
+
+    @staticmethod
+    @stage("upload", "clean")
     def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
         """Limpa e prepara o DataFrame."""
         df = df.dropna(how='all')
@@ -1,11 +1,13 @@
 """PostgreSQL service — replaces the former DeltaLakeService."""
-import json
-import math
+import asyncio
 import logging
 import pandas as pd
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
+from services.analytics_service import samples_and_columns
+from services.serialization import frame_to_json
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,6 +18,9 @@ async def get_dataset_overview() -> dict:
     Creates its own session so it can be called from services that don't
     use FastAPI dependency injection (e.g. chat_service).
 
+    Samples and columns come from the analytics sidecar when it holds
+    every file (a columnar scan instead of extracting them from JSONB).
+
     Returns a dict with:
       - total_records: int
       - samples: list of all distinct 'amostra' values
@@ -29,114 +34,240 @@ async def get_dataset_overview() -> dict:
             await session.execute(text("SELECT COUNT(*) FROM records"))
         ).scalar_one()
 
-        samples_rows = (
-            await session.execute(
-                text("""
-                    SELECT DISTINCT data->>'amostra'
-                    FROM records
-                    WHERE data->>'amostra' IS NOT NULL
-                    ORDER BY 1
-                """)
-            )
-        ).fetchall()
-        samples = [r[0] for r in samples_rows]
-
         files_rows = (
             await session.execute(
                 text("""
-                    SELECT file_name, rows_count, columns_list
+                    SELECT id, file_name, rows_count, columns_list
                     FROM files
                     ORDER BY uploaded_at
                 """)
             )
         ).fetchall()
         files = [
-            {"file_name": r[0], "rows_count": r[1], "columns": r[2]}
+            {"file_name": r[1], "rows_count": r[2], "columns": r[3]}
             for r in files_rows
         ]
 
-        col_rows = (
+        try:
+            columnar = await asyncio.to_thread(samples_and_columns, [r[0] for r in files_rows])
+        except Exception as exc:
+            logger.warning(f"Sidecar analítico indisponível para a visão geral (usando JSONB): {exc}")
+            columnar = None
+
+        if columnar is not None:
+            samples = columnar["samples"]
+            all_columns = columnar["columns"][:500]
+        else:
+            samples_rows = (
+                await session.execute(
+                    text("""
+                        SELECT DISTINCT data->>'amostra'
+                        FROM records
+                        WHERE data->>'amostra' IS NOT NULL
+                        ORDER BY 1
+                    """)
+                )
+            ).fetchall()
+            samples = [r[0] for r in samples_rows]
+
+            col_rows = (
+                await session.execute(
+                    text("""
+                        SELECT DISTINCT key
+                        FROM records, jsonb_object_keys(data) AS key
+                        ORDER BY key
+                        LIMIT 500
+                    """)
+                )
+            ).fetchall()
+            all_columns = [r[0] for r in col_rows]
+
+    return {
+        "total_records": total_records,
+        "samples": samples,
+        "files": files,
+        "all_columns": all_columns,
+    }
+
+
+async def get_lookup_catalog() -> dict:
+    """
+    Return the identifiers the hybrid retriever matches questions against.
+
+    Returns a dict with:
+      - samples: every distinct 'amostra' value
+      - columns: every column name declared by an uploaded file
+    """
+    from db.connection import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        sample_rows = (
             await session.execute(
                 text("""
-                    SELECT DISTINCT key
-                    FROM records, jsonb_object_keys(data) AS key
-                    ORDER BY key
-                    LIMIT 500
+                    SELECT DISTINCT data->>'amostra'
+                    FROM records
+                    WHERE data->>'amostra' IS NOT NULL
                 """)
             )
         ).fetchall()
-        all_columns = [r[0] for r in col_rows]
+
+        column_rows = (
+            await session.execute(
+                text("SELECT DISTINCT unnest(columns_list) FROM files")
+            )
+        ).fetchall()
 
     return {
-        "total_records": total_records,
-        "samples": samples,
-        "files": files,
-        "all_columns": all_columns,
+        "samples": [r[0] for r in sample_rows],
+        "columns": [r[0] for r in column_rows],
     }
 
 
+async def get_records_by_samples(samples: list[str], limit: int) -> list[dict]:
+    """
+    Fetch the records of the given samples straight from PostgreSQL.
+
+    Served by the idx_records_amostra expression index. Returns a list of
+    {file_name, data} in insertion order, at most `limit` rows.
+    """
+    from db.connection import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        rows = (
+            await session.execute(
+                text("""
+                    SELECT f.file_name, r.data
+                    FROM records r
+                    JOIN files f ON f.id = r.file_id
+                    WHERE r.data->>'amostra' = ANY(:samples)
+                    ORDER BY r.id
+                    LIMIT :limit
+                """),
+                {"samples": samples, "limit": limit},
+            )
+        ).fetchall()
+
+    return [{"file_name": r[0], "data": r[1]} for r in rows]
+
+
+async def get_records_by_index(keys: list[tuple[int, int]]) -> dict[tuple[int, int], dict]:
+    """
+    Fetch full rows by (file_id, record_index) — the ids carried in the
+    Chroma metadata — through idx_records_file_record.
+
+    Returns {(file_id, record_index): data}; rows uploaded before
+    record_index existed are simply absent.
+    """
+    from db.connection import AsyncSessionLocal
+
+    if not keys:
+        return {}
+
+    async with AsyncSessionLocal() as session:
+        rows = (
+            await session.execute(
+                text("""
+                    SELECT r.file_id, r.record_index, r.data
+                    FROM records r
+                    JOIN unnest(CAST(:file_ids AS integer[]), CAST(:indexes AS integer[]))
+                         AS k(file_id, record_index)
+                      ON r.file_id = k.file_id AND r.record_index = k.record_index
+                """),
+                {
+                    "file_ids": [k[0] for k in keys],
+                    "indexes": [k[1] for k in keys],
+                },
+            )
+        ).fetchall()
+
+    return {(r[0], r[1]): r[2] for r in rows}
+
+
 class DatabaseService:
     """Handles all database operations for CSV data storage."""
 
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def save_dataframe(self, df: pd.DataFrame, file_name: str) -> tuple[int, int]:
+    async def save_dataframe(
+        self, df: pd.DataFrame, file_name: str, csv_type: str = "generic"
+    ) -> tuple[int, int]:
         """
         Persist a DataFrame to the database.
 
         Inserts one row into `files` (metadata) and one row per DataFrame
-        row into `records` (data stored as JSONB).
+        row into `records` (data stored as JSONB, numbered by record_index
+        in DataFrame order — the same index used for the Chroma ids).
 
         Returns:
             Tuple of (rows_saved, file_id).
         """
-        columns = df.columns.tolist()
-        rows_count = len(df)
+        return (await self.save_dataframes([(df, file_name, csv_type)]))[0]
+
+    async def save_dataframes(
+        self, frames: list[tuple[pd.DataFrame, str, str]]
+    ) -> list[tuple[int, int]]:
+        """
+        Persist several (DataFrame, file_name, csv_type) in one transaction.
+
+        The file ids are reserved from the sequence up front, so the
+        `files` rows go in one multi-row INSERT and the records of every
+        file in one executemany, with a single commit for the batch.
+
+        Returns:
+            (rows_saved, file_id) per frame, in input order.
+        """
+        if not frames:
+            return []
 
-        # Insert file metadata and retrieve the generated id
-        result = await self.session.execute(
+        file_ids = (
+            await self.session.execute(
+                text("SELECT nextval(pg_get_serial_sequence('files', 'id')) FROM generate_series(1, :n)"),
+                {"n": len(frames)},
+            )
+        ).scalars().all()
+
+        await self.session.execute(
             text("""
-                INSERT INTO files (file_name, rows_count, columns_list)
-                VALUES (:file_name, :rows_count, :columns_list)
-                RETURNING id
+                INSERT INTO files (id, file_name, rows_count, columns_list, csv_type)
+                VALUES (:id, :file_name, :rows_count, :columns_list, :csv_type)
             """),
-            {
-                "file_name": file_name,
-                "rows_count": rows_count,
-                "columns_list": columns,
-            },
+            [
+                {
+                    "id": file_id,
+                    "file_name": file_name,
+                    "rows_count": len(df),
+                    "columns_list": df.columns.tolist(),
+                    "csv_type": csv_type,
+                }
+                for file_id, (df, file_name, csv_type) in zip(file_ids, frames)
+            ],
         )
-        file_id = result.scalar_one()
 
-        # Build the batch of records, converting NaN → None for valid JSON
+        # Build the batch of records (NaN → null, see services/serialization.py)
         records = [
-            {
-                "file_id": file_id,
-                "data": json.dumps(
-                    {
-                        k: (None if isinstance(v, float) and math.isnan(v) else v)
-                        for k, v in row.to_dict().items()
-                    },
-                    default=str,
-                ),
-            }
-            for _, row in df.iterrows()
+            {"file_id": file_id, "record_index": record_index, "data": data}
+            for file_id, (df, _, _) in zip(file_ids, frames)
+            for record_index, data in enumerate(frame_to_json(df))
         ]
 
-        await self.session.execute(
-            text(
-                "INSERT INTO records (file_id, data) "
-                "VALUES (:file_id, CAST(:data AS jsonb))"
-            ),
-            records,
-        )
+        if records:
+            await self.session.execute(
+                text(
+                    "INSERT INTO records (file_id, record_index, data) "
+                    "VALUES (:file_id, :record_index, CAST(:data AS jsonb))"
+                ),
+                records,
+            )
 
         await self.session.commit()
-        logger.info(
-            f"Saved {rows_count} rows for file '{file_name}' (file_id={file_id})"
-        )
-        return rows_count, file_id
+        if len(frames) == 1:
+            logger.info(
+                f"Saved {len(records)} rows for file '{frames[0][1]}' (file_id={file_ids[0]})"
+            )
+        else:
+            logger.info(f"Saved {len(records)} rows for {len(frames)} files in one transaction")
+        return [(len(df), file_id) for file_id, (df, _, _) in zip(file_ids, frames)]
 
     async def get_stats(self) -> dict:
         """
@@ -0,0 +1,129 @@
+"""
+Uploads comprimidos (gzip, zstd).
+
+O CSV comprimido chega como `.csv.gz`/`.csv.zst` ou com Content-Encoding e
+é descomprimido em stream direto para o parser
+(CSVService.validate_and_parse_stream): o texto descomprimido nunca fica
+inteiro em memória, só o arquivo comprimido. O tamanho descomprimido é
+limitado por max_decompressed_size_mb, contra "zip bombs".
+"""
+import gzip
+import io
+import zlib
+from typing import BinaryIO, Callable, Optional
+
+from config import settings
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+_CONTENT_ENCODINGS = {"gzip": "gzip", "x-gzip": "gzip", "zstd": "zstd", "identity": None, "": None}
+_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def detect_encoding(file_name: str, content_encoding: Optional[str] = None) -> Optional[str]:
+    """
+    "gzip", "zstd" or None (plain CSV). An explicit Content-Encoding wins
+    over the file suffix.
+
+    Raises:
+        ValueError: codificação não suportada (ou zstd sem o pacote zstandard).
+    """
+    if content_encoding is not None and content_encoding.strip():
+        key = content_encoding.strip().lower()
+        if key not in _CONTENT_ENCODINGS:
+            raise ValueError(f"Content-Encoding não suportado: {content_encoding}")
+        encoding = _CONTENT_ENCODINGS[key]
+    else:
+        lowered = file_name.lower()
+        encoding = next((enc for suffix, enc in _SUFFIXES.items() if lowered.endswith(suffix)), None)
+    if encoding == "zstd" and zstandard is None:
+        raise ValueError("Upload zstd indisponível neste servidor (pacote zstandard não instalado); use gzip")
+    return encoding
+
+
+def csv_name(file_name: str) -> str:
+    """File name without the compression suffix (`solo.csv.gz` → `solo.csv`)."""
+    lowered = file_name.lower()
+    for suffix in _SUFFIXES:
+        if lowered.endswith(suffix):
+            return file_name[: -len(suffix)]
+    return file_name
+
+
+class _LimitedReader(io.RawIOBase):
+    """Pass-through reader that fails once more than `limit` bytes were read."""
+
+    def __init__(self, inner: BinaryIO, limit: int):
+        self._inner = inner
+        self._limit = limit
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._inner.read(len(buffer))
+        self.bytes_read += len(data)
+        if self.bytes_read > self._limit:
+            raise ValueError(
+                f"Arquivo descomprimido excede o tamanho máximo de {settings.max_decompressed_size_mb}MB"
+            )
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._inner.close()
+        super().close()
+
+
+def _decompressing(raw: BinaryIO, encoding: str) -> BinaryIO:
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+
+
+def opener(open_raw: Callable[[], BinaryIO], encoding: Optional[str]) -> Callable[[], BinaryIO]:
+    """
+    Wrap a raw-stream factory so each call yields a fresh stream of the
+    decompressed CSV bytes (plain streams are returned unchanged).
+    """
+    if encoding is None:
+        return open_raw
+
+    def open_decompressed() -> BinaryIO:
+        limited = _LimitedReader(_decompressing(open_raw(), encoding), settings.max_decompressed_size_bytes)
+        return io.BufferedReader(limited, buffer_size=256 * 1024)
+
+    return open_decompressed
+
+
+def peek(data: bytes, encoding: Optional[str], size: int = 64 * 1024) -> bytes:
+    """
+    Up to `size` decompressed bytes from the start of a (possibly partial)
+    compressed payload — enough to check the header of the first chunk of
+    a chunked upload.
+    """
+    if encoding is None:
+        return data
+    try:
+        if encoding == "gzip":
+            return zlib.decompressobj(wbits=31).decompress(data, size)
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+        chunks, remaining = [], size
+        while remaining > 0:
+            try:
+                chunk = reader.read(remaining)
+            except zstandard.ZstdError:
+                # Truncated frame: keep what was decoded so far
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+    except _ERRORS as e:
+        raise ValueError(f"Arquivo comprimido inválido ({encoding}): {e}")
@@ -0,0 +1,138 @@
+"""Formatação dos documentos de embedding — um formato compacto por tipo de CSV."""
+import math
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+
+# Bumped whenever the shaping below changes, so stale documents can be found
+# and re-embedded (stored as `doc_version` in the Chroma metadata).
+DOCUMENT_VERSION = 2
+
+# Visnir bands summarized in the document: (label, start nm, end nm).
+_VISNIR_BANDS = (
+    ("azul", 400, 500),
+    ("verde", 500, 600),
+    ("vermelho", 600, 700),
+    ("nir", 700, 1100),
+    ("swir1", 1100, 1800),
+    ("swir2", 1800, 2500),
+)
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.4g}"
+
+
+def record_to_text(data: dict, file_name: str = "") -> str:
+    """Converte um registro JSONB em texto legível para embedding."""
+    pairs = []
+    for k, v in data.items():
+        if _is_missing(v):
+            continue
+        pairs.append(f"{k}: {v}")
+    text = ", ".join(pairs)
+    if file_name:
+        text = f"arquivo: {file_name} | {text}"
+    return text
+
+
+def _split_spectrum(data: dict) -> Tuple[List[Tuple[float, float]], Dict[str, object]]:
+    """Separate wavelength columns (numeric names) from the other fields."""
+    spectrum = []
+    other = {}
+    for key, value in data.items():
+        try:
+            wavelength = float(str(key).replace(",", "."))
+        except ValueError:
+            other[key] = value
+            continue
+        if isinstance(value, (int, float)) and not _is_missing(value):
+            spectrum.append((wavelength, float(value)))
+    spectrum.sort()
+    return spectrum, other
+
+
+def _band_mean(spectrum: List[Tuple[float, float]], start: float, end: float) -> Optional[float]:
+    values = [v for wl, v in spectrum if start <= wl < end]
+    return sum(values) / len(values) if values else None
+
+
+def _shape_visnir(data: dict) -> str:
+    """
+    Downsampled spectrum, band means and a few derived features instead of
+    one "wavelength: value" pair per column.
+    """
+    spectrum, other = _split_spectrum(data)
+    parts = [", ".join(f"{k}: {v}" for k, v in other.items() if not _is_missing(v))]
+    if not spectrum:
+        return parts[0]
+
+    step = max(settings.visnir_doc_step_nm, 1)
+    sampled = []
+    next_wl = spectrum[0][0]
+    for wl, value in spectrum:
+        if wl >= next_wl:
+            sampled.append(f"{wl:g}: {_fmt(value)}")
+            next_wl = wl + step
+    parts.append(f"espectro a cada {step}nm: " + ", ".join(sampled))
+
+    bands = {}
+    for label, start, end in _VISNIR_BANDS:
+        mean = _band_mean(spectrum, start, end)
+        if mean is not None:
+            bands[label] = mean
+    if bands:
+        parts.append("média por faixa: " + ", ".join(f"{k}: {_fmt(v)}" for k, v in bands.items()))
+
+    values = [v for _, v in spectrum]
+    max_wl, max_value = max(spectrum, key=lambda pair: pair[1])
+    min_wl, min_value = min(spectrum, key=lambda pair: pair[1])
+    derived = [
+        f"albedo médio: {_fmt(sum(values) / len(values))}",
+        f"máximo: {_fmt(max_value)} em {max_wl:g}nm",
+        f"mínimo: {_fmt(min_value)} em {min_wl:g}nm",
+    ]
+    if bands.get("azul") and "vermelho" in bands:
+        derived.append(f"razão vermelho/azul: {_fmt(bands['vermelho'] / bands['azul'])}")
+    if bands.get("vermelho") and "nir" in bands:
+        derived.append(f"razão nir/vermelho: {_fmt(bands['nir'] / bands['vermelho'])}")
+    parts.append("derivados: " + ", ".join(derived))
+
+    return " | ".join(p for p in parts if p)
+
+
+def _shape_pxrf(data: dict) -> str:
+    """Sample id plus the configured key elements (non-zero readings only)."""
+    elements = [e.strip() for e in settings.pxrf_doc_elements.split(",") if e.strip()]
+    pairs = []
+    if not _is_missing(data.get("amostra")):
+        pairs.append(f"amostra: {data['amostra']}")
+    for element in elements:
+        value = data.get(element)
+        if _is_missing(value) or value == 0:
+            continue
+        pairs.append(f"{element}: {value}")
+    return ", ".join(pairs)
+
+
+def shape_document(data: dict, csv_type: str, file_name: str = "") -> str:
+    """
+    Build the text embedded for one record.
+
+    Visnir rows are summarized and pXRF rows reduced to key elements; Nix
+    and generic rows are narrow enough to embed as they are. The full row
+    stays in PostgreSQL and is fetched back when the record is retrieved.
+    """
+    if csv_type == "visnir":
+        text = _shape_visnir(data)
+    elif csv_type == "pxrf":
+        text = _shape_pxrf(data)
+    else:
+        return record_to_text(data, file_name)
+
+    prefix = f"arquivo: {file_name} | tipo: {csv_type}" if file_name else f"tipo: {csv_type}"
+    return f"{prefix} | {text}"
@@ -1,92 +1,264 @@
 """Serviço de embeddings — converte registros JSONB em vetores no ChromaDB."""
+from __future__ import annotations
+
+import asyncio
 import logging
 import math
-from typing import List, Dict, Any
-
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 
 from config import settings
+from services.document_service import DOCUMENT_VERSION, shape_document
+from services.metrics import EMBEDDED_DOCUMENTS, stage
+from services.model_clients import is_transport_error, model_clients
+from services.vector_storage import get_full_vector_store, reduce_vectors, reranking_enabled
+
+# chromadb and langchain are imported on first use (or by the background
+# preload in main.py), keeping them off the API's startup path.
+if TYPE_CHECKING:
+    import chromadb
+    from langchain_core.embeddings import Embeddings
 
 logger = logging.getLogger(__name__)
 
-_vector_store: Chroma | None = None
+CSV_TYPES = ("visnir", "nix", "pxrf", "generic")
 
+_client: chromadb.ClientAPI | None = None
+_collections: Dict[str, Any] = {}
 
-def _record_to_text(data: dict, file_name: str = "") -> str:
-    """Converte um registro JSONB em texto legível para embedding."""
-    pairs = []
-    for k, v in data.items():
-        if v is None:
-            continue
-        if isinstance(v, float) and math.isnan(v):
+
+def get_embeddings_model() -> Embeddings:
+    """Modelo de embeddings configurado (Google ou fake), compartilhado via model_clients."""
+    return model_clients.embeddings()
+
+
+async def _embed(method: str, payload, **kwargs):
+    model = get_embeddings_model()
+    try:
+        return await asyncio.to_thread(getattr(model, method), payload, **kwargs)
+    except Exception as e:
+        if is_transport_error(e):
+            model_clients.discard(model)
+        raise
+
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Full-dimension document embeddings, computed off the event loop."""
+    return await _embed("embed_documents", texts)
+
+
+async def embed_query(text: str) -> List[float]:
+    """Full-dimension query embedding, computed off the event loop."""
+    return await _embed("embed_query", text)
+
+
+async def embed_queries(texts: List[str]) -> List[List[float]]:
+    """
+    Query embeddings for several questions in one batched call — the same
+    vectors embed_query returns (RETRIEVAL_QUERY task), one request
+    instead of one per question.
+    """
+    return await _embed("embed_documents", texts, task_type="RETRIEVAL_QUERY")
+
+
+def _collection_name(csv_type: Optional[str]) -> str:
+    """Collection holding documents of `csv_type` under the current partitioning mode."""
+    if settings.chroma_partition_by_type and csv_type:
+        return f"{settings.chroma_collection_name}_{csv_type}"
+    return settings.chroma_collection_name
+
+
+def _hnsw_metadata() -> dict:
+    """HNSW parameters for newly created collections (existing ones keep theirs)."""
+    return {
+        "hnsw:space": settings.chroma_hnsw_space,
+        "hnsw:construction_ef": settings.chroma_hnsw_construction_ef,
+        "hnsw:search_ef": settings.chroma_hnsw_search_ef,
+        "hnsw:M": settings.chroma_hnsw_m,
+    }
+
+
+def _open_collection(name: str):
+    """Open (or create) a collection in the local persistent Chroma client."""
+    global _client
+    if _client is None:
+        import chromadb
+
+        _client = chromadb.PersistentClient(path=settings.chroma_persist_dir)
+    # Embeddings are computed here and passed explicitly; no Chroma-side model.
+    return _client.get_or_create_collection(name, embedding_function=None, metadata=_hnsw_metadata())
+
+
+def get_collection(csv_type: Optional[str] = None):
+    """
+    Retorna a coleção ChromaDB (singleton por coleção).
+
+    Com `chroma_partition_by_type`, cada csv_type tem sua própria coleção;
+    caso contrário todos os tipos ficam na coleção única e `csv_type` é
+    apenas um campo de metadado usado como filtro.
+
+    Com `vector_service_url`, a coleção é um proxy para o vector worker
+    (mesmos métodos da Collection do chromadb) e nenhum índice é carregado
+    neste processo.
+    """
+    name = _collection_name(csv_type)
+    if name not in _collections:
+        if settings.vector_service_url:
+            from services.vector_client import RemoteCollection
+
+            _collections[name] = RemoteCollection(name)
+        else:
+            _collections[name] = _open_collection(name)
+    return _collections[name]
+
+
+def get_search_collections(csv_type: Optional[str] = None) -> List[tuple[Any, Optional[dict]]]:
+    """
+    Return the (collection, metadata filter) pairs a search for `csv_type` must query.
+
+    Unrouted searches in partitioned mode have to visit every partition.
+    """
+    if settings.chroma_partition_by_type:
+        types = [csv_type] if csv_type else list(CSV_TYPES)
+        return [(get_collection(t), None) for t in types]
+    where = {"csv_type": csv_type} if csv_type else None
+    return [(get_collection(), where)]
+
+
+def warm_up_vector_stores() -> int:
+    """
+    Load the HNSW index of every collection by running one query against it,
+    so the first user question does not pay for reading the index from disk.
+
+    Returns:
+        Número de coleções aquecidas (coleções vazias são ignoradas).
+    """
+    warmed = 0
+    for collection, _ in get_search_collections(None):
+        sample = collection.get(limit=1, include=["embeddings"])
+        if not sample["ids"]:
             continue
-        pairs.append(f"{k}: {v}")
-    text = ", ".join(pairs)
-    if file_name:
-        text = f"arquivo: {file_name} | {text}"
-    return text
-
-
-def get_embeddings_model() -> GoogleGenerativeAIEmbeddings:
-    """Retorna instância configurada do modelo de embeddings Google."""
-    return GoogleGenerativeAIEmbeddings(
-        model=settings.embedding_model,
-        google_api_key=settings.google_api_key,
-    )
-
-
-def get_vector_store() -> Chroma:
-    """Retorna o vector store ChromaDB (singleton)."""
-    global _vector_store
-    if _vector_store is None:
-        _vector_store = Chroma(
-            collection_name=settings.chroma_collection_name,
-            embedding_function=get_embeddings_model(),
-            persist_directory=settings.chroma_persist_dir,
-        )
-    return _vector_store
+        collection.query(query_embeddings=[sample["embeddings"][0]], n_results=1, include=["distances"])
+        warmed += 1
+    return warmed
+
+
+def _record_metadata(record_data: dict, file_id: int, file_name: str, csv_type: str, index: int) -> dict:
+    """Chroma metadata for one record — scalar values only."""
+    metadata = {
+        "file_id": file_id,
+        "file_name": file_name,
+        "record_index": index,
+        "csv_type": csv_type,
+        "doc_version": DOCUMENT_VERSION,
+    }
+    sample = record_data.get("amostra")
+    if sample is not None and not (isinstance(sample, float) and math.isnan(sample)):
+        metadata["amostra"] = str(sample)
+    return metadata
+
+
+@dataclass
+class EmbeddingJob:
+    """The records of one file to embed (see embed_records)."""
+
+    records: List[Dict[str, Any]]
+    file_id: int
+    file_name: str
+    csv_type: str = "generic"
+    indices: Optional[List[int]] = None
 
 
 async def embed_records(
     records: List[Dict[str, Any]],
     file_id: int,
     file_name: str,
+    csv_type: str = "generic",
+    indices: Optional[List[int]] = None,
 ) -> int:
     """
     Converte registros JSONB em documentos de texto, gera embeddings
-    e armazena no ChromaDB.
+    e armazena no ChromaDB, com `csv_type` e `amostra` nos metadados.
+
+    O Chroma recebe os vetores já reduzidos (`embedding_dimensions`); com
+    re-ranking ativo, os vetores completos vão para o FullVectorStore.
+
+    `indices` gives each record's record_index when embedding a subset of a
+    file (reindexing); by default records are numbered by position.
 
     Returns:
         Número de documentos embeddados.
     """
-    store = get_vector_store()
-
-    texts = []
-    metadatas = []
-    ids = []
-
-    for i, record_data in enumerate(records):
-        text = _record_to_text(record_data, file_name)
-        texts.append(text)
-        metadatas.append({
-            "file_id": file_id,
-            "file_name": file_name,
-            "record_index": i,
-        })
-        ids.append(f"file_{file_id}_record_{i}")
+    return await embed_jobs([EmbeddingJob(records, file_id, file_name, csv_type, indices)])
+
+
+async def embed_jobs(jobs: List[EmbeddingJob]) -> int:
+    """
+    Embed the records of several files together.
+
+    Documents of every file share the API batches (many small files cost
+    one call per 100 documents, not one per file); each batch is then
+    split per collection for the upsert and per file for the full vectors.
+
+    Returns:
+        Número de documentos embeddados.
+    """
+    texts: List[str] = []
+    metadatas: List[dict] = []
+    ids: List[str] = []
+    collections: List[str] = []
+    file_ids: List[int] = []
+
+    with stage("embedding", "shape_documents"):
+        for job in jobs:
+            indices = range(len(job.records)) if job.indices is None else job.indices
+            for i, record_data in zip(indices, job.records):
+                texts.append(shape_document(record_data, job.csv_type, job.file_name))
+                metadatas.append(_record_metadata(record_data, job.file_id, job.file_name, job.csv_type, i))
+                ids.append(f"file_{job.file_id}_record_{i}")
+                collections.append(job.csv_type)
+                file_ids.append(job.file_id)
 
     # Processa em lotes de 100 para respeitar limites da API
     BATCH_SIZE = 100
     for start in range(0, len(texts), BATCH_SIZE):
         end = start + BATCH_SIZE
-        store.add_texts(
-            texts=texts[start:end],
-            metadatas=metadatas[start:end],
-            ids=ids[start:end],
-        )
+        with stage("embedding", "embed_api"):
+            vectors = await embed_texts(texts[start:end])
+        reduced = reduce_vectors(vectors).tolist()
+
+        by_collection: Dict[str, List[int]] = {}
+        for offset, csv_type in enumerate(collections[start:end]):
+            by_collection.setdefault(_collection_name(csv_type), []).append(offset)
+        with stage("embedding", "vector_upsert"):
+            for offsets in by_collection.values():
+                positions = [start + o for o in offsets]
+                await asyncio.to_thread(
+                    get_collection(collections[positions[0]]).upsert,
+                    ids=[ids[p] for p in positions],
+                    embeddings=[reduced[o] for o in offsets],
+                    documents=[texts[p] for p in positions],
+                    metadatas=[metadatas[p] for p in positions],
+                )
+        if reranking_enabled():
+            by_file: Dict[int, List[int]] = {}
+            for offset, file_id in enumerate(file_ids[start:end]):
+                by_file.setdefault(file_id, []).append(offset)
+            with stage("embedding", "full_vector_save"):
+                for file_id, offsets in by_file.items():
+                    await asyncio.to_thread(
+                        get_full_vector_store().save,
+                        file_id,
+                        [ids[start + o] for o in offsets],
+                        [vectors[o] for o in offsets],
+                    )
+        EMBEDDED_DOCUMENTS.inc(len(vectors))
 
-    logger.info(
-        f"Embeddings gerados: {len(texts)} documentos para '{file_name}' (file_id={file_id})"
-    )
+    if len(jobs) == 1:
+        job = jobs[0]
+        logger.info(
+            f"Embeddings gerados: {len(texts)} documentos para '{job.file_name}' (file_id={job.file_id})"
+        )
+    else:
+        logger.info(f"Embeddings gerados: {len(texts)} documentos de {len(jobs)} arquivos")
     return len(texts)
@@ -0,0 +1,117 @@
+"""
+Stand-ins offline para o Gemini (LLM e embeddings), com latência configurável.
+
+Selecionados por `llm_provider="fake"` / `embedding_provider="fake"`; servem
+para testes de carga e para medir o custo da orquestração RAG sem gastar
+quota da API.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers with `answer_tokens` placeholder tokens after
+    `first_token_ms`, then streams them at `tokens_per_sec`.
+    """
+
+    first_token_ms: float = 300.0
+    tokens_per_sec: float = 50.0
+    answer_tokens: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        # Deterministic per prompt, so repeated questions give repeated answers.
+        seed = hashlib.sha1(str(messages[-1].content).encode()).hexdigest()[:6]
+        return ["Resposta"] + [f" simulada-{seed}-{i}" for i in range(1, self.answer_tokens)]
+
+    def _token_interval(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def _total_seconds(self) -> float:
+        return self.first_token_ms / 1000 + self._token_interval() * (self.answer_tokens - 1)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._total_seconds())
+        message = AIMessage(content="".join(self._tokens(messages)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self._total_seconds())
+        message = AIMessage(content="".join(self._tokens(messages)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_ms / 1000)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                time.sleep(self._token_interval())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_ms / 1000)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                await asyncio.sleep(self._token_interval())
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic unit vectors derived from a hash of the text, after
+    `latency_ms` per call (the call runs in a worker thread, like the
+    real client's).
+    """
+
+    def __init__(self, dimensions: int = 3072, latency_ms: float = 50.0):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha1(text.encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str], task_type: Optional[str] = None) -> List[List[float]]:
+        time.sleep(self.latency_ms / 1000)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_ms / 1000)
+        return self._vector(text)
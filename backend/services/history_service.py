@@ -0,0 +1,125 @@
+"""Histórico de conversa com resumo incremental das trocas antigas."""
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (pergunta, resposta)
+Turn = Tuple[str, str]
+
+# summarize(resumo_atual, trocas_antigas) -> novo resumo
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+_CHARS_PER_TOKEN = 4
+_TRUNCATION_MARKER = " [...]"
+
+# Upper bound on turns kept in memory while summarization keeps failing,
+# as a multiple of the verbatim window.
+_MAX_PENDING_FACTOR = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text (~4 characters per token)."""
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text so that it fits within max_tokens, marking the cut."""
+    max_chars = max(max_tokens, 0) * _CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= len(_TRUNCATION_MARKER):
+        return ""
+    return text[: max_chars - len(_TRUNCATION_MARKER)] + _TRUNCATION_MARKER
+
+
+class ConversationHistory:
+    """
+    Conversation history of a single chat session.
+
+    The most recent `recent_turns` exchanges are replayed verbatim; older
+    exchanges are folded into a running summary by a background task, so
+    the request that triggers the compaction never waits on it. The
+    window sent to the LLM never exceeds `max_tokens`.
+    """
+
+    def __init__(self, recent_turns: int, max_tokens: int, summary_max_tokens: int):
+        self.recent_turns = max(recent_turns, 1)
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.turns: List[Turn] = []
+        self.summary = ""
+        self._task: Optional[asyncio.Task] = None
+
+    def append(self, question: str, answer: str) -> None:
+        """Record a finished exchange."""
+        self.turns.append((question, answer))
+
+        max_pending = self.recent_turns * _MAX_PENDING_FACTOR
+        if len(self.turns) > max_pending:
+            dropped = len(self.turns) - max_pending
+            del self.turns[:dropped]
+            logger.warning(f"Histórico: {dropped} troca(s) antiga(s) descartada(s) sem resumo")
+
+    def window(self) -> tuple[str, List[Turn]]:
+        """
+        Return (summary, turns) to send with the next request.
+
+        The summary is spent first, then the newest turns are added until
+        the token budget runs out; the turn that crosses the budget has its
+        answer truncated. Turns older than the verbatim window are left out
+        even while their summary is still being computed.
+        """
+        budget = self.max_tokens
+        summary = truncate_to_tokens(self.summary, min(self.summary_max_tokens, budget))
+        budget -= estimate_tokens(summary)
+
+        selected: List[Turn] = []
+        for question, answer in reversed(self.turns[-self.recent_turns:]):
+            cost = estimate_tokens(question) + estimate_tokens(answer)
+            if cost <= budget:
+                selected.append((question, answer))
+                budget -= cost
+                continue
+
+            remaining = budget - estimate_tokens(question)
+            if remaining > 0:
+                selected.append((question, truncate_to_tokens(answer, remaining)))
+            break
+
+        selected.reverse()
+        return summary, selected
+
+    @property
+    def compacting(self) -> bool:
+        """True while a background summarization is running."""
+        return self._task is not None and not self._task.done()
+
+    def schedule_compaction(self, summarize: Summarizer) -> None:
+        """Fold turns older than the verbatim window into the summary, in the background."""
+        if self.compacting or len(self.turns) <= self.recent_turns:
+            return
+        older = self.turns[: -self.recent_turns]
+        self._task = asyncio.create_task(self._compact(summarize, older))
+
+    async def _compact(self, summarize: Summarizer, older: List[Turn]) -> None:
+        try:
+            summary = await summarize(self.summary, older)
+        except Exception as exc:
+            logger.warning(f"Falha ao resumir histórico (será tentado novamente): {exc}")
+            return
+
+        self.summary = truncate_to_tokens(summary.strip(), self.summary_max_tokens)
+        # Only drop what was folded — new turns may have arrived meanwhile,
+        # and append() may have discarded some of the folded ones already.
+        folded_ids = {id(turn) for turn in older}
+        folded = 0
+        while folded < len(self.turns) and id(self.turns[folded]) in folded_ids:
+            folded += 1
+        del self.turns[:folded]
+
+    def close(self) -> None:
+        """Cancel any pending summarization."""
+        if self.compacting:
+            self._task.cancel()
@@ -0,0 +1,157 @@
+"""Métricas Prometheus, spans de latência por etapa e correlation id das requisições."""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+correlation_id: ContextVar[str] = ContextVar("correlation_id", default="-")
+_spans: ContextVar[Optional[List[Tuple[str, str, float]]]] = ContextVar("spans", default=None)
+
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "portaltcc_stage_seconds",
+    "Duração de cada etapa dos pipelines de upload, embedding e chat",
+    ["pipeline", "stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUESTS = Counter(
+    "portaltcc_http_requests_total", "Requisições HTTP", ["method", "route", "status"]
+)
+HTTP_SECONDS = Histogram(
+    "portaltcc_http_request_seconds",
+    "Duração das requisições HTTP (até o fim do corpo, inclusive SSE)",
+    ["method", "route"],
+    buckets=_LATENCY_BUCKETS,
+)
+UPLOAD_ROWS = Counter("portaltcc_upload_rows_total", "Linhas de CSV salvas", ["csv_type"])
+UPLOAD_BYTES = Counter("portaltcc_upload_bytes_total", "Bytes de CSV recebidos")
+UPLOAD_ROWS_PER_SECOND = Histogram(
+    "portaltcc_upload_rows_per_second",
+    "Vazão de cada upload (linhas / duração total do processamento)",
+    buckets=(10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000),
+)
+EMBEDDED_DOCUMENTS = Counter("portaltcc_embedded_documents_total", "Documentos enviados ao índice vetorial")
+LLM_TOKENS = Counter(
+    "portaltcc_llm_tokens_total", "Tokens do LLM (estimados, 4 caracteres por token)", ["direction"]
+)
+STREAM_TTFT = Histogram(
+    "portaltcc_chat_time_to_first_token_seconds",
+    "Tempo até o primeiro token nas respostas em streaming",
+    buckets=_LATENCY_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram(
+    "portaltcc_db_query_seconds", "Duração das queries SQL", ["statement"], buckets=_LATENCY_BUCKETS
+)
+CACHE_LOOKUPS = Counter("portaltcc_cache_lookups_total", "Consultas a caches internos", ["cache", "result"])
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+@contextmanager
+def stage(pipeline: str, name: str):
+    """
+    Time one pipeline stage.
+
+    The duration goes to portaltcc_stage_seconds and, inside a request, to
+    the request's span list, which is logged with its correlation id when
+    the response ends.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(pipeline, name).observe(elapsed)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((pipeline, name, elapsed))
+
+
+# ---------------------------------------------------------------------------
+# Request context (see middleware/correlation.py)
+# ---------------------------------------------------------------------------
+
+def begin_request(request_id: str) -> tuple[Token, Token]:
+    return correlation_id.set(request_id), _spans.set([])
+
+
+def end_request(tokens: tuple[Token, Token], summary: str) -> None:
+    """Log the request's stage spans (summed per stage) and reset the context."""
+    spans = _spans.get() or []
+    if spans:
+        totals: Dict[str, float] = {}
+        for pipeline, name, elapsed in spans:
+            key = f"{pipeline}.{name}"
+            totals[key] = totals.get(key, 0.0) + elapsed
+        stages = ", ".join(f"{key}={elapsed * 1000:.1f}ms" for key, elapsed in totals.items())
+        logger.info(f"{summary} | {stages}")
+    correlation_id.reset(tokens[0])
+    _spans.reset(tokens[1])
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Adds `correlation_id` to every log record (use %(correlation_id)s in the format)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+# ---------------------------------------------------------------------------
+# Scrape-time gauges and exposition
+# ---------------------------------------------------------------------------
+
+class _StateCollector:
+    """Connection pool and admission queue state, read when /metrics is scraped."""
+
+    def describe(self):
+        # Without this, registering would call collect() — and import
+        # db.connection — at import time of this module.
+        return []
+
+    def collect(self):
+        from db.connection import pool_status
+        from services.admission_service import get_controllers
+
+        pool = pool_status()
+        connections = GaugeMetricFamily(
+            "portaltcc_db_pool_connections", "Conexões do pool do PostgreSQL", labels=["state"]
+        )
+        for state in ("checked_out", "idle", "overflow"):
+            # SQLAlchemy reports overflow as negative while the pool is not full
+            connections.add_metric([state], max(pool[state], 0))
+        yield connections
+
+        active = GaugeMetricFamily("portaltcc_admission_active", "Requisições em execução", labels=["endpoint"])
+        queued = GaugeMetricFamily("portaltcc_admission_queued", "Requisições na fila", labels=["endpoint"])
+        for name, controller in get_controllers().items():
+            active.add_metric([name], controller.active)
+            queued.add_metric([name], controller.queue_depth)
+        yield active
+        yield queued
+
+
+REGISTRY.register(_StateCollector())
+
+
+def render_metrics() -> bytes:
+    """
+    Prometheus text exposition. With several uvicorn workers, set
+    PROMETHEUS_MULTIPROC_DIR so counters and histograms are aggregated
+    across processes (per-process gauges are then omitted).
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,209 @@
+"""
+Clientes de LLM e embeddings de longa duração.
+
+`ChatGoogleGenerativeAI` e `GoogleGenerativeAIEmbeddings` abrem um canal
+gRPC/HTTP próprio; criá-los a cada pergunta paga o handshake toda vez. O
+`ModelClientManager` mantém um cliente por (provedor, modelo, temperatura),
+criado no startup pela lifespan do FastAPI, descartado e recriado depois
+de uma falha de conexão (erros da API, como 429 ou bloqueio de segurança,
+não afetam o canal), e fechado no shutdown.
+"""
+import asyncio
+import inspect
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from config import settings
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # optional dependency
+    google_exceptions = None
+
+logger = logging.getLogger(__name__)
+
+# Discarded clients are closed once calls still using them had time to
+# finish; past _MAX_RETIRED, the oldest are closed right away.
+_RETIRE_GRACE_SECONDS = 120.0
+_MAX_RETIRED = 8
+
+
+def _build_llm(provider: str, model: str, temperature: float):
+    if provider == "fake":
+        from services.fake_models import FakeChatModel
+
+        return FakeChatModel(
+            first_token_ms=settings.fake_llm_first_token_ms,
+            tokens_per_sec=settings.fake_llm_tokens_per_sec,
+            answer_tokens=settings.fake_llm_answer_tokens,
+        )
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=settings.google_api_key,
+        temperature=temperature,
+        convert_system_message_to_human=True,
+    )
+
+
+def _build_embeddings(provider: str, model: str):
+    if provider == "fake":
+        from services.fake_models import FakeEmbeddings
+
+        return FakeEmbeddings(
+            dimensions=settings.fake_embedding_dimensions,
+            latency_ms=settings.fake_embedding_latency_ms,
+        )
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return GoogleGenerativeAIEmbeddings(model=model, google_api_key=settings.google_api_key)
+
+
+def is_transport_error(exc: BaseException) -> bool:
+    """
+    Whether a failed call may have left the client's channel broken.
+    API status errors (rate limit, safety block, invalid prompt) come
+    back over a healthy channel and keep the client.
+    """
+    if isinstance(exc, OSError):  # ConnectionError, TimeoutError, socket errors
+        return True
+    return google_exceptions is not None and isinstance(
+        exc, (google_exceptions.ServiceUnavailable, google_exceptions.DeadlineExceeded)
+    )
+
+
+async def _close_client(client: Any) -> None:
+    """Close the sync and (if created) async gRPC transports of a Google client."""
+    for attr in ("client", "async_client_running"):
+        transport = getattr(getattr(client, attr, None), "transport", None)
+        if transport is None:
+            continue
+        try:
+            result = transport.close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.debug(f"Falha ao fechar transporte de {type(client).__name__}: {e}")
+
+
+class ModelClientManager:
+    """
+    Pool of long-lived model clients.
+
+    `llm()` and `embeddings()` return the cached client for the requested
+    model (the configured one by default), creating it on first use. Use
+    `llm_call()` around calls so that a client whose connection failed is
+    dropped and the next request gets a fresh one. Embedding calls run in
+    worker threads, hence the lock.
+    """
+
+    def __init__(self):
+        self._llms: Dict[Tuple[str, str, float], Any] = {}
+        self._embeddings: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._retired: list = []
+        self._closing: set = set()
+
+    def llm(self, model: Optional[str] = None, temperature: Optional[float] = None):
+        key = (
+            settings.llm_provider,
+            model or settings.llm_model,
+            settings.llm_temperature if temperature is None else temperature,
+        )
+        with self._lock:
+            client = self._llms.get(key)
+            if client is None:
+                client = self._llms[key] = _build_llm(*key)
+                logger.info(f"Cliente LLM criado: {key[1]} (temperatura {key[2]}, {key[0]})")
+            return client
+
+    def embeddings(self, model: Optional[str] = None):
+        key = (settings.embedding_provider, model or settings.embedding_model)
+        with self._lock:
+            client = self._embeddings.get(key)
+            if client is None:
+                client = self._embeddings[key] = _build_embeddings(*key)
+                logger.info(f"Cliente de embeddings criado: {key[1]} ({key[0]})")
+            return client
+
+    def discard(self, client: Any) -> None:
+        """
+        Drop a client after a connection failure; the next call builds a
+        new one. The old client is closed after _RETIRE_GRACE_SECONDS.
+        """
+        retired = False
+        with self._lock:
+            for cache in (self._llms, self._embeddings):
+                for key, cached in list(cache.items()):
+                    if cached is client:
+                        del cache[key]
+                        retired = True
+            if retired:
+                self._retired.append(client)
+                overflow = self._retired[:-_MAX_RETIRED]
+        if not retired:
+            return
+        logger.warning(f"Cliente {type(client).__name__} descartado após falha de conexão; será recriado")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop (tests, scripts): closed by close()
+        loop.call_later(_RETIRE_GRACE_SECONDS, self._close_retired, client)
+        for old in overflow:
+            self._close_retired(old)
+
+    def _close_retired(self, client: Any) -> None:
+        with self._lock:
+            if client not in self._retired:
+                return  # already closed
+            self._retired.remove(client)
+        task = asyncio.get_running_loop().create_task(_close_client(client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @asynccontextmanager
+    async def llm_call(self, model: Optional[str] = None, temperature: Optional[float] = None) -> AsyncIterator[Any]:
+        """Yield the LLM client; discard it if the block fails with a transport error."""
+        client = self.llm(model, temperature)
+        try:
+            yield client
+        except Exception as e:
+            if is_transport_error(e):
+                self.discard(client)
+            raise
+
+    async def warm_up(self) -> None:
+        """
+        Create the default clients and their async transports inside the
+        running loop. With `model_warmup_ping`, also send one tiny
+        embedding request so the connection is already open.
+        """
+        llm = self.llm()
+        # Builds the grpc.aio channel now rather than on the first question.
+        getattr(llm, "async_client", None)
+        embeddings = self.embeddings()
+        if settings.model_warmup_ping:
+            try:
+                await asyncio.to_thread(embeddings.embed_query, "ping")
+            except Exception as e:
+                if is_transport_error(e):
+                    self.discard(embeddings)
+                logger.warning(f"Falha no ping de aquecimento dos embeddings: {e}")
+
+    async def close(self) -> None:
+        """Close every client (including ones discarded after failures)."""
+        with self._lock:
+            clients = list(self._llms.values()) + list(self._embeddings.values()) + self._retired
+            self._llms.clear()
+            self._embeddings.clear()
+            self._retired = []
+        for client in clients:
+            await _close_client(client)
+        if clients:
+            logger.info(f"{len(clients)} cliente(s) de modelo fechado(s)")
+
+
+model_clients = ModelClientManager()
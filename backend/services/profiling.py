@@ -0,0 +1,156 @@
+"""
+Profiling sob demanda de requisições individuais.
+
+Uma requisição é perfilada quando traz o header X-Profile igual a
+`profile_token` ou cai na amostragem `profile_sample_rate`. Com pyinstrument
+instalado, usa o profiler por amostragem em modo async (só o tempo da
+própria requisição, inclusive através de awaits); senão, cProfile, que
+mede a thread inteira do event loop enquanto a requisição roda e por isso
+atende uma requisição por vez.
+
+Cada perfil vai para `profile_dir` com um JSON de metadados (rota, status,
+duração, tamanho do corpo e o que a rota anotar, como o tipo de CSV); só os
+`profile_max_files` mais recentes são mantidos.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from config import settings
+
+try:
+    import pyinstrument
+except ImportError:  # optional dependency
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+HEADER = b"x-profile"
+
+_annotations: ContextVar[Optional[dict]] = ContextVar("profile_annotations", default=None)
+_cprofile_busy = False
+_NAME = re.compile(r"^[\w.-]+$")
+
+
+def enabled() -> bool:
+    return settings.profile_sample_rate > 0 or bool(settings.profile_token)
+
+
+def should_profile(headers: dict) -> bool:
+    """Whether to profile a request with these (raw ASGI) headers."""
+    token = settings.profile_token
+    if token and headers.get(HEADER, b"").decode("latin-1") == token:
+        return True
+    return settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate
+
+
+def annotate(**fields) -> None:
+    """Attach fields (csv_type, file size...) to the current request's profile, if any."""
+    annotations = _annotations.get()
+    if annotations is not None:
+        annotations.update(fields)
+
+
+class RequestProfiler:
+    """Profiler for one request; `start()` returns False if it could not start."""
+
+    def __init__(self):
+        self.engine = "pyinstrument" if pyinstrument is not None else "cprofile"
+        self._profiler = None
+        self._token = None
+        self.annotations: dict = {}
+
+    def start(self) -> bool:
+        global _cprofile_busy
+        if self.engine == "pyinstrument":
+            self._profiler = pyinstrument.Profiler(async_mode="enabled")
+        else:
+            # cProfile hooks the whole thread; a second one would clobber the first.
+            if _cprofile_busy:
+                return False
+            _cprofile_busy = True
+            self._profiler = cProfile.Profile()
+        self._token = _annotations.set(self.annotations)
+        if self.engine == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+        return True
+
+    def stop(self) -> None:
+        global _cprofile_busy
+        if self.engine == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+            _cprofile_busy = False
+        _annotations.reset(self._token)
+
+    def save(self, meta: dict) -> str:
+        """Write the profile and its metadata; returns the profile's name."""
+        os.makedirs(settings.profile_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        route = re.sub(r"[^\w]+", "_", meta.get("route", "")).strip("_") or "root"
+        name = f"{stamp}_{route}"
+        base = os.path.join(settings.profile_dir, name)
+
+        if self.engine == "pyinstrument":
+            profile_file = base + ".html"
+            with open(profile_file, "w") as f:
+                f.write(self._profiler.output_html())
+        else:
+            profile_file = base + ".prof"
+            self._profiler.dump_stats(profile_file)
+
+        meta = {
+            "name": name,
+            "file": os.path.basename(profile_file),
+            "engine": self.engine,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **meta,
+            **self.annotations,
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        _enforce_retention()
+        return name
+
+
+def _enforce_retention() -> None:
+    """Delete the oldest profiles beyond `profile_max_files`."""
+    names = sorted(f[:-5] for f in os.listdir(settings.profile_dir) if f.endswith(".json"))
+    for name in names[: max(len(names) - settings.profile_max_files, 0)]:
+        for ext in (".json", ".prof", ".html"):
+            try:
+                os.remove(os.path.join(settings.profile_dir, name + ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> List[dict]:
+    """Metadata of the stored profiles, newest first."""
+    if not os.path.isdir(settings.profile_dir):
+        return []
+    profiles = []
+    for f in sorted(os.listdir(settings.profile_dir), reverse=True):
+        if f.endswith(".json"):
+            try:
+                with open(os.path.join(settings.profile_dir, f)) as fh:
+                    profiles.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+    return profiles
+
+
+def profile_path(file_name: str) -> Optional[str]:
+    """Path of a stored profile file, or None (also for names that escape profile_dir)."""
+    if not _NAME.match(file_name) or not file_name.endswith((".prof", ".html")):
+        return None
+    path = os.path.join(settings.profile_dir, file_name)
+    return path if os.path.isfile(path) else None
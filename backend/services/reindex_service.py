@@ -0,0 +1,403 @@
+"""Consistência PostgreSQL × ChromaDB e reindexação dos documentos ausentes ou desatualizados."""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from config import settings
+from db.connection import AsyncSessionLocal
+from services.document_service import DOCUMENT_VERSION
+from services.embedding_service import embed_records, get_search_collections
+from services.vector_storage import get_full_vector_store
+
+logger = logging.getLogger(__name__)
+
+_SCAN_PAGE_SIZE = 5000
+
+
+@dataclass
+class FilePlan:
+    """Documents of one file that must be (re-)embedded."""
+
+    file_id: int
+    file_name: str
+    csv_type: str
+    # Inclusive [first, last] record_index ranges, ascending
+    pending: List[List[int]] = field(default_factory=list)
+    # Every pending record_index <= done_through is already embedded
+    done_through: int = -1
+    missing: int = 0
+    stale: int = 0
+
+    @property
+    def remaining(self) -> int:
+        return sum(
+            last - max(first, self.done_through + 1) + 1
+            for first, last in self.pending
+            if last > self.done_through
+        )
+
+
+def _to_ranges(indices: List[int]) -> List[List[int]]:
+    """[0, 1, 2, 5, 6] -> [[0, 2], [5, 6]]"""
+    ranges: List[List[int]] = []
+    for index in sorted(indices):
+        if ranges and index == ranges[-1][1] + 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ranges
+
+
+# ---------------------------------------------------------------------------
+# Diff
+# ---------------------------------------------------------------------------
+
+def _scan_index() -> Dict[int, dict]:
+    """
+    Read every document's metadata from Chroma, page by page.
+
+    Returns {file_id: {"versions": {record_index: doc_version}, "csv_type": str}}.
+    """
+    indexed: Dict[int, dict] = {}
+    for collection, where in get_search_collections(None):
+        offset = 0
+        while True:
+            page = collection.get(where=where, include=["metadatas"], limit=_SCAN_PAGE_SIZE, offset=offset)
+            for metadata in page["metadatas"]:
+                if not metadata or "file_id" not in metadata or "record_index" not in metadata:
+                    continue
+                entry = indexed.setdefault(metadata["file_id"], {"versions": {}, "csv_type": None})
+                entry["versions"][metadata["record_index"]] = metadata.get("doc_version", 0)
+                entry["csv_type"] = entry["csv_type"] or metadata.get("csv_type")
+            if len(page["ids"]) < _SCAN_PAGE_SIZE:
+                break
+            offset += _SCAN_PAGE_SIZE
+    return indexed
+
+
+async def _list_files() -> List[dict]:
+    async with AsyncSessionLocal() as session:
+        rows = (
+            await session.execute(
+                text("SELECT id, file_name, rows_count, csv_type FROM files ORDER BY id")
+            )
+        ).fetchall()
+    return [{"id": r[0], "file_name": r[1], "rows_count": r[2], "csv_type": r[3]} for r in rows]
+
+
+async def backfill_record_index() -> int:
+    """
+    Number rows uploaded before record_index existed, in insertion order —
+    the order save_dataframe inserted them in, and the order their Chroma
+    ids were assigned in.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            text("""
+                UPDATE records r
+                SET record_index = n.idx
+                FROM (
+                    SELECT id, uploaded_at,
+                           row_number() OVER (PARTITION BY file_id ORDER BY id) - 1 AS idx
+                    FROM records
+                    WHERE file_id IN (SELECT DISTINCT file_id FROM records WHERE record_index IS NULL)
+                ) n
+                WHERE r.id = n.id AND r.uploaded_at = n.uploaded_at AND r.record_index IS NULL
+            """)
+        )
+        await session.commit()
+    if result.rowcount:
+        logger.info(f"record_index preenchido em {result.rowcount} registros antigos")
+    return result.rowcount
+
+
+async def build_plan(full: bool = False) -> tuple[List[FilePlan], List[int]]:
+    """
+    Diff `files`/`records` against the Chroma ids.
+
+    A document is missing when its file_{id}_record_{i} id is not indexed
+    and stale when it was embedded with an older DOCUMENT_VERSION. With
+    `full`, every document is planned.
+
+    Returns:
+        (plans for files with work to do, ids of files indexed in Chroma
+        but no longer in PostgreSQL)
+    """
+    files = await _list_files()
+    indexed = await asyncio.to_thread(_scan_index)
+
+    plans = []
+    for f in files:
+        entry = indexed.get(f["id"], {"versions": {}, "csv_type": None})
+        versions = entry["versions"]
+        csv_type = f["csv_type"] or entry["csv_type"] or "generic"
+        missing = [i for i in range(f["rows_count"]) if i not in versions]
+        stale = [i for i, v in versions.items() if v != DOCUMENT_VERSION and i < f["rows_count"]]
+        todo = list(range(f["rows_count"])) if full else missing + stale
+        if todo:
+            plans.append(
+                FilePlan(
+                    file_id=f["id"],
+                    file_name=f["file_name"],
+                    csv_type=csv_type,
+                    pending=_to_ranges(todo),
+                    missing=len(missing),
+                    stale=len(stale),
+                )
+            )
+
+    known = {f["id"] for f in files}
+    orphaned = sorted(file_id for file_id in indexed if file_id not in known)
+    return plans, orphaned
+
+
+async def check_consistency() -> dict:
+    """Relatório de divergências entre PostgreSQL e ChromaDB (sem alterar nada)."""
+    plans, orphaned = await build_plan()
+    return {
+        "document_version": DOCUMENT_VERSION,
+        "files_out_of_sync": len(plans),
+        "missing": sum(p.missing for p in plans),
+        "stale": sum(p.stale for p in plans),
+        "orphaned_files": orphaned,
+        "files": [
+            {"file_id": p.file_id, "file_name": p.file_name, "missing": p.missing, "stale": p.stale}
+            for p in plans
+        ],
+    }
+
+
+def _prune_orphans(file_ids: List[int]) -> None:
+    """Remove documents (and re-ranking vectors) of files deleted from PostgreSQL."""
+    for collection, _ in get_search_collections(None):
+        collection.delete(where={"file_id": {"$in": file_ids}})
+    for file_id in file_ids:
+        get_full_vector_store().delete(file_id)
+
+
+# ---------------------------------------------------------------------------
+# Checkpoint
+# ---------------------------------------------------------------------------
+
+def _checkpoint_path() -> str:
+    return os.path.join(settings.chroma_persist_dir, "reindex_checkpoint.json")
+
+
+def load_checkpoint() -> Optional[tuple[List[FilePlan], List[int]]]:
+    """(plans, orphaned file ids) of an interrupted run made for the current DOCUMENT_VERSION."""
+    path = _checkpoint_path()
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("document_version") != DOCUMENT_VERSION:
+        return None
+    return [FilePlan(**plan) for plan in data["files"]], data.get("orphaned", [])
+
+
+def _save_checkpoint(plans: List[FilePlan], orphaned: List[int]) -> None:
+    os.makedirs(settings.chroma_persist_dir, exist_ok=True)
+    tmp_path = _checkpoint_path() + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {
+                "document_version": DOCUMENT_VERSION,
+                "files": [asdict(p) for p in plans],
+                "orphaned": orphaned,
+            },
+            f,
+        )
+    os.replace(tmp_path, _checkpoint_path())
+
+
+def clear_checkpoint() -> None:
+    if os.path.exists(_checkpoint_path()):
+        os.remove(_checkpoint_path())
+
+
+class _Watermark:
+    """
+    Advances FilePlan.done_through as batches finish. Batches of a file are
+    produced in index order but may finish out of order; the watermark only
+    moves past a batch once every earlier batch is done, so a resumed run
+    never skips a failed one.
+    """
+
+    def __init__(self, plan: FilePlan):
+        self.plan = plan
+        self._batches: deque = deque()  # [last index, done]
+
+    def add(self, last_index: int) -> list:
+        batch = [last_index, False]
+        self._batches.append(batch)
+        return batch
+
+    def done(self, batch: list) -> bool:
+        batch[1] = True
+        moved = False
+        while self._batches and self._batches[0][1]:
+            self.plan.done_through = self._batches.popleft()[0]
+            moved = True
+        return moved
+
+
+# ---------------------------------------------------------------------------
+# Reindex
+# ---------------------------------------------------------------------------
+
+async def _produce(plans: List[FilePlan], queue: asyncio.Queue, batch_size: int, workers: int) -> None:
+    """Stream pending rows from PostgreSQL with a server-side cursor, batch by batch."""
+    try:
+        async with AsyncSessionLocal() as session:
+            for plan in plans:
+                watermark = _Watermark(plan)
+                for first, last in plan.pending:
+                    first = max(first, plan.done_through + 1)
+                    if first > last:
+                        continue
+                    result = await session.stream(
+                        text("""
+                            SELECT record_index, data
+                            FROM records
+                            WHERE file_id = :file_id AND record_index BETWEEN :first AND :last
+                            ORDER BY record_index
+                        """).execution_options(yield_per=batch_size),
+                        {"file_id": plan.file_id, "first": first, "last": last},
+                    )
+                    async for rows in result.partitions(batch_size):
+                        indices = [r[0] for r in rows]
+                        batch = watermark.add(indices[-1])
+                        await queue.put((plan, watermark, batch, indices, [r[1] for r in rows]))
+    finally:
+        for _ in range(workers):
+            await queue.put(None)
+
+
+async def _consume(queue: asyncio.Queue, plans: List[FilePlan], orphaned: List[int], status: dict) -> None:
+    last_save = time.monotonic()
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        plan, watermark, batch, indices, records = item
+        try:
+            await embed_records(records, plan.file_id, plan.file_name, plan.csv_type, indices=indices)
+        except Exception as e:
+            status["failed"] += len(indices)
+            logger.warning(
+                f"Reindexação: falha no lote {indices[0]}–{indices[-1]} de '{plan.file_name}' "
+                f"(file_id={plan.file_id}): {e}"
+            )
+            continue
+        status["embedded"] += len(indices)
+        if watermark.done(batch) and time.monotonic() - last_save >= 1.0:
+            _save_checkpoint(plans, orphaned)
+            last_save = time.monotonic()
+
+
+async def reindex(
+    full: bool = False,
+    resume: bool = True,
+    prune: bool = False,
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    status: Optional[dict] = None,
+) -> dict:
+    """
+    Re-embed the documents missing from (or stale in) ChromaDB.
+
+    The plan is saved to a checkpoint next to the Chroma index and updated
+    as batches finish; with `resume`, an interrupted run picks up where it
+    stopped instead of diffing again. Rows are streamed from PostgreSQL and
+    embedded by `concurrency` workers through a bounded queue, so memory
+    stays flat regardless of corpus size.
+
+    Returns:
+        Relatório com contagens de documentos embeddados e falhos.
+    """
+    concurrency = concurrency or settings.reindex_concurrency
+    batch_size = batch_size or settings.reindex_batch_size
+    status = status if status is not None else {}
+    started = time.perf_counter()
+
+    await backfill_record_index()
+
+    checkpoint = load_checkpoint() if resume and not full else None
+    if checkpoint is None:
+        plans, orphaned = await build_plan(full)
+    else:
+        plans, orphaned = checkpoint
+        logger.info(f"Reindexação retomada do checkpoint ({len(plans)} arquivos)")
+
+    if prune and orphaned:
+        await asyncio.to_thread(_prune_orphans, orphaned)
+        logger.info(f"Removidos do ChromaDB os documentos de {len(orphaned)} arquivos apagados")
+    pruned = prune and bool(orphaned)
+    if pruned:
+        orphaned = []
+    _save_checkpoint(plans, orphaned)
+
+    status.update(total=sum(p.remaining for p in plans), embedded=0, failed=0)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    workers = [asyncio.create_task(_consume(queue, plans, orphaned, status)) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(_produce(plans, queue, batch_size, concurrency), *workers)
+    finally:
+        for worker in workers:
+            worker.cancel()
+        _save_checkpoint(plans, orphaned)
+
+    if status["failed"] == 0:
+        clear_checkpoint()
+
+    report = {
+        "files": len(plans),
+        "total": status["total"],
+        "embedded": status["embedded"],
+        "failed": status["failed"],
+        "orphaned_files": orphaned,
+        "pruned": pruned,
+        "elapsed_seconds": round(time.perf_counter() - started, 1),
+    }
+    logger.info(f"Reindexação concluída: {report}")
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Background run (admin endpoint)
+# ---------------------------------------------------------------------------
+
+_task: Optional[asyncio.Task] = None
+_status: dict = {"running": False}
+
+
+def reindex_status() -> dict:
+    return dict(_status)
+
+
+def start_reindex(full: bool = False, prune: bool = False) -> bool:
+    """Start a background reindex; returns False if one is already running."""
+    global _task
+    if _task is not None and not _task.done():
+        return False
+
+    async def run():
+        _status.clear()
+        _status.update(running=True, full=full, started_at=time.time())
+        try:
+            _status["report"] = await reindex(full=full, prune=prune, status=_status)
+        except Exception as e:
+            logger.error(f"Reindexação falhou: {e}")
+            _status["error"] = str(e)
+        finally:
+            _status["running"] = False
+
+    _task = asyncio.create_task(run())
+    return True
@@ -0,0 +1,433 @@
+"""Recuperação de contexto — busca exata por amostra no PostgreSQL e busca vetorial roteada por tipo de CSV."""
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import settings
+from services import analytics_service
+from services.db_service import get_lookup_catalog, get_records_by_index, get_records_by_samples
+from services.document_service import record_to_text
+from services.embedding_service import embed_query, get_search_collections
+from services.metrics import cache_lookup, stage
+from services.vector_storage import full_vectors, reduce_vectors, rerank, reranking_enabled
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[\w][\w.\-/*]*", re.UNICODE)
+
+# Wavelength columns are often written with a unit in questions ("450nm").
+_UNIT_SUFFIX_RE = re.compile(r"^(\d+(?:[.,]\d+)?)\s*nm$", re.IGNORECASE)
+
+# "média de Fe por amostra", "máximo de argila em cada arquivo"
+_GROUP_BY_PATTERNS = {
+    "amostra": re.compile(r"\b(?:por|cada|per|each)\s+(?:amostras?|samples?)\b", re.IGNORECASE),
+    "file": re.compile(r"\b(?:por|cada|per|each)\s+(?:arquivos?|files?)\b", re.IGNORECASE),
+}
+# Columns summarised per aggregation question
+_STATS_MAX_COLUMNS = 5
+
+# Question routing: which instrument's records a question is about.
+# Element symbols are case-sensitive; ambiguous ones (As, S, P, V, U, Y)
+# are left out because they collide with ordinary words.
+_ROUTE_PATTERNS = {
+    "pxrf": [
+        re.compile(
+            r"\b(?:Mg|Al|Si|Cl|K|Ca|Ti|Cr|Mn|Fe|Co|Ni|Cu|Zn|Se|Rb|Sr|Zr|Nb|Mo|Ag|Cd|Sn|Sb|Ba|Pb|Th)\b"
+        ),
+        re.compile(
+            r"\b(?:p?xrf|elementos?|qu[ií]mic\w*|concentra[cç](?:[aã]o|[oõ]es)|ppm|teor\w*)\b",
+            re.IGNORECASE,
+        ),
+    ],
+    "nix": [
+        re.compile(
+            r"\b(?:cor|cores|colou?r\w*|munsell|rgb|hex|matiz|croma|nix|cie\s*lab)\b",
+            re.IGNORECASE,
+        ),
+        re.compile(r"\b[Lab]\*"),
+    ],
+    "visnir": [
+        re.compile(
+            r"\b(?:reflect[aâ]ncia\w*|reflectance|espectr\w*|spectr\w*|comprimentos?\s+de\s+onda"
+            r"|wavelength\w*|vis-?nir|nir|swir|bandas?|absor[cç]\w*)\b",
+            re.IGNORECASE,
+        ),
+        re.compile(r"\b\d{3,4}\s*nm\b", re.IGNORECASE),
+    ],
+}
+
+
+class LookupCatalog:
+    """Known sample identifiers and column names, indexed for matching."""
+
+    def __init__(self, samples: List[str], columns: List[str]):
+        self.samples_by_lower: Dict[str, str] = {}
+        self.multiword_samples: List[str] = []
+        for sample in samples:
+            if not sample or len(sample) < 2:
+                continue
+            if _TOKEN_RE.fullmatch(sample):
+                self.samples_by_lower[sample.lower()] = sample
+            else:
+                self.multiword_samples.append(sample)
+
+        # Short names (element symbols: Fe, Si, K) are matched case-sensitively,
+        # otherwise Portuguese words such as "as" or "de" would hit them.
+        self.short_columns: Dict[str, str] = {}
+        self.columns_by_lower: Dict[str, str] = {}
+        self.multiword_columns: List[str] = []
+        for column in columns:
+            if not column or column == "amostra":
+                continue
+            if not _TOKEN_RE.fullmatch(column):
+                self.multiword_columns.append(column)
+            elif len(column) <= 2:
+                self.short_columns[column] = column
+            else:
+                self.columns_by_lower[column.lower()] = column
+
+        self.loaded_at = time.monotonic()
+
+
+_catalog: Optional[LookupCatalog] = None
+
+
+async def _get_catalog() -> LookupCatalog:
+    """Return the cached catalog, refreshing it after lookup_catalog_ttl_seconds."""
+    global _catalog
+    fresh = _catalog is not None and time.monotonic() - _catalog.loaded_at <= settings.lookup_catalog_ttl_seconds
+    cache_lookup("lookup_catalog", fresh)
+    if not fresh:
+        data = await get_lookup_catalog()
+        _catalog = LookupCatalog(data["samples"], data["columns"])
+    return _catalog
+
+
+def invalidate_lookup_catalog() -> None:
+    """Force the next lookup to reload samples and columns (e.g. after an upload)."""
+    global _catalog
+    _catalog = None
+
+
+def _question_tokens(question: str) -> List[str]:
+    return [t.rstrip(".,;:!?") for t in _TOKEN_RE.findall(question)]
+
+
+def find_sample_mentions(question: str, catalog: LookupCatalog) -> List[str]:
+    """Return the known samples mentioned in the question, in order of appearance."""
+    found: List[str] = []
+    for token in _question_tokens(question):
+        sample = catalog.samples_by_lower.get(token.lower())
+        if sample is not None and sample not in found:
+            found.append(sample)
+
+    lowered = question.lower()
+    for sample in catalog.multiword_samples:
+        if sample.lower() in lowered and sample not in found:
+            found.append(sample)
+    return found
+
+
+def find_column_mentions(question: str, catalog: LookupCatalog) -> List[str]:
+    """Return the known column names mentioned in the question."""
+    found: List[str] = []
+    for token in _question_tokens(question):
+        unit_match = _UNIT_SUFFIX_RE.match(token)
+        if unit_match:
+            token = unit_match.group(1)
+        column = catalog.short_columns.get(token) or catalog.columns_by_lower.get(token.lower())
+        if column is not None and column not in found:
+            found.append(column)
+
+    lowered = question.lower()
+    for column in catalog.multiword_columns:
+        if column.lower() in lowered and column not in found:
+            found.append(column)
+    return found
+
+
+def _format_exact_rows(rows: List[dict], columns: List[str]) -> str:
+    """Render fetched rows, keeping only the mentioned columns when there are any."""
+    docs = []
+    for row in rows:
+        data = row["data"]
+        if columns:
+            data = {k: v for k, v in data.items() if k == "amostra" or k in columns}
+        docs.append(record_to_text(data, row["file_name"]))
+    return "\n\n".join(docs)
+
+
+async def lookup_exact_records(question: str) -> Optional[str]:
+    """
+    Answer record-level questions about named samples straight from PostgreSQL.
+
+    Returns the formatted context, or None when the question names no
+    known sample (or the lookup fails) and vector search should be used.
+    """
+    try:
+        catalog = await _get_catalog()
+        samples = find_sample_mentions(question, catalog)
+        if not samples:
+            return None
+
+        rows = await get_records_by_samples(samples, settings.exact_lookup_max_rows)
+    except Exception as exc:
+        logger.warning(f"Falha na busca exata por amostra (usando busca vetorial): {exc}")
+        return None
+
+    if not rows:
+        return None
+
+    columns = find_column_mentions(question, catalog)
+    logger.info(f"Busca exata: {len(rows)} registro(s) para amostras {samples}, colunas {columns}")
+    return _format_exact_rows(rows, columns)
+
+
+def _format_number(value) -> str:
+    return "-" if value is None else f"{value:.6g}"
+
+
+def _format_stats(column: str, rows: List[dict], group_by: Optional[str]) -> str:
+    lines = []
+    for row in rows:
+        values = (
+            f"média {_format_number(row['mean'])}, mínimo {_format_number(row['min'])}, "
+            f"máximo {_format_number(row['max'])}, desvio padrão {_format_number(row['stddev'])}, "
+            f"{row['count']} valor(es)"
+        )
+        if group_by is None:
+            lines.append(f"{column} ({row['csv_type']}): {values}")
+        else:
+            label = "arquivo" if group_by == "file" else "amostra"
+            key = row["file_id" if group_by == "file" else "amostra"]
+            lines.append(f"{column} ({row['csv_type']}), {label} {key}: {values}")
+    return "\n".join(lines)
+
+
+async def aggregate_statistics(question: str) -> Optional[str]:
+    """
+    Statistics over every record for the columns an aggregation question
+    mentions ("média de Fe por amostra"), computed in the analytics
+    sidecar — overall, per sample or per file, as the question asks.
+
+    Returns None when the sidecar is off or no known column is mentioned.
+    """
+    if not analytics_service.available():
+        return None
+    try:
+        columns = find_column_mentions(question, await _get_catalog())[:_STATS_MAX_COLUMNS]
+        if not columns:
+            return None
+        group_by = next((g for g, pattern in _GROUP_BY_PATTERNS.items() if pattern.search(question)), None)
+        parts = []
+        for column in columns:
+            try:
+                rows = await asyncio.to_thread(analytics_service.column_stats, column, None, None, group_by)
+            except analytics_service.UnknownColumn:
+                continue
+            # Text columns (dates, codes) have no numeric values to summarise
+            rows = [row for row in rows if row["count"]]
+            if rows:
+                parts.append(_format_stats(column, rows, group_by))
+    except Exception as exc:
+        logger.warning(f"Falha ao calcular estatísticas no sidecar analítico: {exc}")
+        return None
+
+    logger.info(f"Estatísticas do sidecar: colunas {columns}, agrupamento {group_by}")
+    return "\n".join(parts) or None
+
+
+def route_question(question: str) -> Optional[str]:
+    """
+    Pick the csv_type a question is about: elements → pXRF, colour → Nix,
+    reflectance/wavelengths → Visnir. Returns None when no type wins clearly.
+    """
+    scores = {
+        csv_type: sum(len(pattern.findall(question)) for pattern in patterns)
+        for csv_type, patterns in _ROUTE_PATTERNS.items()
+    }
+    best = max(scores.values())
+    if best == 0:
+        return None
+    winners = [csv_type for csv_type, score in scores.items() if score == best]
+    return winners[0] if len(winners) == 1 else None
+
+
+def _query_collection(collection, vector: List[float], n: int, where: Optional[dict], with_embeddings: bool) -> list:
+    """One Chroma query; returns (document, distance, index embedding or None) triples."""
+    from langchain_core.documents import Document
+
+    include = ["documents", "metadatas", "distances"]
+    if with_embeddings:
+        include.append("embeddings")
+    result = collection.query(query_embeddings=[vector], n_results=n, where=where, include=include)
+    embeddings = result["embeddings"][0] if with_embeddings else [None] * len(result["ids"][0])
+    return [
+        (Document(page_content=text or "", metadata=metadata or {}), distance, embedding)
+        for text, metadata, distance, embedding in zip(
+            result["documents"][0], result["metadatas"][0], result["distances"][0], embeddings
+        )
+    ]
+
+
+def _mmr_select(query_vector, docs: list, embeddings: list, k: int) -> list:
+    """
+    Maximal marginal relevance with a per-file cap and an adaptive k.
+
+    Each step picks the candidate maximizing
+    λ·sim(query, doc) − (1−λ)·max sim(doc, already selected), skipping files
+    that already contributed `retrieval_max_per_file` documents. Once
+    `retrieval_min_k` documents are selected, candidates whose similarity is
+    more than `retrieval_score_margin` below the best one are dropped, so a
+    question with one clear answer does not get padded with weak matches.
+    """
+    if not docs:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = vectors @ query
+    floor = float(relevance.max()) - settings.retrieval_score_margin
+    lam = settings.retrieval_mmr_lambda
+
+    selected: List[int] = []
+    per_file: Dict[object, int] = {}
+    redundancy = np.zeros(len(docs), dtype=np.float32)
+    remaining = set(range(len(docs)))
+
+    while remaining and len(selected) < k:
+        best, best_score = None, -np.inf
+        for i in remaining:
+            file_id = docs[i].metadata.get("file_id")
+            if file_id is not None and per_file.get(file_id, 0) >= settings.retrieval_max_per_file:
+                continue
+            if len(selected) >= settings.retrieval_min_k and relevance[i] < floor:
+                continue
+            score = lam * relevance[i] - (1 - lam) * redundancy[i]
+            if score > best_score:
+                best, best_score = i, score
+        if best is None:
+            break
+        selected.append(best)
+        remaining.discard(best)
+        file_id = docs[best].metadata.get("file_id")
+        per_file[file_id] = per_file.get(file_id, 0) + 1
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+
+    return [docs[i] for i in selected]
+
+
+async def _search(
+    question: str,
+    k: int,
+    csv_type: Optional[str],
+    query_vector: Optional[List[float]] = None,
+) -> list:
+    """
+    Query the collections for `csv_type` with a single query embedding.
+
+    In "similarity" mode the k nearest documents are returned. In "mmr" mode
+    `retrieval_fetch_k` candidates are diversified with `_mmr_select`, which
+    may return fewer than k. With re-ranking enabled, all candidates from
+    the reduced index are re-ordered on the full-dimension vectors first,
+    and MMR then scores them on those vectors too.
+    """
+    if query_vector is None:
+        with stage("retrieval", "embed_query"):
+            query_vector = await embed_query(question)
+    search_vector = reduce_vectors([query_vector])[0].tolist()
+    mmr = settings.retrieval_mode == "mmr"
+    n = k
+    if mmr:
+        n = max(n, settings.retrieval_fetch_k)
+    if reranking_enabled():
+        n = max(n, settings.vector_rerank_candidates)
+
+    # Scores are distances — lower is better — and comparable across partitions.
+    candidates = []
+    with stage("retrieval", "vector_query"):
+        for collection, where in get_search_collections(csv_type):
+            candidates.extend(await asyncio.to_thread(_query_collection, collection, search_vector, n, where, mmr))
+    candidates.sort(key=lambda triple: triple[1])
+    candidates = candidates[:n]
+    docs = [doc for doc, _, _ in candidates]
+
+    # Re-rank every candidate before cutting down to k, so a document the
+    # reduced index placed too far down can still make it in.
+    full = None
+    if reranking_enabled():
+        with stage("retrieval", "rerank"):
+            docs = await asyncio.to_thread(rerank, query_vector, docs)
+            if mmr:
+                full = await asyncio.to_thread(full_vectors, docs)
+    if mmr:
+        with stage("retrieval", "mmr"):
+            if full is not None:
+                docs = _mmr_select(query_vector, docs, full, k)
+            else:
+                reduced = {id(doc): embedding for doc, _, embedding in candidates}
+                docs = _mmr_select(search_vector, docs, [reduced[id(doc)] for doc in docs], k)
+    return docs[:k]
+
+
+async def _render_docs(question: str, docs: list) -> str:
+    """
+    Turn retrieved documents back into context using the full rows.
+
+    Embedded documents are compact summaries; the raw rows are fetched from
+    PostgreSQL by (file_id, record_index). A raw row goes into the context
+    projected onto the columns the question mentions, or whole when it is
+    narrow enough; otherwise the compact document is used as is.
+    """
+    keys = [
+        (doc.metadata["file_id"], doc.metadata["record_index"])
+        for doc in docs
+        if "file_id" in doc.metadata and "record_index" in doc.metadata
+    ]
+    try:
+        with stage("retrieval", "fetch_rows"):
+            raw_rows = await get_records_by_index(keys)
+        columns = find_column_mentions(question, await _get_catalog()) if raw_rows else []
+    except Exception as exc:
+        logger.warning(f"Falha ao buscar registros completos (usando documentos compactos): {exc}")
+        raw_rows, columns = {}, []
+
+    rendered = []
+    for doc in docs:
+        key = (doc.metadata.get("file_id"), doc.metadata.get("record_index"))
+        data = raw_rows.get(key)
+        file_name = doc.metadata.get("file_name", "")
+        if data is not None and columns:
+            projected = {k: v for k, v in data.items() if k == "amostra" or k in columns}
+            rendered.append(record_to_text(projected, file_name))
+        elif data is not None and len(data) <= settings.context_max_columns:
+            rendered.append(record_to_text(data, file_name))
+        else:
+            rendered.append(doc.page_content)
+    return "\n\n".join(rendered)
+
+
+async def vector_search(question: str, k: int = 10, query_vector: Optional[List[float]] = None) -> str:
+    """
+    Similarity search on ChromaDB; returns the retrieved records as context.
+
+    The search is restricted to the csv_type the question is routed to,
+    falling back to every type when that finds nothing. `query_vector`
+    skips the embedding call when the question was already embedded
+    (e.g. with the rest of a batch).
+    """
+    csv_type = route_question(question)
+    if query_vector is None:
+        with stage("retrieval", "embed_query"):
+            query_vector = await embed_query(question)
+    docs = await _search(question, k, csv_type, query_vector)
+    if not docs and csv_type is not None:
+        logger.info(f"Busca roteada para '{csv_type}' sem resultados, buscando em todos os tipos")
+        docs = await _search(question, k, None, query_vector)
+    return await _render_docs(question, docs)
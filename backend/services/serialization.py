@@ -0,0 +1,70 @@
+"""
+Serialização JSON única da API (orjson).
+
+Usada pelo gravador de registros (JSONB), pelos eventos SSE e pelas
+respostas HTTP (`OrjsonResponse`, a classe de resposta padrão da app).
+NaN, NA e NaT viram null, escalares e arrays numpy são serializados
+nativamente e o resto (Timestamp, Decimal...) cai em `str`, como no
+`json.dumps(..., default=str)` de antes.
+"""
+from typing import Any, Dict, Iterable, List
+
+import orjson
+import pandas as pd
+from starlette.responses import JSONResponse
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """UTF-8 JSON bytes."""
+    return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+
+def dumps_str(obj: Any) -> str:
+    """JSON text (non-ASCII characters kept as-is)."""
+    return orjson.dumps(obj, default=_default, option=_OPTIONS).decode()
+
+
+def loads(data: str | bytes) -> Any:
+    return orjson.loads(data)
+
+
+def rows_to_json(rows: Iterable[Dict[str, Any]]) -> List[str]:
+    """One JSON document per row dict."""
+    encode = orjson.dumps
+    return [encode(row, default=_default, option=_OPTIONS).decode() for row in rows]
+
+
+def frame_to_json(df: pd.DataFrame) -> List[str]:
+    """
+    One JSON document per DataFrame row, keyed by column.
+
+    Goes through one object array instead of `iterrows`/`to_dict`, which
+    build a Series or dict per row and dominate on wide Visnir frames.
+    """
+    columns = df.columns.tolist()
+    return rows_to_json(dict(zip(columns, values)) for values in df.to_numpy(dtype=object))
+
+
+def sse_event(data: Any, event: str | None = None, event_id: int | None = None) -> str:
+    """Format one Server-Sent Event with a JSON payload."""
+    head = ""
+    if event is not None:
+        head += f"event: {event}\n"
+    if event_id is not None:
+        head += f"id: {event_id}\n"
+    return f"{head}data: {dumps_str(data)}\n\n"
+
+
+class OrjsonResponse(JSONResponse):
+    """JSONResponse rendered with `dumps` (FastAPI's ORJSONResponse is deprecated)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,295 @@
+"""
+Estatísticas do banco para o view_data.py (e relatórios via cron).
+
+Cada seção é uma query independente, executada em paralelo num pool
+asyncpg pequeno. As seções evitam varrer `records` sempre que o catálogo
+responde: colunas vêm de files.columns_list, contagens aproximadas vêm de
+approximate_row_count (TimescaleDB), pg_class.reltuples ou da estimativa
+do planejador, e o histograma por intervalo pode rodar sobre uma amostra
+(TABLESAMPLE SYSTEM) com as contagens escaladas.
+"""
+import asyncio
+import csv
+import io
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from config import settings
+from db.query_log import asyncpg_query_logger
+from services.serialization import loads
+
+
+@dataclass
+class StatsFilter:
+    """Restrict every section to some files and/or an upload time range."""
+
+    file_ids: List[int] = field(default_factory=list)
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.file_ids or self.since or self.until)
+
+    def where(self, file_column: str = "file_id", time_column: str = "uploaded_at", first_param: int = 1) -> Tuple[str, list]:
+        """
+        SQL condition ("TRUE" without filters) and its asyncpg parameters,
+        numbered from `first_param`.
+        """
+        clauses, params = [], []
+        if self.file_ids:
+            params.append(list(self.file_ids))
+            clauses.append(f"{file_column} = ANY(${first_param + len(params) - 1}::int[])")
+        if self.since:
+            params.append(self.since)
+            clauses.append(f"{time_column} >= ${first_param + len(params) - 1}")
+        if self.until:
+            params.append(self.until)
+            clauses.append(f"{time_column} < ${first_param + len(params) - 1}")
+        return (" AND ".join(clauses) or "TRUE"), params
+
+
+def _asyncpg_url(sqlalchemy_url: str) -> str:
+    """Convert a SQLAlchemy async URL to a plain asyncpg URL."""
+    return sqlalchemy_url.replace("postgresql+asyncpg://", "postgresql://")
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    conn.add_query_logger(asyncpg_query_logger)
+
+
+async def create_pool(concurrency: Optional[int] = None, statement_timeout_ms: Optional[int] = None) -> asyncpg.Pool:
+    timeout = settings.stats_statement_timeout_ms if statement_timeout_ms is None else statement_timeout_ms
+    return await asyncpg.create_pool(
+        _asyncpg_url(settings.database_url),
+        min_size=1,
+        max_size=concurrency or settings.stats_concurrency,
+        init=_init_connection,
+        server_settings={"application_name": "portaltcc-stats", "statement_timeout": str(timeout)},
+    )
+
+
+# ---------------------------------------------------------------------------
+# Seções
+# ---------------------------------------------------------------------------
+
+
+async def _catalog(pool: asyncpg.Pool) -> Dict[str, Any]:
+    row = await pool.fetchrow(
+        """
+        SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb') AS timescaledb,
+               to_regclass('records') IS NOT NULL AS has_records
+        """
+    )
+    return dict(row)
+
+
+async def _file_count(pool: asyncpg.Pool, flt: StatsFilter) -> int:
+    where, params = flt.where(file_column="id")
+    return await pool.fetchval(f"SELECT COUNT(*) FROM files WHERE {where}", *params)
+
+
+async def _record_count(pool: asyncpg.Pool, flt: StatsFilter, approximate: bool, catalog: Dict[str, Any]) -> Dict[str, Any]:
+    if not approximate:
+        where, params = flt.where()
+        count = await pool.fetchval(f"SELECT COUNT(*) FROM records WHERE {where}", *params)
+        return {"value": count, "method": "exact"}
+
+    if not flt.active:
+        if catalog["timescaledb"]:
+            count = await pool.fetchval("SELECT approximate_row_count('records')")
+            return {"value": int(count), "method": "approximate_row_count"}
+        # -1 on a table that was never analyzed
+        count = await pool.fetchval("SELECT reltuples::bigint FROM pg_class WHERE oid = 'records'::regclass")
+        return {"value": max(int(count), 0), "method": "reltuples"}
+
+    if flt.file_ids and not (flt.since or flt.until):
+        count = await pool.fetchval("SELECT COALESCE(SUM(rows_count), 0) FROM files WHERE id = ANY($1::int[])", flt.file_ids)
+        return {"value": int(count), "method": "files.rows_count"}
+
+    where, params = flt.where()
+    plan = await pool.fetchval(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM records WHERE {where}", *params)
+    return {"value": int(loads(plan)[0]["Plan"]["Plan Rows"]), "method": "planner_estimate"}
+
+
+async def _columns(pool: asyncpg.Pool, flt: StatsFilter, scan_keys: bool, sample_percent: Optional[float]) -> Dict[str, Any]:
+    if not scan_keys:
+        where, params = flt.where(file_column="id")
+        rows = await pool.fetch(
+            f"SELECT DISTINCT unnest(columns_list) AS key FROM files WHERE {where} ORDER BY key", *params
+        )
+        return {"value": [r["key"] for r in rows], "method": "files.columns_list"}
+
+    where, params = flt.where(first_param=2 if sample_percent else 1)
+    if sample_percent:
+        source = "records TABLESAMPLE SYSTEM ($1::real)"
+        params = [sample_percent] + params
+    else:
+        source = "records"
+    rows = await pool.fetch(
+        f"SELECT DISTINCT key FROM {source}, jsonb_object_keys(data) AS key WHERE {where} ORDER BY key", *params
+    )
+    return {"value": [r["key"] for r in rows], "method": "sampled_scan" if sample_percent else "scan"}
+
+
+async def _recent_files(pool: asyncpg.Pool, flt: StatsFilter, limit: int) -> List[Dict[str, Any]]:
+    where, params = flt.where(file_column="id")
+    rows = await pool.fetch(
+        f"""
+        SELECT id, file_name, csv_type, rows_count, columns_list, uploaded_at
+        FROM files
+        WHERE {where}
+        ORDER BY uploaded_at DESC
+        LIMIT {int(limit)}
+        """,
+        *params,
+    )
+    return [dict(r) for r in rows]
+
+
+async def _sample_records(pool: asyncpg.Pool, flt: StatsFilter, limit: int) -> List[Dict[str, Any]]:
+    where, params = flt.where()
+    rows = await pool.fetch(
+        f"""
+        SELECT file_id, data, uploaded_at
+        FROM records
+        WHERE {where}
+        ORDER BY uploaded_at DESC
+        LIMIT {int(limit)}
+        """,
+        *params,
+    )
+    return [{"file_id": r["file_id"], "uploaded_at": r["uploaded_at"], "data": loads(r["data"])} for r in rows]
+
+
+async def _buckets(
+    pool: asyncpg.Pool,
+    flt: StatsFilter,
+    bucket: str,
+    limit: int,
+    sample_percent: Optional[float],
+    catalog: Dict[str, Any],
+) -> Dict[str, Any]:
+    params: list = [bucket]
+    if sample_percent:
+        params.append(sample_percent)
+        source = "records TABLESAMPLE SYSTEM ($2::real)"
+    else:
+        source = "records"
+    where, filter_params = flt.where(first_param=len(params) + 1)
+    params += filter_params
+
+    if catalog["timescaledb"]:
+        bucket_expr = "time_bucket($1::text::interval, uploaded_at)"
+    else:
+        bucket_expr = "date_bin($1::text::interval, uploaded_at, TIMESTAMPTZ '2000-01-01')"
+
+    rows = await pool.fetch(
+        f"""
+        SELECT {bucket_expr} AS bucket, COUNT(*) AS count
+        FROM {source}
+        WHERE {where}
+        GROUP BY bucket
+        ORDER BY bucket DESC
+        LIMIT {int(limit)}
+        """,
+        *params,
+    )
+    scale = 100.0 / sample_percent if sample_percent else 1.0
+    return {
+        "value": [{"bucket": r["bucket"], "count": round(r["count"] * scale)} for r in rows],
+        "method": f"sampled {sample_percent}%" if sample_percent else "exact",
+        "interval": bucket,
+    }
+
+
+async def _timed(timings: Dict[str, float], name: str, coro):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def collect_stats(
+    pool: asyncpg.Pool,
+    flt: Optional[StatsFilter] = None,
+    *,
+    approximate: bool = False,
+    sample_percent: Optional[float] = None,
+    scan_keys: bool = False,
+    bucket: str = "1 hour",
+    limit: int = 10,
+    bucket_limit: int = 20,
+) -> Dict[str, Any]:
+    """
+    Run every section concurrently and return the report.
+
+    Args:
+        approximate:    contagem de registros pelo catálogo/planejador.
+        sample_percent: porcentagem de blocos (TABLESAMPLE SYSTEM) lida no
+                        histograma e na varredura de chaves.
+        scan_keys:      listar as chaves realmente presentes em records.data
+                        em vez de files.columns_list.
+    """
+    flt = flt or StatsFilter()
+    if sample_percent is not None and not 0 < sample_percent <= 100:
+        raise ValueError("sample_percent deve estar em (0, 100]")
+
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    catalog = await _timed(timings, "catalog", _catalog(pool))
+    if not catalog["has_records"]:
+        raise RuntimeError("Tabela records não existe — inicie a API uma vez para criar o esquema")
+
+    sections = {
+        "files": _file_count(pool, flt),
+        "records": _record_count(pool, flt, approximate, catalog),
+        "columns": _columns(pool, flt, scan_keys, sample_percent),
+        "recent_files": _recent_files(pool, flt, limit),
+        "sample": _sample_records(pool, flt, limit),
+        "buckets": _buckets(pool, flt, bucket, bucket_limit, sample_percent, catalog),
+    }
+    results = await asyncio.gather(*(_timed(timings, name, coro) for name, coro in sections.items()))
+
+    return {
+        "generated_at": datetime.now().astimezone(),
+        "filter": {
+            "file_ids": flt.file_ids,
+            "since": flt.since,
+            "until": flt.until,
+        },
+        "timescaledb": catalog["timescaledb"],
+        **dict(zip(sections, results)),
+        "timings_ms": timings,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def report_to_csv(report: Dict[str, Any]) -> str:
+    """
+    Long-format CSV (section, key, value) of the scalar parts of a report,
+    for appending to cron-driven reports. Sample rows are left out.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["generated_at", "section", "key", "value"])
+    stamp = report["generated_at"].isoformat(timespec="seconds")
+
+    def row(section, key, value):
+        writer.writerow([stamp, section, key, value])
+
+    row("files", "count", report["files"])
+    row("records", report["records"]["method"], report["records"]["value"])
+    row("columns", "count", len(report["columns"]["value"]))
+    for f in report["recent_files"]:
+        row("file", f"{f['id']}:{f['file_name']}", f["rows_count"])
+    for b in report["buckets"]["value"]:
+        row("bucket", b["bucket"].isoformat(), b["count"])
+    for name, ms in report["timings_ms"].items():
+        row("timing_ms", name, ms)
+    return out.getvalue()
@@ -0,0 +1,177 @@
+"""Buffer de streams de chat — permite retomar uma resposta após queda de conexão."""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from config import settings
+from services.metrics import STREAM_TTFT
+
+logger = logging.getLogger(__name__)
+
+_streams: Dict[str, "TokenStream"] = {}
+
+
+class StreamGone(Exception):
+    """The requested offset has already been evicted from the ring buffer."""
+
+
+def _stream_stats(started: float, first_token_at: Optional[float], tokens: int) -> dict:
+    """Time-to-first-token and generation rate reported in the `done` event."""
+    now = time.perf_counter()
+    if first_token_at is None:
+        return {"time_to_first_token_ms": None, "tokens": 0, "tokens_per_sec": 0.0}
+    generation_seconds = now - first_token_at
+    return {
+        "time_to_first_token_ms": round((first_token_at - started) * 1000, 1),
+        "tokens": tokens,
+        "tokens_per_sec": round(tokens / generation_seconds, 1) if generation_seconds > 0 else None,
+    }
+
+
+class TokenStream:
+    """
+    One LLM generation, decoupled from the HTTP connection that started it.
+
+    Tokens are kept in a bounded ring buffer addressed by absolute offset,
+    so a client that reconnects can replay what it missed and keep
+    following the live generation. When the last subscriber detaches, the
+    generation keeps running for `stream_resume_grace_seconds`; if nobody
+    reattaches by then it is cancelled, so abandoned answers stop costing
+    tokens.
+    """
+
+    def __init__(self, session_id: str, capacity: int):
+        self.stream_id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.offset = 0
+        self.done = False
+        self.error: Optional[str] = None
+        self.stats: dict = {}
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self._buffer: deque = deque(maxlen=capacity)
+        self._cond = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._grace: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def first_offset(self) -> int:
+        """Oldest offset still available for replay."""
+        return self.offset - len(self._buffer)
+
+    def start(self, tokens: AsyncIterator[str], on_finish: Optional[Callable[[], None]] = None) -> None:
+        self._task = asyncio.create_task(self._produce(tokens))
+        if on_finish is not None:
+            # A done-callback also fires when the task is cancelled before it ran.
+            self._task.add_done_callback(lambda _task: on_finish())
+
+    async def _produce(self, tokens: AsyncIterator[str]) -> None:
+        started = time.perf_counter()
+        first_token_at = None
+        try:
+            async for token in tokens:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                async with self._cond:
+                    self._buffer.append(token)
+                    self.offset += 1
+                    self._cond.notify_all()
+        except asyncio.CancelledError:
+            self.error = "Geração cancelada"
+            logger.info(f"Stream {self.stream_id} cancelado após {self.offset} tokens")
+        except Exception as exc:
+            self.error = str(exc)
+            logger.error(f"Erro no stream {self.stream_id}: {exc}")
+        finally:
+            # Closing the source runs chat_stream's cleanup (partial answer
+            # recording) even when the cancellation landed between tokens.
+            aclose = getattr(tokens, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            self.stats = _stream_stats(started, first_token_at, self.offset)
+            if first_token_at is not None:
+                STREAM_TTFT.observe(first_token_at - started)
+            self.finished_at = time.monotonic()
+            async with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    async def read(self, offset: int, timeout: float) -> tuple[List[str], bool]:
+        """
+        Return the tokens from `offset` on and whether the stream is done.
+
+        Waits up to `timeout` seconds when nothing new is available; an
+        empty list with done=False means the caller should send a heartbeat.
+
+        Raises:
+            StreamGone: if `offset` has already left the ring buffer
+        """
+        async with self._cond:
+            if offset >= self.offset and not self.done:
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            if offset < self.first_offset:
+                raise StreamGone(
+                    f"Offset {offset} não está mais disponível (mínimo {self.first_offset})"
+                )
+            start = offset - self.first_offset
+            return list(islice(self._buffer, start, None)), self.done
+
+    def attach(self) -> None:
+        self.subscribers += 1
+        if self._grace is not None:
+            self._grace.cancel()
+            self._grace = None
+
+    def detach(self) -> None:
+        self.subscribers -= 1
+        if self.subscribers <= 0 and not self.done:
+            loop = asyncio.get_running_loop()
+            self._grace = loop.call_later(settings.stream_resume_grace_seconds, self._abandon)
+
+    def _abandon(self) -> None:
+        self._grace = None
+        if self.subscribers <= 0 and not self.done and self._task is not None:
+            logger.info(f"Nenhum cliente reconectou ao stream {self.stream_id}, cancelando geração")
+            self._task.cancel()
+
+
+def _purge_finished() -> None:
+    """Drop finished streams older than the retention window."""
+    cutoff = time.monotonic() - settings.stream_retention_seconds
+    expired = [
+        stream_id
+        for stream_id, stream in _streams.items()
+        if stream.finished_at is not None and stream.finished_at < cutoff and stream.subscribers <= 0
+    ]
+    for stream_id in expired:
+        del _streams[stream_id]
+
+
+def start_stream(
+    session_id: str,
+    tokens: AsyncIterator[str],
+    on_finish: Optional[Callable[[], None]] = None,
+) -> TokenStream:
+    """
+    Register a new stream and start consuming `tokens` in the background.
+
+    `on_finish` is called once the generation ends, however it ends.
+    """
+    _purge_finished()
+    stream = TokenStream(session_id, capacity=settings.stream_buffer_tokens)
+    _streams[stream.stream_id] = stream
+    stream.start(tokens, on_finish)
+    return stream
+
+
+def get_stream(stream_id: str) -> Optional[TokenStream]:
+    """Return a registered stream, or None if unknown or expired."""
+    _purge_finished()
+    return _streams.get(stream_id)
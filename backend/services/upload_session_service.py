@@ -0,0 +1,325 @@
+"""
+Upload em partes, retomável (/api/uploads).
+
+create → PUT de faixas de bytes (em paralelo, em qualquer ordem) → finalize.
+Cada parte é gravada direto na sua posição num arquivo pré-alocado em
+upload_tmp_dir/<id>/data; as partes recebidas e o tipo de CSV ficam em
+meta.json ao lado, para que o cliente possa retomar depois de uma queda
+de rede — inclusive depois de a API reiniciar.
+
+A primeira parte já é validada (texto, tipo de CSV) assim que chega, e o
+parse começa em segundo plano quando o último byte chega, de modo que o
+finalize só espera o que faltar dele. Arquivos comprimidos (.csv.gz,
+.csv.zst ou content_encoding na criação) são montados comprimidos e
+descomprimidos em stream pelo parser.
+"""
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config import settings
+from services.csv_service import CSVService
+from services.decompression import csv_name, detect_encoding, opener, peek
+from services.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class UploadNotFound(LookupError):
+    """Unknown or expired upload id."""
+
+
+class UploadTooLarge(ValueError):
+    """Announced size above max_file_size_mb."""
+
+
+class UploadIncomplete(Exception):
+    """Finalize called before every chunk arrived (or while one is still being written)."""
+
+    def __init__(self, missing: List[int], message: Optional[str] = None):
+        super().__init__(message or f"{len(missing)} parte(s) ainda não recebida(s)")
+        self.missing = missing
+
+
+class UploadAlreadyComplete(ValueError):
+    """Chunk sent after every chunk arrived; the parse may already be reading the file."""
+
+
+@dataclass
+class UploadSession:
+    upload_id: str
+    file_name: str
+    size: int
+    chunk_size: int
+    received: List[int] = field(default_factory=list)
+    csv_type: Optional[str] = None
+    # "gzip"/"zstd" when the bytes being uploaded are compressed
+    encoding: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def total_chunks(self) -> int:
+        return max(1, -(-self.size // self.chunk_size))
+
+    @property
+    def missing(self) -> List[int]:
+        received = set(self.received)
+        return [i for i in range(self.total_chunks) if i not in received]
+
+    @property
+    def complete(self) -> bool:
+        return len(self.received) == self.total_chunks
+
+    def chunk_length(self, index: int) -> int:
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+
+def parse_content_range(header: Optional[str]) -> Tuple[int, int, int]:
+    """`bytes start-end/total` → (start, end inclusive, total)."""
+    match = _RANGE_RE.match((header or "").strip())
+    if not match:
+        raise ValueError("Header Content-Range ausente ou inválido (esperado 'bytes início-fim/total')")
+    start, end, total = (int(g) for g in match.groups())
+    if end < start or end >= total:
+        raise ValueError("Faixa de bytes inválida")
+    return start, end, total
+
+
+def _check_first_chunk(data: bytes, file_name: str, encoding: Optional[str] = None) -> str:
+    """Reject non-text uploads early and detect the CSV type from the header."""
+    data = peek(data, encoding)
+    if b"\x00" in data:
+        raise ValueError("O arquivo não parece ser um CSV de texto")
+    # Only complete lines: the chunk may end in the middle of one
+    head = data[: data.rfind(b"\n") + 1] or data
+    if not head.strip():
+        raise ValueError("O arquivo CSV está vazio")
+    return CSVService.detect_csv_type(head, file_name)
+
+
+def _write_at(path: str, offset: int, data: bytes) -> None:
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        os.pwrite(fd, data, offset)
+    finally:
+        os.close(fd)
+
+
+class UploadSessionStore:
+    """
+    Upload sessions on local disk.
+
+    One lock per session serializes the bookkeeping of parallel chunk
+    PUTs; the writes themselves go to disjoint offsets. The parse only
+    starts once the upload is complete and no write is in flight, and a
+    complete upload takes no more writes, so the file never changes under
+    the parser or its cached result.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.upload_tmp_dir
+        self._sessions: Dict[str, UploadSession] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._parse_tasks: Dict[str, asyncio.Task] = {}
+        # Chunk writes in flight per session
+        self._writing: Dict[str, int] = {}
+
+    def _dir(self, upload_id: str) -> str:
+        return os.path.join(self.root, upload_id)
+
+    def _data_path(self, upload_id: str) -> str:
+        return os.path.join(self._dir(upload_id), "data")
+
+    def _save(self, session: UploadSession) -> None:
+        path = os.path.join(self._dir(session.upload_id), "meta.json")
+        with open(path + ".tmp", "wb") as f:
+            f.write(dumps(asdict(session)))
+        os.replace(path + ".tmp", path)
+
+    def _allocate(self, session: UploadSession) -> None:
+        os.makedirs(self._dir(session.upload_id))
+        with open(self._data_path(session.upload_id), "wb") as f:
+            f.truncate(session.size)
+        self._save(session)
+
+    async def create(self, file_name: str, size: int, content_encoding: Optional[str] = None) -> UploadSession:
+        if not csv_name(file_name).lower().endswith(".csv"):
+            raise ValueError("Apenas arquivos CSV são permitidos")
+        encoding = detect_encoding(file_name, content_encoding)
+        if size <= 0:
+            raise ValueError("O arquivo CSV está vazio")
+        if size > settings.max_file_size_bytes:
+            raise UploadTooLarge(f"Arquivo excede o tamanho máximo de {settings.max_file_size_mb}MB")
+
+        await self.purge_expired()
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex,
+            file_name=os.path.basename(csv_name(file_name)),
+            size=size,
+            chunk_size=settings.upload_chunk_size_kb * 1024,
+            encoding=encoding,
+        )
+        await asyncio.to_thread(self._allocate, session)
+        self._sessions[session.upload_id] = session
+        logger.info(f"Upload {session.upload_id} criado: {session.file_name} ({size} bytes, {session.total_chunks} partes)")
+        return session
+
+    def get(self, upload_id: str) -> UploadSession:
+        session = self._sessions.get(upload_id)
+        if session is not None:
+            return session
+        if not _ID_RE.match(upload_id):
+            raise UploadNotFound(upload_id)
+        try:
+            with open(os.path.join(self._dir(upload_id), "meta.json"), "rb") as f:
+                session = UploadSession(**loads(f.read()))
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id)
+        self._sessions[upload_id] = session
+        return session
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    async def write_chunk(self, upload_id: str, start: int, total: int, data: bytes) -> UploadSession:
+        """
+        Store one chunk. Chunks must start on a chunk boundary and have the
+        full chunk length (shorter only for the last one); re-sending a
+        chunk overwrites it, so retries are safe until the upload is
+        complete — after that, writes raise UploadAlreadyComplete.
+        """
+        session = self.get(upload_id)
+        if session.error:
+            raise ValueError(session.error)
+        if total != session.size:
+            raise ValueError(f"Tamanho total {total} difere do anunciado ({session.size})")
+        index, offset = divmod(start, session.chunk_size)
+        if offset or len(data) != session.chunk_length(index):
+            raise ValueError(
+                f"Parte inválida: esperado início múltiplo de {session.chunk_size} "
+                f"e {session.chunk_length(index)} bytes"
+            )
+
+        if index == 0:
+            try:
+                csv_type = _check_first_chunk(data, session.file_name, session.encoding)
+            except ValueError as e:
+                session.error = str(e)
+                self._save(session)
+                raise
+
+        async with self._lock(upload_id):
+            if session.complete:
+                raise UploadAlreadyComplete("Upload já recebido por completo")
+            self._writing[upload_id] = self._writing.get(upload_id, 0) + 1
+
+        written = False
+        try:
+            await asyncio.to_thread(_write_at, self._data_path(upload_id), start, data)
+            written = True
+        finally:
+            async with self._lock(upload_id):
+                writing = self._writing.pop(upload_id, 1) - 1
+                if writing:
+                    self._writing[upload_id] = writing
+                if written:
+                    if index == 0:
+                        session.csv_type = csv_type
+                    if index not in session.received:
+                        session.received.append(index)
+                        session.received.sort()
+                    self._save(session)
+                # The last write to finish starts the parse
+                if session.complete and not writing:
+                    self._start_parse(session)
+        return session
+
+    def _start_parse(self, session: UploadSession) -> asyncio.Task:
+        task = self._parse_tasks.get(session.upload_id)
+        if task is None:
+            task = asyncio.create_task(self._parse(session))
+            self._parse_tasks[session.upload_id] = task
+        return task
+
+    async def _parse(self, session: UploadSession) -> Tuple[pd.DataFrame, str]:
+        path = self._data_path(session.upload_id)
+        open_csv = opener(lambda: open(path, "rb"), session.encoding)
+        return await asyncio.to_thread(CSVService.validate_and_parse_stream, open_csv, session.file_name)
+
+    async def parsed(self, upload_id: str) -> Tuple[UploadSession, pd.DataFrame, str]:
+        """
+        Wait for the parse of a complete upload (started when its last
+        chunk arrived, or now after a restart).
+
+        Raises:
+            UploadIncomplete: faltam partes.
+            ValueError: CSV inválido.
+        """
+        session = self.get(upload_id)
+        if session.error:
+            raise ValueError(session.error)
+        if not session.complete:
+            raise UploadIncomplete(session.missing)
+        if self._writing.get(upload_id):
+            raise UploadIncomplete([], "Ainda há partes sendo gravadas")
+        try:
+            df, csv_type = await self._start_parse(session)
+        finally:
+            self._parse_tasks.pop(upload_id, None)
+        return session, df, csv_type
+
+    async def discard(self, upload_id: str) -> None:
+        """
+        Forget a session and delete its files. The bookkeeping (shared with
+        the event loop's chunk writes and parse tasks) stays on the loop;
+        only the deletion runs in a thread.
+        """
+        self.get(upload_id)
+        task = self._parse_tasks.pop(upload_id, None)
+        if task is not None:
+            task.cancel()
+        self._sessions.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+        self._writing.pop(upload_id, None)
+        await asyncio.to_thread(shutil.rmtree, self._dir(upload_id), ignore_errors=True)
+
+    def _expired(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        cutoff = time.time() - settings.upload_session_ttl_seconds
+        return [
+            name
+            for name in os.listdir(self.root)
+            if _ID_RE.match(name) and os.path.getmtime(os.path.join(self.root, name)) < cutoff
+        ]
+
+    async def purge_expired(self) -> int:
+        """Remove sessions older than upload_session_ttl_seconds."""
+        expired = [name for name in await asyncio.to_thread(self._expired) if name not in self._parse_tasks]
+        for name in expired:
+            self._sessions.pop(name, None)
+            self._locks.pop(name, None)
+
+        def remove() -> None:
+            for name in expired:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+        if expired:
+            await asyncio.to_thread(remove)
+            logger.info(f"{len(expired)} sessão(ões) de upload expirada(s) removida(s)")
+        return len(expired)
+
+
+upload_sessions = UploadSessionStore()
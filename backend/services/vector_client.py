@@ -0,0 +1,96 @@
+"""Cliente do vector worker — proxy das coleções ChromaDB mantidas em outro processo."""
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from config import settings
+
+_DEFAULT_INCLUDE = ["metadatas", "documents"]
+
+_http: Optional[httpx.Client] = None
+_http_lock = threading.Lock()
+
+
+def _get_http_client() -> httpx.Client:
+    """Shared, thread-safe HTTP client (calls run in worker threads)."""
+    global _http
+    with _http_lock:
+        if _http is None:
+            url = settings.vector_service_url
+            if url.startswith("unix://"):
+                transport = httpx.HTTPTransport(uds=url[len("unix://"):])
+                _http = httpx.Client(
+                    transport=transport,
+                    base_url="http://vector-worker",
+                    timeout=settings.vector_service_timeout,
+                )
+            else:
+                _http = httpx.Client(base_url=url, timeout=settings.vector_service_timeout)
+    return _http
+
+
+class VectorServiceError(RuntimeError):
+    """The vector worker rejected a call or could not be reached."""
+
+
+class RemoteCollection:
+    """
+    Collection owned by the vector worker, exposing the subset of
+    chromadb's Collection API this app uses (upsert/query/get/delete/count)
+    with the same arguments and result shapes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _call(self, op: str, **kwargs) -> Any:
+        try:
+            response = _get_http_client().post(f"/collections/{self.name}/{op}", json=kwargs)
+        except httpx.HTTPError as e:
+            raise VectorServiceError(f"Vector worker indisponível ({settings.vector_service_url}): {e}") from e
+        if response.status_code != 200:
+            raise VectorServiceError(f"Vector worker: {op} falhou ({response.status_code}): {response.text}")
+        return response.json()
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[dict]] = None,
+    ) -> None:
+        self._call("upsert", ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[dict] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        return self._call(
+            "query",
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=include or _DEFAULT_INCLUDE + ["distances"],
+        )
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        return self._call(
+            "get", ids=ids, where=where, limit=limit, offset=offset, include=include or _DEFAULT_INCLUDE
+        )
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[dict] = None) -> None:
+        self._call("delete", ids=ids, where=where)
+
+    def count(self) -> int:
+        return self._call("count")
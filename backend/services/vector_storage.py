@@ -0,0 +1,370 @@
+"""Redução de dimensionalidade, quantização e re-ranking dos vetores de embedding."""
+import fcntl
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+from services.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+_DOC_ID_RE = re.compile(r"^file_(\d+)_record_(\d+)$")
+_INT8_MAX = 127.0
+
+
+# ---------------------------------------------------------------------------
+# Dimensionality reduction
+# ---------------------------------------------------------------------------
+
+def reduction_enabled() -> bool:
+    return settings.embedding_dimensions > 0
+
+
+def reranking_enabled() -> bool:
+    return reduction_enabled() and settings.vector_rerank_dtype != "none"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _pca_path(dim: int) -> str:
+    return os.path.join(settings.chroma_persist_dir, f"pca_{dim}.npz")
+
+
+_pca_cache: Dict[int, tuple] = {}
+
+
+def fit_pca(vectors: np.ndarray, dim: int) -> None:
+    """Fit a PCA projection on corpus vectors and store it next to the Chroma index."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    mean = vectors.mean(axis=0)
+    # Right singular vectors of the centred corpus are the principal axes.
+    _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+    components = vt[:dim].astype(np.float32)
+    os.makedirs(settings.chroma_persist_dir, exist_ok=True)
+    np.savez(_pca_path(dim), mean=mean, components=components)
+    _pca_cache.pop(dim, None)
+    logger.info(f"PCA ajustado: {vectors.shape[1]} -> {dim} dimensões ({len(vectors)} vetores)")
+
+
+def _load_pca(dim: int) -> tuple:
+    if dim not in _pca_cache:
+        path = _pca_path(dim)
+        if not os.path.exists(path):
+            raise RuntimeError(
+                f"vector_reduction=pca mas {path} não existe — rode "
+                f"`python -m benchmarks.bench_vector_storage --fit-pca {dim}` antes de indexar"
+            )
+        data = np.load(path)
+        _pca_cache[dim] = (data["mean"], data["components"])
+    return _pca_cache[dim]
+
+
+def reduce_vectors(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """
+    Map full model embeddings to the dimensionality stored in Chroma.
+
+    "truncate" keeps the leading components (gemini-embedding-001 is
+    Matryoshka-trained, so prefixes remain meaningful); "pca" projects on
+    axes fitted on the corpus. The result is L2-normalized either way.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not reduction_enabled():
+        return vectors
+
+    dim = settings.embedding_dimensions
+    if settings.vector_reduction == "pca":
+        mean, components = _load_pca(dim)
+        reduced = (vectors - mean) @ components.T
+    else:
+        reduced = vectors[:, :dim]
+    return _normalize(reduced)
+
+
+# ---------------------------------------------------------------------------
+# Quantization
+# ---------------------------------------------------------------------------
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode vectors for storage. Returns (codes, scales); scales is only
+    used by int8 (symmetric, one scale per vector).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / _INT8_MAX
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    return vectors, None
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    if scales is not None:
+        return codes.astype(np.float32) * scales[:, None]
+    return codes.astype(np.float32)
+
+
+# ---------------------------------------------------------------------------
+# Full-dimension sidecar store for re-ranking
+# ---------------------------------------------------------------------------
+
+_SHARD_RE = re.compile(r"^(\d+)-(\d+)-[0-9a-f]+\.npz$")
+# Shards merged at a time; a merged shard joins the next size tier
+_MERGE_FANOUT = 16
+
+
+def _tier(rows: int) -> int:
+    return int(math.log(max(rows, 1), _MERGE_FANOUT))
+
+
+def _overlay(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Merge shards oldest first; an id stored again keeps its newest vector."""
+    if len(parts) == 1:
+        return parts[0]
+    ids = np.concatenate([p["ids"] for p in parts])
+    with_scales = {"scales" in p for p in parts}
+    if with_scales == {False} and len({p["codes"].dtype for p in parts}) == 1:
+        codes, scales = np.concatenate([p["codes"] for p in parts]), None
+    elif with_scales == {True}:
+        codes = np.concatenate([p["codes"] for p in parts])
+        scales = np.concatenate([p["scales"] for p in parts])
+    else:
+        # vector_rerank_dtype changed between writes
+        codes = np.concatenate([dequantize(p["codes"], p.get("scales")) for p in parts])
+        scales = None
+    _, last = np.unique(ids[::-1], return_index=True)
+    keep = np.sort(len(ids) - 1 - last)
+    merged = {"ids": ids[keep], "codes": codes[keep]}
+    if scales is not None:
+        merged["scales"] = scales[keep]
+    return merged
+
+
+class FullVectorStore:
+    """
+    Full-dimension embeddings kept beside the reduced Chroma index,
+    quantized with `vector_rerank_dtype`. Only the few files owning the
+    current candidates are read at query time.
+
+    Each save appends an immutable shard to the file's directory
+    (file_<id>/<seq>-<rows>-<uuid>.npz), so concurrent writers never
+    touch the same path and a batch never rewrites what is already
+    stored. Shards are overlaid in sequence order on read; once the
+    newest shards hold _MERGE_FANOUT of one size tier they are merged
+    (under a lock shared by every process), so each vector is rewritten
+    a logarithmic number of times and the shard count stays small.
+
+    Cached files are reloaded when their shard list changes, so several
+    API processes sharing the directory see each other's writes; at most
+    `vector_rerank_cache_files` files stay cached.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._cache: "OrderedDict[int, tuple[tuple, Dict[str, np.ndarray]]]" = OrderedDict()
+        self._file_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, file_id: int) -> str:
+        return os.path.join(self.directory, f"file_{file_id}")
+
+    def _legacy_path(self, file_id: int) -> str:
+        # Single-file layout written before shards; read as the oldest shard
+        return os.path.join(self.directory, f"file_{file_id}.npz")
+
+    def _shards(self, file_id: int) -> List[str]:
+        try:
+            names = os.listdir(self._dir(file_id))
+        except FileNotFoundError:
+            return []
+        return sorted(n for n in names if _SHARD_RE.match(n))
+
+    def _paths(self, file_id: int) -> List[str]:
+        paths = [os.path.join(self._dir(file_id), n) for n in self._shards(file_id)]
+        if os.path.exists(self._legacy_path(file_id)):
+            paths.insert(0, self._legacy_path(file_id))
+        return paths
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, np.ndarray]:
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+
+    def _load_file(self, file_id: int) -> Optional[Dict[str, np.ndarray]]:
+        for _ in range(3):
+            paths = self._paths(file_id)
+            key = tuple(paths)
+            with self._lock:
+                if not paths:
+                    self._cache.pop(file_id, None)
+                    return None
+                cached = self._cache.get(file_id)
+                cache_lookup("full_vectors", cached is not None and cached[0] == key)
+                if cached is not None and cached[0] == key:
+                    self._cache.move_to_end(file_id)
+                    return cached[1]
+            try:
+                data = _overlay([self._read(path) for path in paths])
+            except FileNotFoundError:
+                # A merge removed a shard between listing and reading
+                continue
+            with self._lock:
+                self._cache[file_id] = (key, data)
+                self._cache.move_to_end(file_id)
+                while len(self._cache) > max(settings.vector_rerank_cache_files, 1):
+                    self._cache.popitem(last=False)
+            return data
+        return None
+
+    def _write_shard(self, file_id: int, seq: int, arrays: Dict[str, np.ndarray]) -> None:
+        name = f"{seq:020d}-{len(arrays['ids'])}-{uuid.uuid4().hex[:12]}.npz"
+        path = os.path.join(self._dir(file_id), name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def save(self, file_id: int, ids: List[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store (or replace) the full vectors of some documents of a file."""
+        codes, scales = quantize(np.asarray(vectors, dtype=np.float32), settings.vector_rerank_dtype)
+        arrays = {"ids": np.asarray(ids), "codes": codes}
+        if scales is not None:
+            arrays["scales"] = scales
+
+        os.makedirs(self._dir(file_id), exist_ok=True)
+        self._write_shard(file_id, time.time_ns(), arrays)
+        self._merge(file_id)
+
+    @contextmanager
+    def _file_lock(self, file_id: int):
+        """Exclusive per file_id, within this process and across processes."""
+        with self._lock:
+            lock = self._file_locks.setdefault(file_id, threading.Lock())
+        with lock:
+            with open(os.path.join(self._dir(file_id), ".lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _merge(self, file_id: int) -> None:
+        """
+        Merge trailing runs of small shards. Only the newest shards are
+        merged together, so the overlay order is preserved; the merged
+        shard takes the run's first sequence number.
+        """
+        with self._file_lock(file_id):
+            while True:
+                names = self._shards(file_id)
+                tiers = [_tier(int(_SHARD_RE.match(n).group(2))) for n in names]
+                for tier in sorted(set(tiers)):
+                    # Newest shards of this tier or smaller, merged once the
+                    # tier itself has _MERGE_FANOUT of them
+                    run = next((i for i, t in enumerate(reversed(tiers)) if t > tier), len(tiers))
+                    if tiers[len(tiers) - run:].count(tier) >= _MERGE_FANOUT:
+                        break
+                else:
+                    return
+                members = [os.path.join(self._dir(file_id), n) for n in names[-run:]]
+                merged = _overlay([self._read(path) for path in members])
+                self._write_shard(file_id, int(_SHARD_RE.match(names[-run]).group(1)), merged)
+                # Oldest first: until the last one is gone, the leftovers
+                # overlay the merged shard with the same values
+                for path in members:
+                    os.remove(path)
+
+    def get(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Return {doc id: float32 vector} for the ids that have a stored vector."""
+        by_file: Dict[int, List[str]] = {}
+        for doc_id in ids:
+            match = _DOC_ID_RE.match(doc_id)
+            if match:
+                by_file.setdefault(int(match.group(1)), []).append(doc_id)
+
+        found = {}
+        for file_id, file_ids in by_file.items():
+            data = self._load_file(file_id)
+            if data is None:
+                continue
+            positions = {doc_id: i for i, doc_id in enumerate(data["ids"])}
+            rows = [positions[d] for d in file_ids if d in positions]
+            if not rows:
+                continue
+            scales = data["scales"][rows] if "scales" in data else None
+            vectors = dequantize(data["codes"][rows], scales)
+            for doc_id, vector in zip((d for d in file_ids if d in positions), vectors):
+                found[doc_id] = vector
+        return found
+
+    def delete(self, file_id: int) -> None:
+        with self._lock:
+            self._cache.pop(file_id, None)
+        if os.path.exists(self._legacy_path(file_id)):
+            os.remove(self._legacy_path(file_id))
+        shutil.rmtree(self._dir(file_id), ignore_errors=True)
+
+
+_full_vectors: Optional[FullVectorStore] = None
+
+
+def get_full_vector_store() -> FullVectorStore:
+    global _full_vectors
+    if _full_vectors is None:
+        _full_vectors = FullVectorStore(os.path.join(settings.chroma_persist_dir, "full_vectors"))
+    return _full_vectors
+
+
+def doc_id(metadata: dict) -> str:
+    """Chroma id of a record document, rebuilt from its metadata."""
+    return f"file_{metadata['file_id']}_record_{metadata['record_index']}"
+
+
+def full_vectors(docs: list) -> Optional[np.ndarray]:
+    """Full-dimension vectors aligned with `docs`, or None unless every doc has one."""
+    ids = [doc_id(doc.metadata) if "file_id" in doc.metadata else "" for doc in docs]
+    vectors = get_full_vector_store().get([i for i in ids if i])
+    if not ids or any(i not in vectors for i in ids):
+        return None
+    return np.stack([vectors[i] for i in ids])
+
+
+def rerank(query_vector: Sequence[float], docs: list) -> list:
+    """
+    Re-order candidates by cosine similarity between the full-dimension query
+    and document vectors. Candidates without a stored vector keep their
+    original relative order, after the re-scored ones.
+    """
+    ids = [doc_id(doc.metadata) if "file_id" in doc.metadata else "" for doc in docs]
+    vectors = get_full_vector_store().get([i for i in ids if i])
+    if not vectors:
+        return docs
+
+    query = _normalize(np.asarray([query_vector], dtype=np.float32))[0]
+    scored, unscored = [], []
+    for doc, id_ in zip(docs, ids):
+        vector = vectors.get(id_)
+        if vector is None:
+            unscored.append(doc)
+            continue
+        norm = np.linalg.norm(vector) or 1.0
+        scored.append((float(vector @ query) / norm, doc))
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [doc for _, doc in scored] + unscored
@@ -0,0 +1,35 @@
+"""Tests for the admin token required by every /api/admin route."""
+import sys
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import settings
+from routes import admin
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(admin.router)
+    return TestClient(app)
+
+
+def test_admin_routes_disabled_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "")
+    response = _client().get("/api/admin/admission", headers={"X-Admin-Token": ""})
+    assert response.status_code == 403
+
+
+def test_admin_routes_require_matching_token(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    client = _client()
+
+    assert client.get("/api/admin/admission").status_code == 401
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Token": "errado"}).status_code == 401
+    response = client.get("/api/admin/admission", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert "chat" in response.json()["endpoints"]
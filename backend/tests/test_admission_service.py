@@ -0,0 +1,96 @@
+"""Tests for per-endpoint admission control."""
+import asyncio
+import sys
+import os
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+from fastapi import Request
+
+from config import settings
+from services.admission_service import AdmissionController, AdmissionRejected, client_key
+
+
+def _controller(**kwargs):
+    params = {"name": "test", "max_concurrent": 1, "max_queue": 10, "queue_timeout": 1.0}
+    params.update(kwargs)
+    return AdmissionController(**params)
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        controller = _controller(max_queue=1)
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("c")
+        controller.release()
+        await waiter
+        controller.release()
+        return controller, excinfo.value
+
+    controller, rejection = asyncio.run(scenario())
+    assert rejection.retry_after >= 1
+    assert controller.rejected == 1
+    assert controller.active == 0
+    assert controller.queue_depth == 0
+
+
+def test_waiting_clients_are_served_round_robin():
+    async def scenario():
+        controller = _controller()
+        order = []
+        await controller.acquire("holder")
+
+        async def request(key, tag):
+            async with controller.slot(key):
+                order.append(tag)
+
+        tasks = [asyncio.create_task(request("burst", f"burst{i}")) for i in range(3)]
+        tasks.append(asyncio.create_task(request("other", "other")))
+        await asyncio.sleep(0)
+        controller.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    assert order == ["burst0", "other", "burst1", "burst2"]
+
+
+def test_wait_timeout_leaves_queue_consistent():
+    async def scenario():
+        controller = _controller(queue_timeout=0.01)
+        await controller.acquire("a")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("b")
+        controller.release()
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.timed_out == 1
+    assert controller.queue_depth == 0
+    assert controller.active == 0
+    snapshot = controller.snapshot()
+    assert snapshot["queued_clients"] == 0
+
+
+def _request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+
+def test_client_key_ignores_forwarded_for_from_untrusted_peers(monkeypatch):
+    monkeypatch.setattr(settings, "trusted_proxies", "")
+    assert client_key(_request("203.0.113.7", "1.2.3.4")) == "203.0.113.7"
+
+    monkeypatch.setattr(settings, "trusted_proxies", "10.0.0.0/8, 192.168.1.1")
+    assert client_key(_request("203.0.113.7", "1.2.3.4")) == "203.0.113.7"
+    # Behind trusted proxies the nearest untrusted hop is the client; a
+    # spoofed left-most value does not win
+    assert client_key(_request("10.0.0.2", "6.6.6.6, 198.51.100.9, 192.168.1.1")) == "198.51.100.9"
+    assert client_key(_request("10.0.0.2", "198.51.100.9")) == "198.51.100.9"
+    assert client_key(_request("10.0.0.2")) == "10.0.0.2"
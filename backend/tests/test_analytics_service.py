@@ -0,0 +1,195 @@
+"""Tests for the analytics sidecar (Parquet + DuckDB); skipped without duckdb."""
+import asyncio
+import sys
+import os
+
+import pandas as pd
+import pytest
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+duckdb = pytest.importorskip("duckdb")
+
+from benchmarks.generators import generate, visnir
+from config import settings
+from services import analytics_service, retrieval_service
+from services.csv_service import CSVService
+from services.retrieval_service import LookupCatalog, aggregate_statistics
+
+
+@pytest.fixture
+def sidecar(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_dir", str(tmp_path))
+    yield tmp_path
+    analytics_service.close()
+
+
+def _parsed(kind: str, size: int, name: str):
+    data = visnir(size, step_nm=50) if kind == "visnir" else generate(kind, size)
+    return CSVService.validate_and_parse_csv(data, name)
+
+
+def test_write_keeps_types_and_ids(sidecar):
+    df, csv_type = _parsed("pxrf", 40_000, "p.csv")
+    analytics_service.write_file(df, 7, csv_type)
+
+    assert analytics_service.stored_files() == {7: "pxrf"}
+    assert not [p for p in os.listdir(sidecar / "pxrf") if p.endswith(".tmp")]
+    described = duckdb.sql(f"DESCRIBE SELECT * FROM '{sidecar / 'pxrf' / 'file_7.parquet'}'").fetchall()
+    types = {name: kind for name, kind, *_ in described}
+    assert types["_file_id"] == types["_record_index"] == "INTEGER"
+    assert types["Si"] == "DOUBLE" and types["amostra"] == "VARCHAR"
+
+    [summary] = analytics_service.summary()
+    assert summary == {"csv_type": "pxrf", "files": 1, "rows": len(df), "columns": len(df.columns)}
+
+
+def test_column_stats_match_pandas(sidecar):
+    first, _ = _parsed("pxrf", 40_000, "a.csv")
+    second, _ = _parsed("pxrf", 20_000, "b.csv")
+    analytics_service.write_file(first, 1, "pxrf")
+    analytics_service.write_file(second, 2, "pxrf")
+    both = pd.concat([first, second], ignore_index=True)
+
+    [overall] = analytics_service.column_stats("Si")
+    assert overall["count"] == both["Si"].count()
+    assert overall["mean"] == pytest.approx(both["Si"].mean())
+    assert overall["stddev"] == pytest.approx(both["Si"].std())
+
+    per_file = analytics_service.column_stats("Si", group_by="file")
+    assert [r["file_id"] for r in per_file] == [1, 2]
+    assert per_file[1]["max"] == pytest.approx(second["Si"].max())
+
+    per_sample = analytics_service.column_stats("Si", group_by="amostra")
+    expected = both.groupby("amostra")["Si"].mean()
+    # Samples without any Si value come back with a null mean (NaN in pandas)
+    assert {r["amostra"]: r["mean"] for r in per_sample if r["count"]} == pytest.approx(expected.dropna().to_dict())
+
+    only_second = analytics_service.column_stats("Si", file_ids=[2])
+    assert only_second[0]["count"] == second["Si"].count()
+
+    with pytest.raises(analytics_service.UnknownColumn):
+        analytics_service.column_stats("Unobtainium")
+    with pytest.raises(ValueError):
+        analytics_service.column_stats("Si", group_by="mes")
+
+
+def test_mean_spectra(sidecar):
+    df, _ = _parsed("visnir", 60_000, "v.csv")
+    analytics_service.write_file(df, 3, "visnir")
+
+    [spectrum] = analytics_service.mean_spectra()
+    assert spectrum["file_id"] == 3 and spectrum["samples"] == len(df)
+    wavelengths = [c for c in df.columns if c != "amostra"]
+    assert spectrum["wavelengths"] == [float(w) for w in wavelengths]
+    assert spectrum["mean"] == pytest.approx(df[wavelengths].mean().tolist())
+
+
+def test_samples_and_columns_need_every_file(sidecar):
+    nix, _ = _parsed("nix", 20_000, "n.csv")
+    generic, _ = _parsed("generic", 20_000, "g.csv")
+    analytics_service.write_file(nix, 1, "nix")
+    analytics_service.write_file(generic, 2, "generic")
+
+    overview = analytics_service.samples_and_columns([1, 2])
+    assert overview["samples"] == sorted(set(nix["amostra"]) | set(generic["amostra"]))
+    assert overview["columns"] == sorted(set(nix.columns) | set(generic.columns))
+    # File 3 is in PostgreSQL but not in the sidecar: fall back to JSONB
+    assert analytics_service.samples_and_columns([1, 2, 3]) is None
+
+
+def test_disabled_without_dir(monkeypatch):
+    monkeypatch.setattr(settings, "analytics_dir", "")
+    assert not analytics_service.available()
+    assert analytics_service.samples_and_columns([1]) is None
+    with pytest.raises(analytics_service.AnalyticsUnavailable):
+        analytics_service.summary()
+
+
+def test_aggregate_statistics_context(sidecar, monkeypatch):
+    df, _ = _parsed("pxrf", 20_000, "p.csv")
+    analytics_service.write_file(df, 5, "pxrf")
+    catalog = LookupCatalog(list(df["amostra"]), list(df.columns))
+
+    async def get_catalog():
+        return catalog
+
+    monkeypatch.setattr(retrieval_service, "_get_catalog", get_catalog)
+
+    context = asyncio.run(aggregate_statistics("Qual a média de Si por amostra?"))
+    lines = context.splitlines()
+    assert len(lines) == df.dropna(subset=["Si"])["amostra"].nunique()
+    assert lines[0].startswith(f"Si (pxrf), amostra {sorted(df['amostra'])[0]}: média ")
+
+    # DateTime is a known column but has no numeric values
+    assert asyncio.run(aggregate_statistics("média de DateTime")) is None
+    assert asyncio.run(aggregate_statistics("quantas amostras existem?")) is None
+
+
+def test_compaction_and_removal(sidecar, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_compact_files", 3)
+    frames = {i: _parsed("nix", 3000 * i, f"n{i}.csv")[0] for i in range(1, 6)}
+
+    async def upload(ids):
+        await analytics_service.store_saved([(frames[i], i, "nix") for i in ids])
+
+    asyncio.run(upload([1, 2]))
+    assert sorted(os.listdir(sidecar / "nix")) == [".lock", "file_1.parquet", "file_2.parquet"]
+    before = analytics_service.column_stats("L*", group_by="file")
+
+    # The third loose file triggers a compaction into one part
+    asyncio.run(upload([3]))
+    [part] = [p for p in os.listdir(sidecar / "nix") if p.endswith(".parquet")]
+    assert part.startswith("part_")
+    assert analytics_service.stored_files() == {1: "nix", 2: "nix", 3: "nix"}
+    assert analytics_service.column_stats("L*", group_by="file")[:2] == before
+    assert analytics_service.column_stats("L*", file_ids=[2])[0]["count"] == len(frames[2])
+
+    # A loose file left behind by an interrupted compaction is not counted twice
+    analytics_service.write_file(frames[1], 1, "nix")
+    assert analytics_service.summary()[0]["rows"] == sum(len(frames[i]) for i in (1, 2, 3))
+
+    assert analytics_service.remove_files([2]) == 1
+    assert sorted(analytics_service.stored_files()) == [1, 3]
+    assert [r["file_id"] for r in analytics_service.column_stats("L*", group_by="file")] == [1, 3]
+
+
+def test_interrupted_compaction_and_removal_never_double_count(sidecar, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_compact_files", 2)
+    frames = {i: _parsed("nix", 3000 * i, f"n{i}.csv")[0] for i in range(1, 4)}
+    total = sum(len(f) for f in frames.values())
+    for i in (1, 2):
+        analytics_service.write_file(frames[i], i, "nix")
+    assert analytics_service.compact("nix") == 2
+    analytics_service.write_file(frames[3], 3, "nix")
+
+    def crash(path):
+        raise OSError("processo morreu")
+
+    # Dies after the merged part is copied and published, before any source is removed
+    with monkeypatch.context() as patched:
+        patched.setattr(os, "remove", crash)
+        with pytest.raises(OSError):
+            analytics_service.compact("nix", force=True)
+    assert len([p for p in os.listdir(sidecar / "nix") if p.startswith("part_")]) == 2
+    assert analytics_service.summary()[0]["rows"] == total
+    assert analytics_service.stored_files() == {1: "nix", 2: "nix", 3: "nix"}
+
+    # The next writer under the lock clears what the crash left behind
+    assert analytics_service.compact("nix") == 0
+    [part] = [p for p in os.listdir(sidecar / "nix") if p.endswith(".parquet")]
+    assert part.startswith("part_")
+
+    # Dies after the part rewritten without file 2 is published, before the old one is removed
+    def crash_on_part(path):
+        if os.path.basename(path) == part:
+            raise OSError("processo morreu")
+        os.unlink(path)
+
+    with monkeypatch.context() as patched:
+        patched.setattr(os, "remove", crash_on_part)
+        with pytest.raises(OSError):
+            analytics_service.remove_files([2])
+    assert analytics_service.summary()[0]["rows"] == total - len(frames[2])
+    assert sorted(analytics_service.stored_files()) == [1, 3]
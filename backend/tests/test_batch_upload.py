@@ -0,0 +1,108 @@
+"""Tests for batch uploads: zip expansion and parsing in the pool (no database)."""
+import asyncio
+import gzip
+import io
+import sys
+import os
+import zipfile
+
+import pytest
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.generators import generate
+from config import settings
+from services import batch_upload_service
+from services.batch_upload_service import BatchFile, expand_uploads, parse_all
+
+NIX = generate("nix", 4000)
+PXRF = generate("pxrf", 4000)
+
+
+def _zip(members) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members:
+            if name.endswith("/"):
+                archive.writestr(zipfile.ZipInfo(name), b"")
+            else:
+                archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    monkeypatch.setattr(settings, "batch_parse_workers", 1)
+    batch_upload_service.shutdown_parse_pool()
+    yield
+    batch_upload_service.shutdown_parse_pool()
+
+
+def test_expand_zip_and_plain_parts(thread_pool):
+    archive = _zip([
+        ("campanha/", b""),
+        ("campanha/nix_01.csv", NIX),
+        ("campanha/pxrf_01.csv.gz", gzip.compress(PXRF)),
+        ("campanha/notas.txt", b"texto"),
+        ("campanha/.DS_Store", b"\x00"),
+        ("__MACOSX/campanha/._nix_01.csv", b"\x00"),
+    ])
+    files = expand_uploads([("campanha.zip", archive), ("avulso.csv", NIX), ("foto.png", b"\x89PNG")])
+
+    assert [f.file_name for f in files] == [
+        "campanha.zip/campanha/nix_01.csv",
+        "campanha.zip/campanha/pxrf_01.csv.gz",
+        "campanha.zip/campanha/notas.txt",
+        "avulso.csv",
+        "foto.png",
+    ]
+    assert [f.error is None for f in files] == [True, True, False, True, False]
+    # Members stay in the archive until parsed
+    assert files[0].content == b"" and files[0].member == "campanha/nix_01.csv"
+    assert files[0].archive == files[1].archive and os.path.exists(files[0].archive)
+    assert files[1].stored_name == "pxrf_01.csv"
+    asyncio.run(parse_all(files[:1]))
+    assert files[0].csv_type == "nix"
+    assert not os.path.exists(files[1].archive)
+
+
+def test_expand_limits(monkeypatch):
+    with pytest.raises(ValueError, match="zip inválido"):
+        expand_uploads([("quebrado.zip", b"PK\x03\x04lixo")])
+
+    monkeypatch.setattr(settings, "batch_max_files", 3)
+    archive = _zip([(f"s{i}.csv", NIX) for i in range(5)])
+    with pytest.raises(ValueError, match="máximo de 3"):
+        expand_uploads([("lote.zip", archive)])
+
+    # Declared member sizes count against the batch total before anything is read
+    monkeypatch.setattr(settings, "batch_max_files", 500)
+    monkeypatch.setattr(settings, "batch_max_decompressed_mb", 1)
+    bomb = _zip([(f"s{i}.csv", b"a,b\n" + b"1,2\n" * 150_000) for i in range(2)])
+    with pytest.raises(ValueError, match="1MB descomprimidos"):
+        expand_uploads([("lote.zip", bomb)])
+
+
+def test_parse_all_fills_each_file(thread_pool):
+    files = [
+        BatchFile("nix_01.csv", NIX),
+        BatchFile("lote.zip/pxrf_01.csv.gz", gzip.compress(PXRF)),
+        BatchFile("vazio.csv", b""),
+        BatchFile("foto.png", error="Apenas arquivos CSV são permitidos"),
+    ]
+    # A member whose data does not match its CRC
+    corrupt = bytearray(_zip([("pxrf_02.csv", PXRF)]))
+    start = corrupt.index(PXRF[:50])
+    corrupt[start + 100:start + 104] = b"XXXX"
+    files += expand_uploads([("ruim.zip", bytes(corrupt))])
+    asyncio.run(parse_all(files))
+
+    nix, pxrf, empty, skipped, broken = files
+    assert nix.csv_type == "nix" and len(nix.df) > 0
+    assert pxrf.csv_type == "pxrf" and len(pxrf.df) > 0
+    assert empty.df is None and empty.error
+    assert skipped.df is None and skipped.error == "Apenas arquivos CSV são permitidos"
+    assert broken.df is None and "CRC" in broken.error
+    # Raw bytes are dropped once parsed
+    assert all(f.content == b"" for f in files)
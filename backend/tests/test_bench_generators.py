@@ -0,0 +1,42 @@
+"""The synthetic benchmark files must keep matching what the CSV parsers expect."""
+import sys
+import os
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks import generators
+from benchmarks.bench_ingestion import compare
+from services.csv_service import CSVService
+
+
+def test_each_kind_is_detected_and_parsed():
+    files = {
+        "visnir": generators.visnir(5_000, step_nm=50),
+        "nix": generators.generate("nix", 5_000),
+        "pxrf": generators.generate("pxrf", 5_000),
+        "generic": generators.generate("generic", 5_000),
+    }
+    for kind, data in files.items():
+        df, csv_type = CSVService.validate_and_parse_csv(data, f"{kind}.csv")
+        assert csv_type == kind
+        assert "amostra" in df.columns
+        assert len(df) > 0
+
+
+def test_decimal_commas_and_lod_become_numbers():
+    df, _ = CSVService.validate_and_parse_csv(generators.generate("pxrf", 20_000), "pxrf.csv")
+    assert df["Fe"].dtype.kind == "f"
+    assert (df.select_dtypes("number") == 0).any().any()  # "< LOD" -> 0
+
+
+def test_generation_is_deterministic():
+    assert generators.generate("generic", 2_000) == generators.generate("generic", 2_000)
+
+
+def test_compare_flags_throughput_and_memory_regressions():
+    baseline = {"results": [{"kind": "nix", "size_mb": 1.0, "stage": "parse", "rows_per_sec": 1000, "peak_mb": 10}]}
+    ok = [{"kind": "nix", "size_mb": 1.0, "stage": "parse", "rows_per_sec": 900, "peak_mb": 11}]
+    slow = [{"kind": "nix", "size_mb": 1.0, "stage": "parse", "rows_per_sec": 500, "peak_mb": 20}]
+    assert compare(ok, baseline, 0.2) == []
+    assert len(compare(slow, baseline, 0.2)) == 2
@@ -0,0 +1,121 @@
+"""Tests for chat_batch: deduplication, shared retrieval and bounded LLM concurrency."""
+import asyncio
+import sys
+import os
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import settings
+from services import chat_service
+from services.admission_service import AdmissionController
+from services.chat_service import chat_batch
+
+
+class FakeLLM:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def ainvoke(self, messages):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            question = messages[-1].content
+            if "falha" in question:
+                raise RuntimeError("LLM indisponível")
+            return SimpleNamespace(content=f"resposta: {question}")
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = {"embed": [], "overview": 0, "vector": []}
+    llm = FakeLLM()
+
+    async def embed_queries(texts):
+        calls["embed"].append(list(texts))
+        return [[float(i)] for i in range(len(texts))]
+
+    async def get_dataset_overview():
+        calls["overview"] += 1
+        await asyncio.sleep(0.01)
+        return {"total_files": 1, "total_records": 2, "samples": ["A1", "B2"], "columns": ["Fe"], "files": []}
+
+    async def aggregate_statistics(question):
+        return None
+
+    async def lookup_exact_records(question):
+        return None
+
+    async def vector_search(question, k=10, query_vector=None):
+        calls["vector"].append((question, query_vector))
+        return f"registro para {question}"
+
+    @asynccontextmanager
+    async def llm_call():
+        yield llm
+
+    monkeypatch.setattr(chat_service, "embed_queries", embed_queries)
+    monkeypatch.setattr(chat_service, "get_dataset_overview", get_dataset_overview)
+    monkeypatch.setattr(chat_service, "aggregate_statistics", aggregate_statistics)
+    monkeypatch.setattr(chat_service, "lookup_exact_records", lookup_exact_records)
+    monkeypatch.setattr(chat_service, "vector_search", vector_search)
+    monkeypatch.setattr(chat_service.model_clients, "llm_call", llm_call)
+    monkeypatch.setattr(settings, "chat_batch_concurrency", 2)
+    calls["llm"] = llm
+    return calls
+
+
+def test_batch_shares_retrieval_and_keeps_order(calls):
+    questions = [
+        "Quantas amostras existem?",
+        "Qual o Fe da amostra A1?",
+        "quantas  amostras existem?",
+        "Liste todas as amostras",
+        "Qual o Fe da amostra B2?",
+    ]
+    results = asyncio.run(chat_batch(questions))
+
+    assert [r["question"] for r in results] == questions
+    assert results[0]["answer"] == results[2]["answer"] == "resposta: Quantas amostras existem?"
+    assert results[4]["answer"] == "resposta: Qual o Fe da amostra B2?"
+    assert all(r["error"] is None for r in results)
+
+    # One embedding call for the four distinct questions, reused by the searches
+    assert calls["embed"] == [[questions[0], questions[1], questions[3], questions[4]]]
+    assert sorted(v for _, v in calls["vector"]) == [[0.0], [1.0], [2.0], [3.0]]
+    # Two aggregation questions, a single overview query
+    assert calls["overview"] == 1
+    assert calls["llm"].peak == 2
+
+
+def test_batch_reports_errors_per_question(calls, monkeypatch):
+    async def broken_embed(texts):
+        raise RuntimeError("quota")
+
+    monkeypatch.setattr(chat_service, "embed_queries", broken_embed)
+    results = asyncio.run(chat_batch(["Qual o Fe da amostra A1?", "falha na amostra B2?"]))
+
+    assert results[0]["answer"] == "resposta: Qual o Fe da amostra A1?"
+    assert results[1] == {"question": "falha na amostra B2?", "answer": None, "error": "LLM indisponível"}
+    # Without batched vectors each search embeds its own question
+    assert [v for _, v in calls["vector"]] == [None, None]
+
+
+def test_batch_questions_take_admission_slots(calls):
+    admission = AdmissionController("chat", max_concurrent=1, max_queue=8, queue_timeout=5)
+    questions = [f"Qual o Fe da amostra A{i}?" for i in range(5)]
+
+    results = asyncio.run(chat_batch(questions, slot=lambda: admission.slot("10.0.0.1")))
+
+    assert all(r["error"] is None for r in results)
+    # One slot per distinct question, never more than chat_max_concurrent at once
+    assert admission.admitted == 5 and admission.active == 0
+    assert calls["llm"].peak == 1
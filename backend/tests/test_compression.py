@@ -0,0 +1,85 @@
+"""Tests for the shared JSON layer and the compression/ETag middleware."""
+import math
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from middleware.compression import CompressionMiddleware, choose_encoding
+from services.serialization import OrjsonResponse, frame_to_json, loads, sse_event
+
+
+def _client() -> TestClient:
+    app = FastAPI(default_response_class=OrjsonResponse)
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/big")
+    def big():
+        return {"rows": [{"amostra": f"S{i}", "valor": np.float64(i)} for i in range(500)]}
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((f"data: {i}\n\n" * 200 for i in range(3)), media_type="text/event-stream")
+
+    return TestClient(app)
+
+
+def test_frame_to_json_matches_former_row_encoding():
+    df = pd.DataFrame({
+        "amostra": ["A", "B"],
+        "ph": [5.5, math.nan],
+        "n": [1, 2],
+        "data": pd.to_datetime(["2024-03-01", None]),
+        "k": pd.array([3, None], dtype="Int64"),
+    })
+    docs = [loads(d) for d in frame_to_json(df)]
+    assert docs[0] == {"amostra": "A", "ph": 5.5, "n": 1, "data": "2024-03-01 00:00:00", "k": 3}
+    assert docs[1] == {"amostra": "B", "ph": None, "n": 2, "data": None, "k": None}
+
+
+def test_sse_event_format():
+    assert sse_event({"token": "ção"}, event_id=3) == 'id: 3\ndata: {"token":"ção"}\n\n'
+    assert sse_event({}, event="done") == "event: done\ndata: {}\n\n"
+
+
+def test_encoding_negotiation():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("") is None
+
+
+def test_large_json_is_gzipped_and_small_is_not():
+    client = _client()
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json()["rows"][1] == {"amostra": "S1", "valor": 1.0}
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_etag_revalidation_returns_304():
+    client = _client()
+    first = client.get("/big")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    again = client.get("/big", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+def test_streaming_responses_pass_through():
+    response = _client().get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "etag" not in response.headers
+    assert response.text.count("data:") == 600
@@ -0,0 +1,89 @@
+"""Tests for compressed CSV uploads (gzip; zstd only when installed)."""
+import asyncio
+import gzip
+import io
+import sys
+import os
+
+import pandas as pd
+import pytest
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.generators import generate, visnir
+from config import settings
+from services import decompression
+from services.csv_service import CSVService
+from services.decompression import csv_name, detect_encoding, opener, peek
+from services.upload_session_service import UploadSessionStore
+
+
+def _parse_gz(data: bytes, name: str):
+    compressed = gzip.compress(data)
+    return CSVService.validate_and_parse_stream(opener(lambda: io.BytesIO(compressed), "gzip"), name)
+
+
+def test_detect_encoding_and_name():
+    assert detect_encoding("solo.csv") is None
+    assert detect_encoding("Solo.CSV.GZ") == "gzip"
+    assert detect_encoding("solo.csv", "gzip") == "gzip"
+    assert detect_encoding("solo.csv.gz", "identity") is None
+    assert csv_name("Solo.csv.gz") == "Solo.csv"
+    with pytest.raises(ValueError):
+        detect_encoding("solo.csv", "br")
+
+
+def test_zstd_requires_package(monkeypatch):
+    monkeypatch.setattr(decompression, "zstandard", None)
+    with pytest.raises(ValueError, match="zstandard"):
+        detect_encoding("solo.csv.zst")
+
+
+@pytest.mark.parametrize("kind", ["visnir", "nix", "pxrf", "generic"])
+def test_gzip_parses_like_plain(kind):
+    # Visnir with 50 nm steps: the full-resolution parse alone takes seconds
+    data = visnir(60_000, step_nm=50) if kind == "visnir" else generate(kind, 60_000)
+    expected, expected_type = CSVService.validate_and_parse_csv(data, f"{kind}.csv")
+    df, csv_type = _parse_gz(data, f"{kind}.csv")
+    assert csv_type == expected_type == kind
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_latin1_falls_back_while_streaming():
+    data = "amostra;descrição\nA;ácido\nB;básico\n".encode("latin-1")
+    df, _ = _parse_gz(data, "l1.csv")
+    assert list(df.columns) == ["amostra", "descrição"]
+
+
+def test_decompressed_size_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "max_decompressed_size_mb", 1)
+    bomb = b"amostra,valor\n" + b"A,1\n" * 600_000
+    with pytest.raises(ValueError, match="descomprimido excede"):
+        _parse_gz(bomb, "bomb.csv")
+
+
+def test_peek_partial_gzip():
+    data = visnir(300_000, step_nm=50)
+    compressed = gzip.compress(data)
+    head = peek(compressed[:4096], "gzip")
+    assert data.startswith(head) and head.startswith(b"Wavelength")
+
+
+def test_chunked_gzip_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_chunk_size_kb", 4)
+    data = generate("pxrf", 100_000)
+    compressed = gzip.compress(data)
+    store = UploadSessionStore(str(tmp_path))
+
+    async def run():
+        session = await store.create("campo.csv.gz", len(compressed))
+        size = session.chunk_size
+        for start in range(0, len(compressed), size):
+            await store.write_chunk(session.upload_id, start, len(compressed), compressed[start:start + size])
+        assert session.csv_type == "pxrf"
+        return await store.parsed(session.upload_id)
+
+    session, df, csv_type = asyncio.run(run())
+    assert session.file_name == "campo.csv" and session.encoding == "gzip"
+    pd.testing.assert_frame_equal(df, CSVService.validate_and_parse_csv(data, "campo.csv")[0])
@@ -0,0 +1,40 @@
+"""Tests for the per-type embedding document shaping."""
+import sys
+import os
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.document_service import record_to_text, shape_document
+
+VISNIR_ROW = {"amostra": "A1", **{str(wl): 0.1 + wl / 10000 for wl in range(400, 2501)}}
+
+PXRF_ROW = {"amostra": "P1", "Fe": 12000.5, "Si": 0, "Fe Err": 30.1, "Ag": 1.2, "DateTime": "2024-01-01"}
+
+
+def test_visnir_document_is_much_shorter():
+    full = record_to_text(VISNIR_ROW, "visnir.csv")
+    shaped = shape_document(VISNIR_ROW, "visnir", "visnir.csv")
+    assert len(shaped) * 10 < len(full)
+
+
+def test_visnir_document_has_summaries():
+    shaped = shape_document(VISNIR_ROW, "visnir", "visnir.csv")
+    assert "amostra: A1" in shaped
+    assert "espectro a cada" in shaped
+    assert "vermelho" in shaped
+    assert "máximo" in shaped
+
+
+def test_pxrf_document_keeps_key_elements_only():
+    shaped = shape_document(PXRF_ROW, "pxrf", "pxrf.csv")
+    assert "amostra: P1" in shaped
+    assert "Fe: 12000.5" in shaped
+    assert "Si" not in shaped  # zero reading
+    assert "Fe Err" not in shaped
+    assert "DateTime" not in shaped
+
+
+def test_generic_document_is_unchanged():
+    row = {"amostra": "G1", "pH": 5.4}
+    assert shape_document(row, "generic", "g.csv") == record_to_text(row, "g.csv")
@@ -0,0 +1,52 @@
+"""Offline LLM/embedding stand-ins used by the chat load test."""
+import asyncio
+import sys
+import os
+
+import numpy as np
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.load_chat import percentile
+from config import settings
+from services import embedding_service
+from services.model_clients import model_clients
+from services.fake_models import FakeChatModel, FakeEmbeddings
+
+
+def test_fake_chat_streams_configured_number_of_tokens():
+    llm = FakeChatModel(first_token_ms=0, tokens_per_sec=0, answer_tokens=5)
+
+    async def collect():
+        return [chunk.content async for chunk in llm.astream([HumanMessage(content="oi")])]
+
+    tokens = asyncio.run(collect())
+    assert len(tokens) == 5
+    assert "".join(tokens) == llm.invoke([HumanMessage(content="oi")]).content
+
+
+def test_fake_embeddings_are_deterministic_unit_vectors():
+    embeddings = FakeEmbeddings(dimensions=16, latency_ms=0)
+    a, b = embeddings.embed_documents(["amostra 1", "amostra 2"])
+    assert len(a) == 16
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert embeddings.embed_query("amostra 1") == a
+    assert a != b
+
+
+def test_providers_switch_to_fakes(monkeypatch):
+    monkeypatch.setattr(settings, "llm_provider", "fake")
+    monkeypatch.setattr(settings, "embedding_provider", "fake")
+    assert isinstance(model_clients.llm(), FakeChatModel)
+    assert isinstance(embedding_service.get_embeddings_model(), FakeEmbeddings)
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
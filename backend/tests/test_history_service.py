@@ -0,0 +1,96 @@
+"""Tests for the rolling conversation history."""
+import asyncio
+import sys
+import os
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.history_service import ConversationHistory, estimate_tokens
+
+
+def _history(**kwargs):
+    params = {"recent_turns": 2, "max_tokens": 1000, "summary_max_tokens": 100}
+    params.update(kwargs)
+    return ConversationHistory(**params)
+
+
+async def _fake_summarize(summary, turns):
+    return (summary + " " + " ".join(q for q, _ in turns)).strip()
+
+
+# ---------------------------------------------------------------------------
+# window
+# ---------------------------------------------------------------------------
+
+def test_window_keeps_recent_turns_verbatim():
+    history = _history()
+    for i in range(3):
+        history.append(f"q{i}", f"a{i}")
+    summary, turns = history.window()
+    assert summary == ""
+    assert turns == [("q1", "a1"), ("q2", "a2")]
+
+
+def test_window_respects_token_budget():
+    history = _history(max_tokens=50)
+    history.append("q0", "x" * 4000)
+    history.append("q1", "y" * 4000)
+    _, turns = history.window()
+    total = sum(estimate_tokens(q) + estimate_tokens(a) for q, a in turns)
+    assert total <= 50
+    assert turns[-1][0] == "q1"
+    assert turns[-1][1].endswith("[...]")
+
+
+# ---------------------------------------------------------------------------
+# compaction
+# ---------------------------------------------------------------------------
+
+def test_compaction_folds_older_turns():
+    async def scenario():
+        history = _history()
+        for i in range(4):
+            history.append(f"q{i}", f"a{i}")
+        history.schedule_compaction(_fake_summarize)
+        await history._task
+        return history
+
+    history = asyncio.run(scenario())
+    assert history.summary == "q0 q1"
+    assert history.turns == [("q2", "a2"), ("q3", "a3")]
+    summary, turns = history.window()
+    assert summary == "q0 q1"
+    assert len(turns) == 2
+
+
+def test_compaction_keeps_turns_added_meanwhile():
+    async def scenario():
+        history = _history()
+        for i in range(3):
+            history.append(f"q{i}", f"a{i}")
+        history.schedule_compaction(_fake_summarize)
+        history.append("q3", "a3")
+        await history._task
+        return history
+
+    history = asyncio.run(scenario())
+    assert history.summary == "q0"
+    assert [q for q, _ in history.turns] == ["q1", "q2", "q3"]
+
+
+def test_failed_compaction_keeps_turns():
+    async def failing(summary, turns):
+        raise RuntimeError("quota")
+
+    async def scenario():
+        history = _history()
+        for i in range(3):
+            history.append(f"q{i}", f"a{i}")
+        history.schedule_compaction(failing)
+        await history._task
+        return history
+
+    history = asyncio.run(scenario())
+    assert history.summary == ""
+    assert len(history.turns) == 3
@@ -0,0 +1,59 @@
+"""Tests for stage spans and the correlation id middleware."""
+import sys
+import os
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from middleware.correlation import CorrelationIdMiddleware
+from services.metrics import correlation_id, stage
+
+
+def _stage_count(pipeline: str, name: str) -> float:
+    return REGISTRY.get_sample_value("portaltcc_stage_seconds_count", {"pipeline": pipeline, "stage": name}) or 0.0
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CorrelationIdMiddleware)
+
+    @app.get("/work")
+    def work():
+        with stage("test", "work"):
+            pass
+        return {"correlation_id": correlation_id.get()}
+
+    return app
+
+
+def test_request_id_is_propagated_and_echoed():
+    client = TestClient(_app())
+    response = client.get("/work", headers={"X-Request-ID": "req-42"})
+    assert response.json() == {"correlation_id": "req-42"}
+    assert response.headers["x-request-id"] == "req-42"
+
+
+def test_request_id_is_generated_when_missing():
+    response = TestClient(_app()).get("/work")
+    assert len(response.headers["x-request-id"]) == 16
+
+
+def test_stage_spans_are_logged_per_request(caplog):
+    with caplog.at_level(logging.INFO, logger="services.metrics"):
+        TestClient(_app()).get("/work", headers={"X-Request-ID": "req-7"})
+    assert any("GET /work 200" in r.message and "test.work=" in r.message for r in caplog.records)
+
+
+def test_stage_decorator_observes_each_call():
+    @stage("test", "decorated")
+    def noop():
+        return 1
+
+    before = _stage_count("test", "decorated")
+    assert noop() == 1 and noop() == 1
+    assert _stage_count("test", "decorated") == before + 2
@@ -0,0 +1,81 @@
+"""Tests for the long-lived model client pool."""
+import asyncio
+import sys
+import os
+
+import pytest
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import settings
+from services import model_clients
+from services.model_clients import ModelClientManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(settings, "llm_provider", "fake")
+    monkeypatch.setattr(settings, "embedding_provider", "fake")
+    return ModelClientManager()
+
+
+def test_clients_are_reused_per_model_and_temperature(manager):
+    llm = manager.llm()
+    assert manager.llm() is llm
+    assert manager.llm(temperature=0.9) is not llm
+    assert manager.embeddings() is manager.embeddings()
+
+
+def test_client_is_recreated_only_after_transport_errors(manager):
+    async def fail(error):
+        async with manager.llm_call():
+            raise error
+
+    llm = manager.llm()
+    # Rate limits, safety blocks... come back over a working channel
+    with pytest.raises(RuntimeError):
+        asyncio.run(fail(RuntimeError("429 Resource exhausted")))
+    assert manager.llm() is llm
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(fail(ConnectionError("canal caiu")))
+    assert manager.llm() is not llm
+
+
+def test_discarded_clients_are_closed_after_grace(manager, monkeypatch):
+    closed = []
+
+    async def close_client(client):
+        closed.append(client)
+
+    monkeypatch.setattr(model_clients, "_close_client", close_client)
+    monkeypatch.setattr(model_clients, "_MAX_RETIRED", 2)
+
+    async def scenario():
+        monkeypatch.setattr(model_clients, "_RETIRE_GRACE_SECONDS", 60.0)
+        old = [manager.llm(temperature=t) for t in (0.1, 0.2, 0.3)]
+        for client in old:
+            manager.discard(client)
+        await asyncio.sleep(0)
+        # Over the cap: the oldest is closed without waiting for the grace period
+        assert closed == old[:1]
+
+        monkeypatch.setattr(model_clients, "_RETIRE_GRACE_SECONDS", 0.0)
+        recent = manager.llm()
+        manager.discard(recent)
+        await asyncio.sleep(0.01)
+        assert closed == [old[0], old[1], recent] and manager._retired == [old[2]]
+
+    asyncio.run(scenario())
+
+
+def test_close_drops_every_client(manager):
+    async def lifecycle():
+        await manager.warm_up()
+        first = manager.llm()
+        await manager.close()
+        return first
+
+    first = asyncio.run(lifecycle())
+    assert manager.llm() is not first
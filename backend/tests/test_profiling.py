@@ -0,0 +1,69 @@
+"""Tests for the opt-in request profiling middleware."""
+import sys
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import settings
+from middleware.correlation import CorrelationIdMiddleware
+from middleware.profiling import ProfilingMiddleware
+from services import profiling
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "profile_token", "")
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "profile_max_files", 50)
+    return tmp_path
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(CorrelationIdMiddleware)
+
+    @app.post("/items/{item_id}")
+    async def work(item_id: int):
+        profiling.annotate(csv_type="nix")
+        return {"sum": sum(range(10_000))}
+
+    return TestClient(app)
+
+
+def test_disabled_by_default_writes_nothing(profile_dir):
+    _client().post("/items/1", headers={"X-Profile": "anything"})
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_token_header_profiles_request_with_metadata(profile_dir, monkeypatch):
+    monkeypatch.setattr(settings, "profile_token", "s3cret")
+    client = _client()
+    client.post("/items/1", headers={"X-Profile": "wrong"})
+    assert profiling.list_profiles() == []
+
+    client.post("/items/1", content=b"{}", headers={"X-Profile": "s3cret", "X-Request-ID": "req-9"})
+    [meta] = profiling.list_profiles()
+    assert meta["route"] == "/items/{item_id}"
+    assert meta["status"] == 200
+    assert meta["request_id"] == "req-9"
+    assert meta["request_bytes"] == 2
+    assert meta["csv_type"] == "nix"
+    assert profiling.profile_path(meta["file"]) is not None
+    assert profiling.profile_path("../secret.prof") is None
+
+
+def test_retention_keeps_only_newest_profiles(profile_dir, monkeypatch):
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "profile_max_files", 2)
+    client = _client()
+    for _ in range(4):
+        client.post("/items/1")
+    assert len(profiling.list_profiles()) == 2
+    assert len(list(profile_dir.iterdir())) == 4
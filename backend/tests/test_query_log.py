@@ -0,0 +1,60 @@
+"""Tests for the slow-query log (no database needed)."""
+import sys
+import os
+
+import pytest
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import settings
+from db import query_log
+
+
+@pytest.fixture
+def slow_log(monkeypatch):
+    monkeypatch.setattr(query_log, "_slow", query_log.OrderedDict())
+    monkeypatch.setattr(settings, "slow_query_ms", 100.0)
+    monkeypatch.setattr(settings, "slow_query_explain_after", 2)
+    monkeypatch.setattr(settings, "slow_query_explain_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "slow_query_explain_interval_seconds", 600.0)
+    scheduled = []
+    monkeypatch.setattr(query_log, "_schedule_explain", lambda entry, statement, params: scheduled.append(statement))
+    return scheduled
+
+
+def test_fingerprint_ignores_whitespace_and_in_list_length():
+    a = query_log.fingerprint("SELECT * FROM records\n  WHERE id IN ($1, $2)")
+    b = query_log.fingerprint("SELECT * FROM records WHERE id IN ($1,$2,$3)")
+    assert a == b
+    assert a != query_log.fingerprint("SELECT * FROM files WHERE id IN ($1)")
+
+
+def test_params_shape_hides_values():
+    assert query_log.params_shape((1, "abc", [1, 2])) == "(int, str, list[2])"
+    assert query_log.params_shape({"ids": [1, 2, 3], "name": "x" * 100}) == "{ids: list[3], name: str(100)}"
+    assert query_log.params_shape([(1, "a"), (2, "b")], executemany=True) == "2x (int, str)"
+
+
+def test_fast_queries_are_not_logged(slow_log):
+    query_log.record("SELECT 1", (), 0.01)
+    assert query_log.slow_queries() == []
+
+
+def test_repeatedly_slow_select_is_explained_once_per_interval(slow_log, caplog):
+    statement = "SELECT data FROM records WHERE file_id = $1"
+    for _ in range(3):
+        query_log.record(statement, (7,), 0.5)
+    [entry] = query_log.slow_queries()
+    assert entry["count"] == 3
+    assert entry["max_ms"] == pytest.approx(500)
+    assert "parâmetros: (int)" in caplog.text
+    # Slow twice before the first capture; the interval blocks the third.
+    assert slow_log == [statement]
+
+
+def test_writes_are_never_explained(slow_log):
+    for statement in ("DELETE FROM files WHERE id = $1", "WITH d AS (DELETE FROM files RETURNING id) SELECT * FROM d"):
+        for _ in range(3):
+            query_log.record(statement, (1,), 1.0)
+    assert slow_log == []
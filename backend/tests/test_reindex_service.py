@@ -0,0 +1,92 @@
+"""Tests for the reindex planning, checkpoint watermark and parallel workers."""
+import asyncio
+import sys
+import os
+
+import numpy as np
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import settings
+from services import embedding_service, reindex_service, vector_storage
+from services.reindex_service import FilePlan, _Watermark, _to_ranges
+
+
+def test_to_ranges_merges_consecutive_indices():
+    assert _to_ranges([6, 0, 1, 2, 5, 9]) == [[0, 2], [5, 6], [9, 9]]
+
+
+def test_remaining_skips_done_indices():
+    plan = FilePlan(file_id=1, file_name="a.csv", csv_type="generic", pending=[[0, 9], [20, 29]], done_through=4)
+    assert plan.remaining == 15
+
+
+def test_watermark_waits_for_earlier_batches():
+    plan = FilePlan(file_id=1, file_name="a.csv", csv_type="generic", pending=[[0, 29]])
+    watermark = _Watermark(plan)
+    first, second, third = watermark.add(9), watermark.add(19), watermark.add(29)
+
+    assert not watermark.done(second)
+    assert plan.done_through == -1
+    assert watermark.done(first)
+    assert plan.done_through == 19
+    watermark.done(third)
+    assert plan.done_through == 29
+
+
+class _Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def partitions(self, size):
+        for start in range(0, len(self.rows), size):
+            yield self.rows[start:start + size]
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def stream(self, query, params):
+        indices = range(params["first"], params["last"] + 1)
+        return _Rows([(i, {"amostra": f"S{i}", "Fe": float(i)}) for i in indices])
+
+
+class _Collection:
+    def upsert(self, **kwargs):
+        pass
+
+
+def test_parallel_reindex_keeps_every_full_vector(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "chroma_persist_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "embedding_dimensions", 8)
+    monkeypatch.setattr(settings, "vector_rerank_dtype", "float32")
+    monkeypatch.setattr(vector_storage, "_full_vectors", None)
+    plan = FilePlan(file_id=7, file_name="a.csv", csv_type="generic", pending=[[0, 399]])
+
+    async def build_plan(full=False):
+        return [plan], []
+
+    async def backfill_record_index():
+        return 0
+
+    async def embed_texts(texts):
+        await asyncio.sleep(0.001)
+        return np.random.default_rng(len(texts)).standard_normal((len(texts), 32)).tolist()
+
+    monkeypatch.setattr(reindex_service, "build_plan", build_plan)
+    monkeypatch.setattr(reindex_service, "backfill_record_index", backfill_record_index)
+    monkeypatch.setattr(reindex_service, "AsyncSessionLocal", _Session)
+    monkeypatch.setattr(embedding_service, "embed_texts", embed_texts)
+    monkeypatch.setattr(embedding_service, "get_collection", lambda csv_type=None: _Collection())
+
+    # Batches of 10 (embedded as one API batch each) spread over 4 workers
+    report = asyncio.run(reindex_service.reindex(full=True, concurrency=4, batch_size=10))
+
+    assert report["embedded"] == 400 and report["failed"] == 0
+    ids = [f"file_7_record_{i}" for i in range(400)]
+    assert len(vector_storage.get_full_vector_store().get(ids)) == 400
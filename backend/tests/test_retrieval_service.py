@@ -0,0 +1,164 @@
+"""Tests for the hybrid retriever's sample and column matching."""
+import asyncio
+import sys
+import os
+
+import numpy as np
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.documents import Document
+
+from config import settings
+from services import retrieval_service, vector_storage
+from services.retrieval_service import (
+    LookupCatalog,
+    _format_exact_rows,
+    _mmr_select,
+    _search,
+    find_column_mentions,
+    find_sample_mentions,
+    route_question,
+)
+
+CATALOG = LookupCatalog(
+    samples=["ABC123", "P-07", "Ponto 3", "A1"],
+    columns=["amostra", "Fe", "Si", "As", "K", "450", "Fe Error", "Latitude"],
+)
+
+
+# ---------------------------------------------------------------------------
+# find_sample_mentions
+# ---------------------------------------------------------------------------
+
+def test_sample_id_found():
+    assert find_sample_mentions("Qual é o valor de Fe para a amostra ABC123?", CATALOG) == ["ABC123"]
+
+def test_sample_id_case_insensitive():
+    assert find_sample_mentions("mostre a amostra abc123", CATALOG) == ["ABC123"]
+
+def test_hyphenated_and_multiword_samples():
+    found = find_sample_mentions("Compare P-07 com Ponto 3.", CATALOG)
+    assert found == ["P-07", "Ponto 3"]
+
+def test_no_sample_mentioned():
+    assert find_sample_mentions("O que é o Portal TCC?", CATALOG) == []
+
+
+# ---------------------------------------------------------------------------
+# find_column_mentions
+# ---------------------------------------------------------------------------
+
+def test_element_symbol_found():
+    assert find_column_mentions("Qual é o valor de Fe para a amostra ABC123?", CATALOG) == ["Fe"]
+
+def test_short_names_are_case_sensitive():
+    # "as" is a Portuguese article, not arsenic
+    assert "As" not in find_column_mentions("Liste as amostras com Si alto", CATALOG)
+
+def test_wavelength_with_unit():
+    assert find_column_mentions("Qual a reflectância a 450nm da amostra A1?", CATALOG) == ["450"]
+
+def test_long_and_multiword_columns():
+    found = find_column_mentions("Mostre latitude e Fe Error de A1", CATALOG)
+    assert "Latitude" in found
+    assert "Fe Error" in found
+
+
+# ---------------------------------------------------------------------------
+# _format_exact_rows
+# ---------------------------------------------------------------------------
+
+def test_format_projects_mentioned_columns():
+    rows = [{"file_name": "pxrf.csv", "data": {"amostra": "ABC123", "Fe": 1.5, "Si": 2.0}}]
+    text = _format_exact_rows(rows, ["Fe"])
+    assert "ABC123" in text
+    assert "Fe: 1.5" in text
+    assert "Si" not in text
+
+
+# ---------------------------------------------------------------------------
+# route_question
+# ---------------------------------------------------------------------------
+
+def test_element_question_routes_to_pxrf():
+    assert route_question("Qual é o valor de Fe e Si para a amostra ABC123?") == "pxrf"
+
+def test_colour_question_routes_to_nix():
+    assert route_question("Qual a cor Munsell da amostra A1?") == "nix"
+
+def test_reflectance_question_routes_to_visnir():
+    assert route_question("Qual a reflectância a 450nm da amostra X?") == "visnir"
+
+def test_sentence_initial_as_does_not_route():
+    assert route_question("As amostras foram coletadas onde?") is None
+
+
+# ---------------------------------------------------------------------------
+# _mmr_select
+# ---------------------------------------------------------------------------
+
+def _doc(file_id, name):
+    return Document(page_content=name, metadata={"file_id": file_id})
+
+
+def test_mmr_caps_documents_per_file(monkeypatch):
+    monkeypatch.setattr(settings, "retrieval_max_per_file", 2)
+    monkeypatch.setattr(settings, "retrieval_score_margin", 2.0)
+    docs = [_doc(1, "a"), _doc(1, "b"), _doc(1, "c"), _doc(2, "d")]
+    embeddings = [[1.0, 0.0], [1.0, 0.01], [1.0, 0.02], [0.7, 0.7]]
+    selected = _mmr_select([1.0, 0.0], docs, embeddings, k=4)
+    assert [d.page_content for d in selected] == ["a", "b", "d"]
+
+
+def test_mmr_adaptive_k_drops_weak_matches(monkeypatch):
+    monkeypatch.setattr(settings, "retrieval_min_k", 1)
+    monkeypatch.setattr(settings, "retrieval_score_margin", 0.1)
+    docs = [_doc(1, "strong"), _doc(2, "weak")]
+    selected = _mmr_select([1.0, 0.0], docs, [[1.0, 0.0], [0.0, 1.0]], k=2)
+    assert [d.page_content for d in selected] == ["strong"]
+
+
+def test_rerank_recovers_neighbour_lost_in_reduced_space(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "retrieval_mode", "mmr")
+    monkeypatch.setattr(settings, "retrieval_fetch_k", 6)
+    monkeypatch.setattr(settings, "retrieval_score_margin", 2.0)
+    monkeypatch.setattr(settings, "embedding_dimensions", 2)
+    monkeypatch.setattr(settings, "vector_reduction", "truncate")
+    monkeypatch.setattr(settings, "vector_rerank_dtype", "float32")
+    monkeypatch.setattr(settings, "vector_rerank_candidates", 6)
+
+    rng = np.random.default_rng(0)
+    # Five decoys right on the query in the first two dimensions, and the
+    # true neighbour, which only wins once the other dimensions count
+    full = np.zeros((6, 8), dtype=np.float32)
+    full[:5, 0] = 1.0
+    full[:5, 1] = rng.uniform(0, 0.05, 5)
+    full[5, :3] = [0.8, 0.6, 1.0]
+    query = [1.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+    store = vector_storage.FullVectorStore(str(tmp_path))
+    store.save(1, [f"file_1_record_{i}" for i in range(6)], full)
+    monkeypatch.setattr(vector_storage, "_full_vectors", store)
+
+    reduced = vector_storage.reduce_vectors(full)
+    search = vector_storage.reduce_vectors([query])[0]
+    candidates = sorted(
+        (
+            (
+                Document(page_content=f"r{i}", metadata={"file_id": 1, "record_index": i}),
+                float(np.linalg.norm(reduced[i] - search)),
+                reduced[i].tolist(),
+            )
+            for i in range(6)
+        ),
+        key=lambda triple: triple[1],
+    )
+    assert candidates[-1][0].page_content == "r5"
+
+    monkeypatch.setattr(retrieval_service, "get_search_collections", lambda csv_type: [(None, None)])
+    monkeypatch.setattr(retrieval_service, "_query_collection", lambda *args: candidates)
+
+    docs = asyncio.run(_search("pergunta", 2, None, query))
+    assert docs[0].page_content == "r5"
@@ -0,0 +1,29 @@
+"""Startup path: migrations are well-formed and AI dependencies stay lazy."""
+import subprocess
+import sys
+import os
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from db.migrations import MIGRATIONS, SCHEMA_VERSION
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+
+def test_migration_versions_are_consecutive():
+    assert [m.version for m in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+    assert SCHEMA_VERSION == MIGRATIONS[-1].version
+    assert all(m.statements or m.indexes for m in MIGRATIONS)
+    # Records indexes are built per chunk, never inside a migration transaction
+    assert not any("CREATE INDEX" in s and "records" in s for m in MIGRATIONS for s in m.statements)
+
+
+def test_importing_main_does_not_load_ai_dependencies():
+    # Fresh interpreter: the test session itself has imported them already.
+    code = (
+        "import sys, main; "
+        "print(','.join(m for m in ('chromadb', 'langchain_core', 'langchain_google_genai') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
@@ -0,0 +1,110 @@
+"""Tests for the stats CLI queries (fake pool, no database needed)."""
+import asyncio
+import sys
+import os
+import time
+from datetime import datetime, timezone
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.stats_service import StatsFilter, collect_stats, report_to_csv
+
+NOW = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+
+
+class FakePool:
+    """Answers by SQL keyword after a fixed delay, recording every query."""
+
+    def __init__(self, delay=0.05, timescaledb=False):
+        self.delay = delay
+        self.timescaledb = timescaledb
+        self.queries = []
+
+    async def _run(self, sql, params):
+        self.queries.append((" ".join(sql.split()), params))
+        await asyncio.sleep(self.delay)
+
+    async def fetchrow(self, sql, *params):
+        await self._run(sql, params)
+        return {"timescaledb": self.timescaledb, "has_records": True}
+
+    async def fetchval(self, sql, *params):
+        await self._run(sql, params)
+        if sql.startswith("EXPLAIN"):
+            return '[{"Plan": {"Plan Rows": 42}}]'
+        return 7
+
+    async def fetch(self, sql, *params):
+        await self._run(sql, params)
+        if "unnest(columns_list)" in sql or "jsonb_object_keys" in sql:
+            return [{"key": "amostra"}, {"key": "ph"}]
+        if "FROM files" in sql:
+            return [{"id": 1, "file_name": "a.csv", "csv_type": "pxrf", "rows_count": 7,
+                     "columns_list": ["amostra", "ph"], "uploaded_at": NOW}]
+        if "GROUP BY bucket" in sql:
+            return [{"bucket": NOW, "count": 3}]
+        return [{"file_id": 1, "data": '{"amostra": "A", "ph": 5.5}', "uploaded_at": NOW}]
+
+
+def _sql(pool, fragment):
+    return [q for q in pool.queries if fragment in q[0]]
+
+
+def test_filter_numbers_parameters_from_offset():
+    flt = StatsFilter(file_ids=[3, 4], since=NOW)
+    where, params = flt.where(first_param=2)
+    assert where == "file_id = ANY($2::int[]) AND uploaded_at >= $3"
+    assert params == [[3, 4], NOW]
+    assert StatsFilter().where() == ("TRUE", [])
+
+
+def test_sections_run_concurrently():
+    pool = FakePool(delay=0.1)
+    started = time.perf_counter()
+    report = asyncio.run(collect_stats(pool))
+    elapsed = time.perf_counter() - started
+
+    # catalog, then the six sections together: ~0.2 s, not ~0.7 s
+    assert elapsed < 0.45
+    assert report["files"] == 7
+    assert report["records"] == {"value": 7, "method": "exact"}
+    assert report["columns"]["method"] == "files.columns_list"
+    assert report["sample"][0]["data"] == {"amostra": "A", "ph": 5.5}
+    # No full scan for the column list by default
+    assert not _sql(pool, "jsonb_object_keys")
+
+
+def test_approximate_count_uses_catalog():
+    pool = FakePool(delay=0)
+    report = asyncio.run(collect_stats(pool, approximate=True))
+    assert report["records"]["method"] == "reltuples"
+
+    pool = FakePool(delay=0, timescaledb=True)
+    report = asyncio.run(collect_stats(pool, approximate=True))
+    assert report["records"]["method"] == "approximate_row_count"
+    assert _sql(pool, "time_bucket")
+
+    report = asyncio.run(collect_stats(FakePool(delay=0), StatsFilter(file_ids=[1]), approximate=True))
+    assert report["records"]["method"] == "files.rows_count"
+
+    report = asyncio.run(collect_stats(FakePool(delay=0), StatsFilter(since=NOW), approximate=True))
+    assert report["records"] == {"value": 42, "method": "planner_estimate"}
+
+
+def test_sampled_buckets_are_scaled():
+    pool = FakePool(delay=0)
+    report = asyncio.run(collect_stats(pool, StatsFilter(file_ids=[1]), sample_percent=10, scan_keys=True))
+    assert report["buckets"]["value"] == [{"bucket": NOW, "count": 30}]
+    sql, params = _sql(pool, "GROUP BY bucket")[0]
+    assert "TABLESAMPLE SYSTEM ($2::real)" in sql and "file_id = ANY($3::int[])" in sql
+    assert params == ("1 hour", 10, [1])
+    assert report["columns"]["method"] == "sampled_scan"
+
+
+def test_report_to_csv():
+    report = asyncio.run(collect_stats(FakePool(delay=0)))
+    lines = report_to_csv(report).splitlines()
+    assert lines[0] == "generated_at,section,key,value"
+    assert any(line.endswith(",records,exact,7") for line in lines)
+    assert any(",bucket,2024-03-01T12:00:00+00:00,3" in line for line in lines)
@@ -0,0 +1,98 @@
+"""Tests for the resumable token stream buffer."""
+import asyncio
+import sys
+import os
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+from config import settings
+from services.stream_service import StreamGone, get_stream, start_stream
+
+
+async def _tokens(values, delay=0.0, closed=None):
+    try:
+        for value in values:
+            if delay:
+                await asyncio.sleep(delay)
+            yield value
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+async def _drain(stream, offset=0):
+    received = []
+    while True:
+        tokens, done = await stream.read(offset, timeout=1.0)
+        received.extend(tokens)
+        offset += len(tokens)
+        if done:
+            return received
+
+
+def test_stream_replays_from_offset():
+    async def scenario():
+        stream = start_stream("s1", _tokens(["a", "b", "c", "d"]))
+        full = await _drain(stream)
+        resumed = await _drain(stream, offset=2)
+        return stream, full, resumed
+
+    stream, full, resumed = asyncio.run(scenario())
+    assert full == ["a", "b", "c", "d"]
+    assert resumed == ["c", "d"]
+    assert stream.error is None
+    assert stream.stats["tokens"] == 4
+    assert get_stream(stream.stream_id) is stream
+
+
+def test_evicted_offset_raises(monkeypatch):
+    monkeypatch.setattr(settings, "stream_buffer_tokens", 2)
+
+    async def scenario():
+        stream = start_stream("s1", _tokens(["a", "b", "c", "d"]))
+        await _drain(stream, offset=2)
+        with pytest.raises(StreamGone):
+            await stream.read(0, timeout=0.01)
+        return stream
+
+    stream = asyncio.run(scenario())
+    assert stream.first_offset == 2
+
+
+def test_abandoned_stream_is_cancelled(monkeypatch):
+    monkeypatch.setattr(settings, "stream_resume_grace_seconds", 0.01)
+    closed = []
+
+    async def scenario():
+        stream = start_stream("s1", _tokens(["a"] * 100, delay=0.01, closed=closed))
+        stream.attach()
+        await stream.read(0, timeout=1.0)
+        stream.detach()
+        await asyncio.sleep(0.1)
+        return stream
+
+    stream = asyncio.run(scenario())
+    assert stream.done
+    assert stream.error == "Geração cancelada"
+    assert stream.offset < 100
+    assert closed == [True]
+
+
+def test_reattach_within_grace_keeps_generating(monkeypatch):
+    monkeypatch.setattr(settings, "stream_resume_grace_seconds", 0.05)
+
+    async def scenario():
+        stream = start_stream("s1", _tokens(["a"] * 10, delay=0.01))
+        stream.attach()
+        stream.detach()
+        stream.attach()
+        received = await _drain(stream)
+        stream.detach()
+        return stream, received
+
+    stream, received = asyncio.run(scenario())
+    assert stream.error is None
+    assert len(received) == 10
@@ -0,0 +1,183 @@
+"""Tests for chunked, resumable uploads (local disk only, no database)."""
+import asyncio
+import sys
+import os
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import settings
+from routes import upload
+from services import upload_session_service
+from services.upload_session_service import (
+    UploadAlreadyComplete,
+    UploadIncomplete,
+    UploadNotFound,
+    UploadSessionStore,
+    UploadTooLarge,
+    parse_content_range,
+)
+
+CSV = ("amostra,ph,argila\n" + "".join(f"S{i:04d},{5 + i % 3}.5,{i % 40}\n" for i in range(400))).encode()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_chunk_size_kb", 1)
+    return UploadSessionStore(str(tmp_path))
+
+
+def _chunks(data: bytes, size: int):
+    return [(start, data[start:start + size]) for start in range(0, len(data), size)]
+
+
+def test_parse_content_range():
+    assert parse_content_range("bytes 0-1023/5000") == (0, 1023, 5000)
+    for bad in (None, "bytes 10-5/100", "bytes 0-100/100", "items 0-1/2"):
+        with pytest.raises(ValueError):
+            parse_content_range(bad)
+
+
+def test_chunks_in_any_order_then_parse(store):
+    async def run():
+        session = await store.create("solo.csv", len(CSV))
+        chunks = _chunks(CSV, session.chunk_size)
+        assert session.total_chunks == len(chunks) > 4
+
+        # Parallel PUTs, last chunk first
+        await asyncio.gather(*(
+            store.write_chunk(session.upload_id, start, len(CSV), data) for start, data in reversed(chunks)
+        ))
+        assert session.complete and session.csv_type == "generic"
+        return await store.parsed(session.upload_id)
+
+    session, df, csv_type = asyncio.run(run())
+    assert csv_type == "generic"
+    assert len(df) == 400 and list(df.columns) == ["amostra", "ph", "argila"]
+    with open(os.path.join(store.root, session.upload_id, "data"), "rb") as f:
+        assert f.read() == CSV
+
+
+def test_no_writes_reach_a_complete_upload(store, monkeypatch):
+    write_at = upload_session_service._write_at
+
+    def slow_first_chunk(path, offset, data):
+        if offset == 0:
+            time.sleep(0.1)
+        write_at(path, offset, data)
+
+    async def run():
+        session = await store.create("solo.csv", len(CSV))
+        chunks = _chunks(CSV, session.chunk_size)
+        for start, data in chunks[:-1]:
+            await store.write_chunk(session.upload_id, start, len(CSV), data)
+        monkeypatch.setattr(upload_session_service, "_write_at", slow_first_chunk)
+
+        # A retry of chunk 0 still being written when the last chunk lands
+        first = asyncio.create_task(store.write_chunk(session.upload_id, 0, len(CSV), chunks[0][1]))
+        await asyncio.sleep(0.01)
+        last_start, last_data = chunks[-1]
+        await store.write_chunk(session.upload_id, last_start, len(CSV), last_data)
+        assert session.complete and session.upload_id not in store._parse_tasks
+        await first
+        assert session.upload_id in store._parse_tasks
+
+        with pytest.raises(UploadAlreadyComplete):
+            await store.write_chunk(session.upload_id, 0, len(CSV), chunks[0][1])
+        return await store.parsed(session.upload_id)
+
+    session, df, _ = asyncio.run(run())
+    assert len(df) == 400
+
+
+def test_chunk_route_limits_the_body_to_the_content_range(store, monkeypatch):
+    monkeypatch.setattr(upload, "upload_sessions", store)
+    app = FastAPI()
+    app.include_router(upload.router)
+    client = TestClient(app)
+
+    session = client.post("/api/uploads", json={"file_name": "solo.csv", "size": len(CSV)}).json()
+    url = f"/api/uploads/{session['upload_id']}"
+    chunk = session["chunk_size"]
+
+    def put(start, data, declared=None):
+        end = start + (declared or len(data)) - 1
+        return client.put(url, content=data, headers={"Content-Range": f"bytes {start}-{end}/{len(CSV)}"})
+
+    assert put(0, CSV[:chunk + 100], declared=chunk).status_code == 413
+    assert put(0, CSV[:chunk - 1], declared=chunk).status_code == 400
+    for start in range(0, len(CSV), chunk):
+        assert put(start, CSV[start:start + chunk]).status_code == 200
+    assert put(0, CSV[:chunk]).status_code == 409
+
+
+def test_resume_after_restart(store):
+    async def first_attempt():
+        session = await store.create("solo.csv", len(CSV))
+        for start, data in _chunks(CSV, session.chunk_size)[:3]:
+            await store.write_chunk(session.upload_id, start, len(CSV), data)
+        with pytest.raises(UploadIncomplete) as exc:
+            await store.parsed(session.upload_id)
+        return session.upload_id, exc.value.missing
+
+    upload_id, missing = asyncio.run(first_attempt())
+    assert missing[0] == 3
+
+    # A new store (API restarted) picks the session up from meta.json
+    restarted = UploadSessionStore(store.root)
+    session = restarted.get(upload_id)
+    assert session.received == [0, 1, 2]
+
+    async def resume():
+        for start, data in _chunks(CSV, session.chunk_size)[3:]:
+            await restarted.write_chunk(upload_id, start, len(CSV), data)
+        return await restarted.parsed(upload_id)
+
+    _, df, _ = asyncio.run(resume())
+    assert len(df) == 400
+
+    asyncio.run(restarted.discard(upload_id))
+    assert not os.path.exists(os.path.join(store.root, upload_id))
+    with pytest.raises(UploadNotFound):
+        restarted.get(upload_id)
+
+
+def test_first_chunk_is_validated(store):
+    binary = b"\x89PNG\r\n\x1a\n\x00\x00" + bytes(2000)
+    session = asyncio.run(store.create("foto.csv", len(binary)))
+    with pytest.raises(ValueError, match="texto"):
+        asyncio.run(store.write_chunk(session.upload_id, 0, len(binary), binary[:session.chunk_size]))
+    # The session stays failed: later chunks are refused right away
+    with pytest.raises(ValueError, match="texto"):
+        asyncio.run(store.write_chunk(session.upload_id, session.chunk_size, len(binary), binary[session.chunk_size:]))
+
+
+def test_rejects_bad_sessions_and_chunks(store):
+    with pytest.raises(ValueError):
+        asyncio.run(store.create("dados.xlsx", 100))
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(store.create("grande.csv", settings.max_file_size_bytes + 1))
+    with pytest.raises(UploadNotFound):
+        store.get("../../etc")
+
+    session = asyncio.run(store.create("solo.csv", len(CSV)))
+    with pytest.raises(ValueError, match="Parte inválida"):
+        asyncio.run(store.write_chunk(session.upload_id, 10, len(CSV), CSV[10:10 + session.chunk_size]))
+    with pytest.raises(ValueError, match="Tamanho total"):
+        asyncio.run(store.write_chunk(session.upload_id, 0, len(CSV) + 1, CSV[:session.chunk_size]))
+
+
+def test_expired_sessions_are_purged(store):
+    old = asyncio.run(store.create("velho.csv", len(CSV)))
+    past = os.path.getmtime(os.path.join(store.root, old.upload_id)) - settings.upload_session_ttl_seconds - 1
+    os.utime(os.path.join(store.root, old.upload_id), (past, past))
+
+    fresh = asyncio.run(store.create("novo.csv", len(CSV)))
+    assert sorted(os.listdir(store.root)) == [fresh.upload_id]
+    with pytest.raises(UploadNotFound):
+        store.get(old.upload_id)
@@ -0,0 +1,88 @@
+"""Tests for embedding reduction, quantization and the re-ranking sidecar."""
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import settings
+from services.vector_storage import FullVectorStore, dequantize, quantize, reduce_vectors
+
+VECTORS = np.random.default_rng(0).standard_normal((5, 64)).astype(np.float32)
+
+
+def test_int8_roundtrip_is_close():
+    codes, scales = quantize(VECTORS, "int8")
+    assert codes.dtype == np.int8
+    restored = dequantize(codes, scales)
+    assert np.abs(restored - VECTORS).max() <= scales.max()
+
+
+def test_float16_roundtrip_is_close():
+    codes, scales = quantize(VECTORS, "float16")
+    assert scales is None
+    assert np.allclose(dequantize(codes, scales), VECTORS, atol=1e-2)
+
+
+def test_truncate_reduction_normalizes(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_dimensions", 16)
+    monkeypatch.setattr(settings, "vector_reduction", "truncate")
+    reduced = reduce_vectors(VECTORS)
+    assert reduced.shape == (5, 16)
+    assert np.allclose(np.linalg.norm(reduced, axis=1), 1.0)
+
+
+def test_reduction_disabled_keeps_vectors(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_dimensions", 0)
+    assert np.array_equal(reduce_vectors(VECTORS), VECTORS)
+
+
+def test_full_vector_store_replaces_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_rerank_dtype", "float32")
+    store = FullVectorStore(str(tmp_path))
+    store.save(1, ["file_1_record_0", "file_1_record_1"], VECTORS[:2])
+    store.save(1, ["file_1_record_1"], VECTORS[2:3])
+
+    found = store.get(["file_1_record_0", "file_1_record_1", "file_2_record_0"])
+    assert set(found) == {"file_1_record_0", "file_1_record_1"}
+    assert np.allclose(found["file_1_record_1"], VECTORS[2])
+
+
+def test_full_vector_store_concurrent_saves_merge(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_rerank_dtype", "float32")
+    store = FullVectorStore(str(tmp_path))
+    rng = np.random.default_rng(1)
+    batches = [([f"file_1_record_{b * 10 + i}" for i in range(10)], rng.standard_normal((10, 8))) for b in range(40)]
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda batch: store.save(1, *batch), batches))
+    # A re-embedded record keeps its newest vector across merges
+    store.save(1, ["file_1_record_3"], VECTORS[:1, :8])
+
+    found = store.get([f"file_1_record_{i}" for i in range(400)])
+    assert len(found) == 400
+    assert np.allclose(found["file_1_record_3"], VECTORS[0, :8])
+    assert np.allclose(found["file_1_record_399"], batches[-1][1][-1])
+    shards = [n for n in os.listdir(tmp_path / "file_1") if n.endswith(".npz")]
+    assert len(shards) < 16
+
+
+def test_full_vector_store_reads_legacy_file_and_bounds_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_rerank_dtype", "float32")
+    monkeypatch.setattr(settings, "vector_rerank_cache_files", 2)
+    np.savez(tmp_path / "file_1.npz", ids=np.asarray(["file_1_record_0", "file_1_record_1"]), codes=VECTORS[:2])
+    store = FullVectorStore(str(tmp_path))
+    store.save(1, ["file_1_record_1"], VECTORS[2:3])
+    for file_id in (2, 3):
+        store.save(file_id, [f"file_{file_id}_record_0"], VECTORS[:1])
+
+    found = store.get(["file_1_record_0", "file_1_record_1", "file_2_record_0", "file_3_record_0"])
+    assert np.allclose(found["file_1_record_0"], VECTORS[0])
+    assert np.allclose(found["file_1_record_1"], VECTORS[2])
+    assert list(store._cache) == [2, 3]
+
+    store.delete(1)
+    assert store.get(["file_1_record_0"]) == {}
@@ -0,0 +1,48 @@
+"""Round trip through the vector worker app and its RemoteCollection client."""
+import sys
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Allow importing from the backend root without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import services.embedding_service as embedding_service
+import services.vector_client as vector_client
+import vector_worker
+from config import settings
+from services.vector_client import RemoteCollection, VectorServiceError
+
+
+def _remote(tmp_path, monkeypatch) -> RemoteCollection:
+    monkeypatch.setattr(settings, "chroma_persist_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "chroma_warmup", False)
+    monkeypatch.setattr(embedding_service, "_client", None)
+    monkeypatch.setattr(vector_worker, "_collections", {})
+    monkeypatch.setattr(vector_client, "_http", TestClient(vector_worker.app))
+    return RemoteCollection(settings.chroma_collection_name)
+
+
+def test_upsert_query_delete_round_trip(tmp_path, monkeypatch):
+    remote = _remote(tmp_path, monkeypatch)
+    remote.upsert(
+        ids=["file_1_record_0", "file_1_record_1"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0]],
+        documents=["a", "b"],
+        metadatas=[{"file_id": 1}, {"file_id": 1}],
+    )
+    assert remote.count() == 2
+
+    result = remote.query(query_embeddings=[[1.0, 0.1]], n_results=1, include=["documents", "embeddings"])
+    assert result["documents"] == [["a"]]
+    assert result["embeddings"][0][0] == [1.0, 0.0]
+
+    remote.delete(where={"file_id": 1})
+    assert remote.count() == 0
+
+
+def test_unknown_collection_is_rejected(tmp_path, monkeypatch):
+    _remote(tmp_path, monkeypatch)
+    with pytest.raises(VectorServiceError, match="404"):
+        RemoteCollection("other_collection").count()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Vector worker — processo único dono das coleções ChromaDB.
+
+Com Chroma embutido, cada processo da API (`uvicorn --workers N`) carrega
+sua própria cópia do índice HNSW e todos escrevem no mesmo diretório. Este
+worker mantém um único índice em memória e atende upsert/query/get/delete
+por HTTP (TCP local ou socket Unix); a API fala com ele por
+services/vector_client.py quando VECTOR_SERVICE_URL está configurada.
+
+Uso (a partir de backend/):
+    python vector_worker.py --uds /tmp/portaltcc-vectors.sock
+    VECTOR_SERVICE_URL=unix:///tmp/portaltcc-vectors.sock uvicorn main:app --workers 4
+
+    python vector_worker.py --port 8100
+    VECTOR_SERVICE_URL=http://127.0.0.1:8100 uvicorn main:app --workers 4
+"""
+import argparse
+import logging
+import sys
+import os
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any, Dict
+
+import numpy as np
+from chromadb.errors import ChromaError
+from fastapi import Body, FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+
+# Allow running from the backend/ directory without installing the package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import settings
+from services.embedding_service import _open_collection, warm_up_vector_stores
+
+# This process *is* the vector service: it must never proxy to itself, even
+# when it shares the API's .env.
+settings.vector_service_url = ""
+
+logger = logging.getLogger(__name__)
+
+_OPS = {"upsert", "query", "get", "delete", "count"}
+_collections: Dict[str, Any] = {}
+
+
+def _collection(name: str):
+    base = settings.chroma_collection_name
+    if name != base and not name.startswith(f"{base}_"):
+        raise HTTPException(status_code=404, detail=f"Coleção desconhecida: {name}")
+    if name not in _collections:
+        _collections[name] = _open_collection(name)
+    return _collections[name]
+
+
+def _jsonable(value):
+    """Chroma results carry numpy arrays and enums; convert them for JSON."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.chroma_warmup:
+        warmed = warm_up_vector_stores()
+        logger.info(f"Índices vetoriais carregados: {warmed} coleção(ões)")
+    yield
+
+
+app = FastAPI(title="Portal TCC - Vector Worker", lifespan=lifespan)
+
+
+# Plain `def` endpoints: FastAPI runs them in its thread pool, and hnswlib
+# releases the GIL during queries, so concurrent searches use several cores.
+@app.post("/collections/{name}/{op}")
+def collection_call(name: str, op: str, body: Dict[str, Any] = Body(default={})):
+    """Executa `op` na coleção com os mesmos argumentos da API do chromadb."""
+    if op not in _OPS:
+        raise HTTPException(status_code=404, detail=f"Operação desconhecida: {op}")
+    try:
+        result = getattr(_collection(name), op)(**body)
+    except (ChromaError, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(_jsonable(result))
+
+
+@app.get("/health")
+def health():
+    return {
+        "status": "healthy",
+        "collections": {name: c.count() for name, c in _collections.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--uds", help="socket Unix (em vez de host/porta)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    import uvicorn
+
+    # Always a single process: one index in memory, one writer.
+    uvicorn.run(app, host=args.host, port=args.port, uds=args.uds, workers=1)
+
+
+if __name__ == "__main__":
+    main()
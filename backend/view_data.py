@@ -1,16 +1,29 @@
 #!/usr/bin/env python3
 """
 Script para visualizar dados do PostgreSQL de forma amigável.
+
+As seções (contagens, colunas, uploads recentes, amostra e registros por
+intervalo) rodam em paralelo num pool pequeno; ver services/stats_service.py.
+
+Uso (a partir de backend/):
+    python view_data.py
+    python view_data.py --approx                      # contagem pelo catálogo
+    python view_data.py --sample 5 --bucket '1 day'   # histograma sobre 5% dos blocos
+    python view_data.py --file-id 3 --file-id 4 --since 2024-03-01
+    python view_data.py --format json --output stats.json   # para cron
 """
+import argparse
 import asyncio
 import sys
 import os
+from datetime import datetime
 
 # Allow running from the backend/ directory without installing the package
 sys.path.insert(0, os.path.dirname(__file__))
 
-import asyncpg
 from config import settings
+from services.serialization import dumps
+from services.stats_service import StatsFilter, collect_stats, create_pool, report_to_csv
 
 
 def print_separator(char="=", length=80):
@@ -23,127 +36,134 @@ def print_header(text):
     print_separator()
 
 
-def _asyncpg_url(sqlalchemy_url: str) -> str:
-    """Convert a SQLAlchemy async URL to a plain asyncpg URL."""
-    return sqlalchemy_url.replace("postgresql+asyncpg://", "postgresql://")
+def _datetime(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    # Naive values are local time, like the timestamps printed below
+    return parsed if parsed.tzinfo else parsed.astimezone()
 
 
-async def main():
-    url = _asyncpg_url(settings.database_url)
-
+def print_report(report: dict):
     print("\n VISUALIZADOR DE DADOS - PORTAL TCC\n")
 
-    try:
-        conn = await asyncpg.connect(url)
-    except Exception as e:
-        print(f"Erro ao conectar ao banco de dados: {e}")
-        print(f"  URL: {url}")
-        sys.exit(1)
-
-    try:
-        # ------------------------------------------------------------------
-        # 1. INFORMACOES GERAIS
-        # ------------------------------------------------------------------
-        print_header("INFORMACOES GERAIS")
-
-        total_files = await conn.fetchval("SELECT COUNT(*) FROM files")
-        total_records = await conn.fetchval("SELECT COUNT(*) FROM records")
-
-        print(f"Arquivos enviados : {total_files}")
-        print(f"Registros salvos  : {total_records}")
-
-        if total_records == 0:
-            print("\nNenhum dado encontrado.")
-            print("Faca upload de um arquivo CSV primeiro.\n")
-            return
-
-        # Distinct columns across all records
-        column_rows = await conn.fetch(
-            "SELECT DISTINCT key FROM records, jsonb_object_keys(data) AS key ORDER BY key"
-        )
-        columns = [r["key"] for r in column_rows]
-        print(f"Colunas presentes : {', '.join(columns)}")
+    # ----------------------------------------------------------------------
+    # 1. INFORMACOES GERAIS
+    # ----------------------------------------------------------------------
+    print_header("INFORMACOES GERAIS")
+    records = report["records"]
+    approx = "" if records["method"] == "exact" else f"  (aprox., {records['method']})"
+    print(f"Arquivos enviados : {report['files']}")
+    print(f"Registros salvos  : {records['value']}{approx}")
+
+    if records["value"] == 0 and not report["recent_files"]:
+        print("\nNenhum dado encontrado.")
+        print("Faca upload de um arquivo CSV primeiro.\n")
+        return
+
+    print(f"Colunas presentes : {', '.join(report['columns']['value'])}")
+    print()
+
+    # ----------------------------------------------------------------------
+    # 2. UPLOADS RECENTES
+    # ----------------------------------------------------------------------
+    print_header("UPLOADS RECENTES")
+    for f in report["recent_files"]:
+        ts = f["uploaded_at"].strftime("%d/%m/%Y %H:%M:%S")
+        print(f"  [{f['id']}] {f['file_name']}")
+        print(f"       Tipo     : {f['csv_type'] or '-'}")
+        print(f"       Linhas   : {f['rows_count']}")
+        print(f"       Colunas  : {', '.join(f['columns_list'])}")
+        print(f"       Enviado  : {ts}")
         print()
 
-        # ------------------------------------------------------------------
-        # 2. UPLOADS RECENTES
-        # ------------------------------------------------------------------
-        print_header("UPLOADS RECENTES")
-
-        files = await conn.fetch(
-            """
-            SELECT id, file_name, rows_count, columns_list, uploaded_at
-            FROM files
-            ORDER BY uploaded_at DESC
-            LIMIT 10
-            """
-        )
+    # ----------------------------------------------------------------------
+    # 3. AMOSTRA DE DADOS
+    # ----------------------------------------------------------------------
+    print_header(f"AMOSTRA DE DADOS (ultimos {len(report['sample'])} registros)")
+    for i, row in enumerate(report["sample"], start=1):
+        ts = row["uploaded_at"].strftime("%d/%m/%Y %H:%M:%S")
+        print(f"  Registro {i}  (arquivo {row['file_id']}, {ts})")
+        for k, v in row["data"].items():
+            print(f"    {k}: {v}")
+        print()
 
-        for f in files:
-            ts = f["uploaded_at"].strftime("%d/%m/%Y %H:%M:%S")
-            print(f"  [{f['id']}] {f['file_name']}")
-            print(f"       Linhas   : {f['rows_count']}")
-            print(f"       Colunas  : {', '.join(f['columns_list'])}")
-            print(f"       Enviado  : {ts}")
-            print()
-
-        # ------------------------------------------------------------------
-        # 3. AMOSTRA DE DADOS (ultimos 10 registros)
-        # ------------------------------------------------------------------
-        print_header("AMOSTRA DE DADOS (ultimos 10 registros)")
-
-        sample = await conn.fetch(
-            """
-            SELECT data, uploaded_at
-            FROM records
-            ORDER BY uploaded_at DESC
-            LIMIT 10
-            """
-        )
+    # ----------------------------------------------------------------------
+    # 4. SERIES TEMPORAIS — registros por intervalo
+    # ----------------------------------------------------------------------
+    buckets = report["buckets"]
+    method = "" if buckets["method"] == "exact" else f" ({buckets['method']})"
+    print_header(f"SERIES TEMPORAIS - Registros por {buckets['interval']}{method}")
+    if buckets["value"]:
+        for b in buckets["value"]:
+            ts = b["bucket"].strftime("%d/%m/%Y %H:%M")
+            print(f"  {ts}  ->  {b['count']} registro(s)")
+    else:
+        print("  (sem dados suficientes)")
+    print()
+
+    # ----------------------------------------------------------------------
+    # Resumo final
+    # ----------------------------------------------------------------------
+    print_separator()
+    timings = ", ".join(f"{name} {ms:.0f} ms" for name, ms in report["timings_ms"].items())
+    print(f"Visualizacao concluida em {report['elapsed_ms']:.0f} ms ({timings}).")
+    print_separator()
+    print()
 
-        for i, row in enumerate(sample, start=1):
-            ts = row["uploaded_at"].strftime("%d/%m/%Y %H:%M:%S")
-            data = dict(row["data"])
-            print(f"  Registro {i}  ({ts})")
-            for k, v in data.items():
-                print(f"    {k}: {v}")
-            print()
-
-        # ------------------------------------------------------------------
-        # 4. SERIES TEMPORAIS (TimescaleDB) — registros por hora
-        # ------------------------------------------------------------------
-        print_header("SERIES TEMPORAIS - Registros por hora")
-
-        buckets = await conn.fetch(
-            """
-            SELECT
-                time_bucket('1 hour', uploaded_at) AS bucket,
-                COUNT(*) AS count
-            FROM records
-            GROUP BY bucket
-            ORDER BY bucket DESC
-            LIMIT 20
-            """
-        )
 
-        if buckets:
-            for b in buckets:
-                ts = b["bucket"].strftime("%d/%m/%Y %H:%M")
-                print(f"  {ts}  ->  {b['count']} registro(s)")
-        else:
-            print("  (sem dados suficientes)")
-        print()
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file-id", type=int, action="append", default=[], help="restringir a um arquivo (repetível)")
+    parser.add_argument("--since", type=_datetime, help="registros enviados a partir de (ISO 8601)")
+    parser.add_argument("--until", type=_datetime, help="registros enviados antes de (ISO 8601)")
+    parser.add_argument("--approx", action="store_true", help="contagem de registros aproximada (catálogo/planejador)")
+    parser.add_argument("--sample", type=float, metavar="PCT", help="ler só PCT%% dos blocos no histograma/chaves")
+    parser.add_argument("--scan-keys", action="store_true", help="listar as chaves de records.data em vez de files.columns_list")
+    parser.add_argument("--bucket", default="1 hour", help="intervalo do histograma (ex.: '1 day')")
+    parser.add_argument("--limit", type=int, default=10, help="uploads recentes e registros de amostra")
+    parser.add_argument("--buckets", type=int, default=20, help="quantos intervalos mostrar")
+    parser.add_argument("--concurrency", type=int, default=settings.stats_concurrency)
+    parser.add_argument("--statement-timeout-ms", type=int, default=settings.stats_statement_timeout_ms)
+    parser.add_argument("--format", choices=("text", "json", "csv"), default="text")
+    parser.add_argument("--output", help="arquivo de saída (json/csv); padrão: stdout")
+    args = parser.parse_args()
+
+    if args.sample is not None and not 0 < args.sample <= 100:
+        parser.error("--sample deve estar entre 0 (exclusivo) e 100")
 
-        # ------------------------------------------------------------------
-        # Resumo final
-        # ------------------------------------------------------------------
-        print_separator()
-        print(f"Visualizacao concluida. Total: {total_records} registro(s).")
-        print_separator()
-        print()
+    try:
+        pool = await create_pool(args.concurrency, args.statement_timeout_ms)
+    except Exception as e:
+        print(f"Erro ao conectar ao banco de dados: {e}")
+        print(f"  URL: {settings.database_url}")
+        sys.exit(1)
 
+    try:
+        report = await collect_stats(
+            pool,
+            StatsFilter(file_ids=args.file_id, since=args.since, until=args.until),
+            approximate=args.approx,
+            sample_percent=args.sample,
+            scan_keys=args.scan_keys,
+            bucket=args.bucket,
+            limit=args.limit,
+            bucket_limit=args.buckets,
+        )
+    except Exception as e:
+        print(f"Erro ao coletar estatísticas: {e}")
+        sys.exit(1)
     finally:
-        await conn.close()
+        await pool.close()
+
+    if args.format == "text":
+        print_report(report)
+        return
+
+    body = dumps(report).decode() if args.format == "json" else report_to_csv(report)
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            f.write(body)
+    else:
+        sys.stdout.write(body if body.endswith("\n") else body + "\n")
 
 
 if __name__ == "__main__":
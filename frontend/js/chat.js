@@ -7,6 +7,8 @@ const chatInput = document.getElementById("chatInput");
 const btnSend = document.getElementById("btnSend");
 const btnClear = document.getElementById("btnClear");
 
+const MAX_RESUME_ATTEMPTS = 3;
+
 // --- Enviar mensagem ---
 
 async function sendMessage() {
@@ -19,6 +21,7 @@ async function sendMessage() {
     appendMessage(message, "user");
     showTypingIndicator();
 
+    let bubbleEl = null;
     try {
         const response = await fetch(`${API_BASE}/stream`, {
             method: "POST",
@@ -34,47 +37,38 @@ async function sendMessage() {
         }
 
         hideTypingIndicator();
-        const bubbleEl = appendMessage("", "bot");
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
-        let botMessage = "";
-
-        while (true) {
-            const { done, value } = await reader.read();
-            if (done) break;
-
-            const text = decoder.decode(value, { stream: true });
-            const lines = text.split("\n");
-
-            for (const line of lines) {
-                if (line.startsWith("data: ")) {
-                    try {
-                        const data = JSON.parse(line.slice(6));
-                        if (data.token) {
-                            botMessage += data.token;
-                            bubbleEl.querySelector(".msg-content").innerHTML =
-                                marked.parse(botMessage);
-                            scrollToBottom();
-                        }
-                        if (data.session_id) {
-                            sessionId = data.session_id;
-                        }
-                    } catch (e) {
-                        // Ignora linhas mal-formadas
-                    }
-                }
-                if (line.startsWith("event: done")) {
-                    // Próxima linha data terá o session_id
-                }
-                if (line.startsWith("event: error")) {
-                    // Próxima linha data terá o erro
-                }
+        bubbleEl = appendMessage("", "bot");
+        const state = { streamId: null, offset: 0, botMessage: "", finished: false };
+
+        try {
+            await readStream(response, state, bubbleEl);
+        } catch (e) {
+            console.warn("Conexão do stream interrompida:", e);
+        }
+
+        // Conexão caiu antes do fim: retoma do último token recebido,
+        // sem gerar a resposta de novo no servidor.
+        let attempts = 0;
+        while (!state.finished && state.streamId && attempts < MAX_RESUME_ATTEMPTS) {
+            attempts++;
+            await sleep(500 * attempts);
+            try {
+                const resumed = await fetch(
+                    `${API_BASE}/stream/${state.streamId}?offset=${state.offset}`
+                );
+                if (!resumed.ok) break;
+                await readStream(resumed, state, bubbleEl);
+            } catch (e) {
+                console.warn("Falha ao retomar o stream:", e);
             }
         }
 
-        if (!botMessage) {
+        if (!state.botMessage) {
             bubbleEl.querySelector(".msg-content").textContent =
                 "Não foi possível gerar uma resposta.";
+        } else if (!state.finished) {
+            bubbleEl.querySelector(".msg-content").innerHTML =
+                marked.parse(state.botMessage + "\n\n*(resposta interrompida)*");
         }
     } catch (error) {
         hideTypingIndicator();
@@ -89,6 +83,65 @@ async function sendMessage() {
     }
 }
 
+// Lê eventos SSE de uma resposta, atualizando `state` a cada token.
+async function readStream(response, state, bubbleEl) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+
+        for (const rawEvent of events) {
+            handleEvent(parseEvent(rawEvent), state, bubbleEl);
+        }
+    }
+}
+
+function parseEvent(rawEvent) {
+    const event = { type: "message", id: null, data: null };
+    for (const line of rawEvent.split("\n")) {
+        if (line.startsWith("event: ")) event.type = line.slice(7);
+        else if (line.startsWith("id: ")) event.id = parseInt(line.slice(4), 10);
+        else if (line.startsWith("data: ")) event.data = line.slice(6);
+        // Linhas começando com ":" são heartbeats
+    }
+    return event;
+}
+
+function handleEvent(event, state, bubbleEl) {
+    if (event.data === null) return;
+
+    let data;
+    try {
+        data = JSON.parse(event.data);
+    } catch (e) {
+        return; // Ignora eventos mal-formados
+    }
+
+    if (event.type === "start") {
+        state.streamId = data.stream_id;
+        sessionId = data.session_id;
+    } else if (event.type === "done") {
+        state.finished = true;
+        sessionId = data.session_id;
+    } else if (event.type === "error") {
+        state.finished = true;
+        console.error("Erro no stream:", data.error);
+    } else if (data.token) {
+        state.botMessage += data.token;
+        if (event.id !== null) state.offset = event.id;
+        bubbleEl.querySelector(".msg-content").innerHTML =
+            marked.parse(state.botMessage);
+        scrollToBottom();
+    }
+}
+
 // --- Limpar sessão ---
 
 async function clearSession() {
@@ -149,6 +202,10 @@ function scrollToBottom() {
     chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
+function sleep(ms) {
+    return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
 function setInputEnabled(enabled) {
     chatInput.disabled = !enabled;
     btnSend.disabled = !enabled;
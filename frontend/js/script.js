@@ -1,3 +1,17 @@
+const API_BASE = 'http://localhost:8000/api';
+
+// Upload em partes: quantas partes enviar ao mesmo tempo e quantas
+// tentativas por parte antes de desistir (a sessão fica para retomar)
+const PARALLEL_CHUNKS = 4;
+const CHUNK_RETRIES = 3;
+
+// Limites da API: bytes enviados e CSV depois de descomprimido
+const MAX_UPLOAD_BYTES = 10 * 1024 * 1024;
+const MAX_DECOMPRESSED_BYTES = 100 * 1024 * 1024;
+const COMPRESSED_SUFFIXES = ['.csv.gz', '.csv.zst'];
+// CSVs são comprimidos com gzip no navegador antes do envio, quando suportado
+const CAN_GZIP = typeof CompressionStream !== 'undefined';
+
 // Elementos do DOM
 const uploadArea = document.getElementById('uploadArea');
 const csvFileInput = document.getElementById('csvFile');
@@ -66,17 +80,20 @@ function handleFileSelect(file) {
         return;
     }
 
-    // Validar se é arquivo CSV (case-insensitive)
-    if (!file.name.toLowerCase().endsWith('.csv')) {
-        showMessage('Erro: Por favor, selecione um arquivo CSV válido.', 'error');
+    // Validar se é arquivo CSV, comprimido ou não (case-insensitive)
+    const lowerName = file.name.toLowerCase();
+    const compressed = COMPRESSED_SUFFIXES.some(suffix => lowerName.endsWith(suffix));
+    if (!compressed && !lowerName.endsWith('.csv')) {
+        showMessage('Erro: Por favor, selecione um arquivo CSV (.csv, .csv.gz ou .csv.zst).', 'error');
         resetFileSelection();
         return;
     }
 
-    // Validar tamanho do arquivo (máximo 10MB)
-    const maxSize = 10 * 1024 * 1024; // 10MB em bytes
+    // Validar tamanho: CSVs que serão comprimidos aqui podem ser maiores,
+    // o limite de 10MB vale para o que é enviado
+    const maxSize = !compressed && CAN_GZIP ? MAX_DECOMPRESSED_BYTES : MAX_UPLOAD_BYTES;
     if (file.size > maxSize) {
-        showMessage('Erro: O arquivo não pode exceder 10MB.', 'error');
+        showMessage(`Erro: O arquivo não pode exceder ${formatFileSize(maxSize)}.`, 'error');
         resetFileSelection();
         return;
     }
@@ -127,6 +144,135 @@ function hideMessage() {
     message.className = 'message';
 }
 
+// Erro HTTP com o status e o detalhe devolvido pela API
+async function httpError(response) {
+    let detail = '';
+    try {
+        const body = await response.json();
+        detail = typeof body.detail === 'string' ? body.detail : (body.detail && body.detail.message) || '';
+    } catch (e) {
+        // corpo não-JSON
+    }
+    const error = new Error(detail || `Erro HTTP: ${response.status}`);
+    error.status = response.status;
+    return error;
+}
+
+// Função: Comprimir um CSV com gzip no navegador (a API descomprime em stream)
+async function gzipFile(file) {
+    const stream = file.stream().pipeThrough(new CompressionStream('gzip'));
+    const blob = await new Response(stream).blob();
+    return new File([blob], `${file.name}.gz`, { lastModified: file.lastModified });
+}
+
+// Chave da sessão de upload no localStorage, para retomar o mesmo arquivo
+function uploadKey(file) {
+    return `upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+// Função: Criar a sessão de upload ou retomar uma existente
+async function openUploadSession(file) {
+    const savedId = localStorage.getItem(uploadKey(file));
+    if (savedId) {
+        const response = await fetch(`${API_BASE}/uploads/${savedId}`);
+        if (response.ok) {
+            return response.json();
+        }
+        localStorage.removeItem(uploadKey(file));
+    }
+
+    const response = await fetch(`${API_BASE}/uploads`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ file_name: file.name, size: file.size })
+    });
+    if (!response.ok) {
+        throw await httpError(response);
+    }
+    const session = await response.json();
+    localStorage.setItem(uploadKey(file), session.upload_id);
+    return session;
+}
+
+// Função: Enviar uma parte, com novas tentativas em erros de rede/5xx
+async function putChunk(file, session, index) {
+    const start = index * session.chunk_size;
+    const end = Math.min(start + session.chunk_size, file.size);
+
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(`${API_BASE}/uploads/${session.upload_id}`, {
+                method: 'PUT',
+                headers: { 'Content-Range': `bytes ${start}-${end - 1}/${file.size}` },
+                body: file.slice(start, end)
+            });
+            if (response.ok) {
+                return;
+            }
+            throw await httpError(response);
+        } catch (error) {
+            // Erros 4xx (CSV inválido, sessão expirada) não melhoram com nova tentativa
+            const retryable = !error.status || error.status >= 500;
+            if (!retryable || attempt >= CHUNK_RETRIES) {
+                throw error;
+            }
+            await new Promise(resolve => setTimeout(resolve, 500 * 2 ** (attempt - 1)));
+        }
+    }
+}
+
+// Função: Upload em partes paralelas, retomável, seguido do finalize
+async function uploadInChunks(file, onProgress) {
+    const session = await openUploadSession(file);
+    const received = new Set(session.received);
+    const pending = [];
+    for (let i = 0; i < session.total_chunks; i++) {
+        if (!received.has(i)) pending.push(i);
+    }
+    let failed = null;
+    async function send(index) {
+        try {
+            await putChunk(file, session, index);
+            received.add(index);
+            onProgress(received.size / session.total_chunks);
+        } catch (error) {
+            failed = failed || error;
+        }
+    }
+    async function worker() {
+        while (pending.length && !failed) {
+            await send(pending.shift());
+        }
+    }
+
+    // A primeira parte vai antes: é nela que a API valida o tipo do CSV
+    if (pending[0] === 0) {
+        await send(pending.shift());
+    }
+    if (!failed) {
+        await Promise.all(Array.from({ length: PARALLEL_CHUNKS }, worker));
+    }
+    if (failed) {
+        // 4xx (CSV inválido, sessão expirada): recomeçar do zero na próxima vez
+        if (failed.status && failed.status < 500) {
+            localStorage.removeItem(uploadKey(file));
+        }
+        throw failed;
+    }
+
+    const response = await fetch(`${API_BASE}/uploads/${session.upload_id}/finalize`, { method: 'POST' });
+    if (!response.ok) {
+        const error = await httpError(response);
+        // 409: faltam partes — a sessão continua válida para retomar
+        if (error.status !== 409) {
+            localStorage.removeItem(uploadKey(file));
+        }
+        throw error;
+    }
+    localStorage.removeItem(uploadKey(file));
+    return response.json();
+}
+
 // Evento: Botão "Enviar para Banco de Dados"
 btnUpload.addEventListener('click', async () => {
     if (!selectedFile) {
@@ -139,21 +285,18 @@ btnUpload.addEventListener('click', async () => {
     btnUpload.textContent = 'Enviando...';
 
     try {
-        // Criar FormData para enviar arquivo
-        const formData = new FormData();
-        formData.append('csvFile', selectedFile);
-
-        // Enviar para o backend
-        const response = await fetch('http://localhost:8000/api/upload', {
-            method: 'POST',
-            body: formData
-        });
-
-        if (!response.ok) {
-            throw new Error(`Erro HTTP: ${response.status}`);
+        let file = selectedFile;
+        if (CAN_GZIP && file.name.toLowerCase().endsWith('.csv')) {
+            btnUpload.textContent = 'Comprimindo...';
+            file = await gzipFile(file);
+            if (file.size > MAX_UPLOAD_BYTES) {
+                throw new Error(`Mesmo comprimido, o arquivo excede ${formatFileSize(MAX_UPLOAD_BYTES)}`);
+            }
         }
 
-        const result = await response.json();
+        const result = await uploadInChunks(file, (fraction) => {
+            btnUpload.textContent = `Enviando... ${Math.round(fraction * 100)}%`;
+        });
 
         // Sucesso
         showMessage('Arquivo enviado e processado com sucesso!', 'success');
@@ -164,7 +307,7 @@ btnUpload.addEventListener('click', async () => {
 
         // Verificar se é erro de conexão (backend não existe ainda)
         if (error.message.includes('Failed to fetch') || error.message.includes('NetworkError')) {
-            showMessage('Erro: Backend não está disponível. Configure o servidor primeiro.', 'error');
+            showMessage('Erro: Backend não está disponível. Envie novamente para retomar o upload.', 'error');
         } else {
             showMessage(`Erro ao enviar arquivo: ${error.message}`, 'error');
         }